@@ -13,21 +13,29 @@
 # limitations under the License.
 
 import json
+import logging
 import os
 from contextlib import asynccontextmanager
-from typing import Any, Optional
+from typing import Any, AsyncIterator, Optional
 
 import uvicorn
 from fastapi import APIRouter, Body, FastAPI, HTTPException, Request
-from fastapi.responses import PlainTextResponse, RedirectResponse
+from fastapi.responses import (
+    PlainTextResponse,
+    RedirectResponse,
+    StreamingResponse,
+)
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from google.auth.transport import requests  # type:ignore
-from google.oauth2 import id_token  # type:ignore
 from markdown import markdown
-from starlette.middleware.sessions import SessionMiddleware
 
+import tracing
+from id_token_verifier import IdTokenVerifier
 from orchestrator import createOrchestrator
+from orchestrator.session_store import memory_usage
+from session_middleware import ServerSessionMiddleware, create_session_backend
+
+logger = logging.getLogger(__name__)
 
 routes = APIRouter()
 templates = Jinja2Templates(directory="templates")
@@ -40,6 +48,8 @@ async def lifespan(app: FastAPI):
     yield
     # FastAPI app shutdown event
     await app.state.orchestrator.close_clients()
+    app.state.session_backend.close()
+    tracing.shutdown()
 
 
 @routes.get("/")
@@ -54,8 +64,8 @@ async def index(request: Request):
     if "uuid" in session:
         user_id_token = orchestrator.get_user_id_token(session["uuid"])
         if user_id_token:
-            if session.get("user_info") and not get_user_info(
-                user_id_token, request.app.state.client_id
+            if session.get("user_info") and not await get_user_info(
+                user_id_token, request.app.state.id_token_verifier
             ):
                 await logout_google(request)
         elif not user_id_token and "user_info" in session:
@@ -98,7 +108,9 @@ async def login_google(
         raise HTTPException(status_code=400, detail="Client id not found")
 
     session = request.session
-    user_info = get_user_info(str(user_id_token), client_id)
+    user_info = await get_user_info(
+        str(user_id_token), request.app.state.id_token_verifier
+    )
     session["user_info"] = user_info
 
     # create new request session
@@ -148,13 +160,17 @@ async def chat_handler(request: Request, prompt: str = Body(embed=True)):
             status_code=400, detail="Error: Invoke index handler before start chatting"
         )
 
+    # Recreate the user session if it was evicted while idle
+    orchestrator = request.app.state.orchestrator
+    if not orchestrator.user_session_exist(request.session["uuid"]):
+        await orchestrator.user_session_create(request.session)
+
     # Add user message to chat history
     request.session["history"].append({"type": "human", "data": {"content": prompt}})
-    orchestrator = request.app.state.orchestrator
     response = await orchestrator.user_session_invoke(request.session["uuid"], prompt)
     output = response.get("output")
     confirmation = response.get("confirmation")
-    trace = response.get("trace")
+    trace = with_timings(response.get("trace"))
     # Return assistant response
     if confirmation:
         return json.dumps(
@@ -167,6 +183,79 @@ async def chat_handler(request: Request, prompt: str = Body(embed=True)):
         )
 
 
+@routes.post("/chat/stream")
+async def chat_stream_handler(request: Request, prompt: str = Body(embed=True)):
+    """Handler for chat requests that streams tool traces and LLM tokens as
+    server-sent events"""
+    if not prompt:
+        raise HTTPException(status_code=400, detail="Error: No user query")
+    if "uuid" not in request.session:
+        raise HTTPException(
+            status_code=400, detail="Error: Invoke index handler before start chatting"
+        )
+
+    orchestrator = request.app.state.orchestrator
+    uuid = request.session["uuid"]
+    if not orchestrator.user_session_exist(uuid):
+        await orchestrator.user_session_create(request.session)
+    request.session["history"].append({"type": "human", "data": {"content": prompt}})
+    return StreamingResponse(
+        stream_chat_events(request, uuid, prompt),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def stream_chat_events(
+    request: Request, uuid: str, prompt: str
+) -> AsyncIterator[str]:
+    orchestrator = request.app.state.orchestrator
+    try:
+        async for event in orchestrator.user_session_stream(uuid, prompt):
+            if event["type"] != "response":
+                yield sse_event(event)
+                continue
+            response = event["content"]
+            output = response.get("output")
+            confirmation = response.get("confirmation")
+            trace = with_timings(response.get("trace"))
+            if confirmation:
+                yield sse_event(
+                    {"type": "confirmation", "content": confirmation, "trace": trace}
+                )
+            else:
+                # Sessions are stored server side once the response completes
+                request.session["history"].append(
+                    {"type": "ai", "data": {"content": output}}
+                )
+                yield sse_event(
+                    {"type": "message", "content": markdown(output), "trace": trace}
+                )
+    except HTTPException as err:
+        yield sse_event({"type": "error", "content": err.detail})
+    except Exception as err:
+        # Headers are sent, so the error can only be reported as an event
+        logger.exception("Error streaming chat response")
+        yield sse_event(
+            {"type": "error", "content": f"Error streaming response: {err}"}
+        )
+
+
+def with_timings(trace: Optional[list[Any]]) -> Optional[list[Any]]:
+    """Append the timings of the spans recorded so far in this request."""
+    s = tracing.current_span()
+    if s is None:
+        return trace
+    timings = tracing.span_timings(s.root)
+    if not timings:
+        return trace
+    return [*(trace or []), {"tool_call_id": "Timings", "spans": timings}]
+
+
+def sse_event(event: dict[str, Any]) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+
 @routes.post("/book/flight", response_class=PlainTextResponse)
 async def book_flight(request: Request, params: str = Body(embed=True)):
     """Handler for LangChain chat requests"""
@@ -205,7 +294,7 @@ async def decline_flight(request: Request):
 
 
 @routes.post("/reset")
-def reset(request: Request):
+async def reset(request: Request):
     """Reset user session"""
 
     if "uuid" not in request.session:
@@ -216,14 +305,23 @@ def reset(request: Request):
     if not orchestrator.user_session_exist(uuid):
         raise HTTPException(status_code=500, detail="Current user session not found")
 
-    orchestrator.user_session_reset(request.session, uuid)
+    await orchestrator.user_session_reset(request.session, uuid)
 
 
-def get_user_info(user_id_token: str, client_id: str) -> dict[str, str]:
+@routes.get("/metrics/sessions")
+async def session_metrics(request: Request):
+    """Size and evictions of each session store, and memory usage of the process"""
+    stats = await request.app.state.orchestrator.session_stats()
+    stats["http_sessions"] = await request.app.state.session_backend.stats()
+    stats["memory"] = memory_usage()
+    return stats
+
+
+async def get_user_info(
+    user_id_token: str, verifier: IdTokenVerifier
+) -> dict[str, str]:
     try:
-        id_info = id_token.verify_oauth2_token(
-            user_id_token, requests.Request(), audience=client_id
-        )
+        id_info = await verifier.verify(user_id_token)
         return {
             "user_img": id_info["picture"],
             "name": id_info["name"],
@@ -246,10 +344,19 @@ def init_app(
         raise HTTPException(status_code=500, detail="Orchestrator not found")
     app = FastAPI(lifespan=lifespan)
     app.state.client_id = client_id
+    app.state.id_token_verifier = IdTokenVerifier(client_id)
     app.state.orchestrator = createOrchestrator(orchestration_type)
+    app.state.session_backend = create_session_backend()
     app.include_router(routes)
     app.mount("/static", StaticFiles(directory="static"), name="static")
-    app.add_middleware(SessionMiddleware, secret_key=middleware_secret)
+    # Only the session id is kept in the cookie, history stays on the server
+    app.add_middleware(
+        ServerSessionMiddleware,
+        secret_key=middleware_secret,
+        backend=app.state.session_backend,
+    )
+    # Outermost, so the request span covers the session load and save
+    app.add_middleware(tracing.TracingMiddleware)
     return app
 
 
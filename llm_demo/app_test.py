@@ -12,6 +12,48 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import asyncio
+import json
+from types import SimpleNamespace
+
+from app import session_metrics, stream_chat_events
+from session_middleware import MemorySessionBackend
+
 
 def test_empty():
     pass
+
+
+class FailingOrchestrator:
+    async def user_session_stream(self, uuid, prompt):
+        yield {"type": "token", "content": "Hello"}
+        raise RuntimeError("connection reset")
+
+
+def test_stream_ends_with_error_event():
+    state = SimpleNamespace(orchestrator=FailingOrchestrator())
+    request = SimpleNamespace(app=SimpleNamespace(state=state), session={})
+
+    async def collect():
+        return [e async for e in stream_chat_events(request, "uuid", "hi")]
+
+    events = [json.loads(e.removeprefix("data: ")) for e in asyncio.run(collect())]
+    assert events[0] == {"type": "token", "content": "Hello"}
+    assert events[-1]["type"] == "error"
+    assert "connection reset" in events[-1]["content"]
+
+
+class StatsOrchestrator:
+    async def session_stats(self):
+        return {"user_sessions": {"entries": 1}}
+
+
+def test_session_metrics_reports_every_store():
+    state = SimpleNamespace(
+        orchestrator=StatsOrchestrator(), session_backend=MemorySessionBackend()
+    )
+    request = SimpleNamespace(app=SimpleNamespace(state=state))
+    stats = asyncio.run(session_metrics(request))
+    assert stats["user_sessions"] == {"entries": 1}
+    assert stats["http_sessions"]["entries"] == 0
+    assert stats["memory"]["rss_kb"] > 0
@@ -80,7 +80,7 @@ goldens = [
         query="What is the airport located in San Francisco?",
         tool_calls=[
             ToolCall(
-                name="Search Airport",
+                name="search_airports",
                 arguments={"country": "United States", "city": "San Francisco"},
             ),
         ],
@@ -90,7 +90,7 @@ goldens = [
         query="Tell me more about Denver International Airport?",
         tool_calls=[
             ToolCall(
-                name="Search Airport",
+                name="search_airports",
                 arguments={
                     "country": "United States",
                     "city": "Denver",
@@ -104,7 +104,7 @@ goldens = [
         query="What is the departure gate for flight CY 922?",
         tool_calls=[
             ToolCall(
-                name="Search Flights By Flight Number",
+                name="search_flights_by_number",
                 arguments={
                     "airline": "CY",
                     "flight_number": "922",
@@ -117,7 +117,7 @@ goldens = [
         query="What is flight CY 888 flying to?",
         tool_calls=[
             ToolCall(
-                name="Search Flights By Flight Number",
+                name="search_flights_by_number",
                 arguments={
                     "airline": "CY",
                     "flight_number": "888",
@@ -130,7 +130,7 @@ goldens = [
         query="What flights are headed to JFK tomorrow?",
         tool_calls=[
             ToolCall(
-                name="List Flights",
+                name="list_flights",
                 arguments={
                     "arrival_airport": "JFK",
                     "date": f"{get_date(1)}",
@@ -148,7 +148,7 @@ goldens = [
         query="Are there any luxury shops?",
         tool_calls=[
             ToolCall(
-                name="Search Amenities",
+                name="search_amenities",
                 arguments={
                     "query": "luxury shops",
                 },
@@ -160,7 +160,7 @@ goldens = [
         query="Where can I get coffee near gate A6?",
         tool_calls=[
             ToolCall(
-                name="Search Amenities",
+                name="search_amenities",
                 arguments={
                     "query": "coffee near gate A6",
                 },
@@ -172,7 +172,7 @@ goldens = [
         query="What is the flight cancellation policy?",
         tool_calls=[
             ToolCall(
-                name="Search Policies",
+                name="search_policies",
                 arguments={
                     "query": "flight cancellation policy",
                 },
@@ -184,7 +184,7 @@ goldens = [
         query="How many checked bags can I bring?",
         tool_calls=[
             ToolCall(
-                name="Search Policies",
+                name="search_policies",
                 arguments={
                     "query": "checked baggage allowance",
                 },
@@ -196,7 +196,7 @@ goldens = [
         query="I would like to book flight CY 922 departing from SFO on 2025-01-01 at 6:38am.",
         tool_calls=[
             ToolCall(
-                name="Insert Ticket",
+                name="insert_ticket",
                 arguments={
                     "airline": "CY",
                     "flight_number": "922",
@@ -211,7 +211,7 @@ goldens = [
         query="What flights are headed from SFO to DEN on January 1 2025?",
         tool_calls=[
             ToolCall(
-                name="List Flights",
+                name="list_flights",
                 arguments={
                     "departure_airport": "SFO",
                     "arrival_airport": "DEN",
@@ -226,7 +226,7 @@ goldens = [
         query="I would like to book the first flight.",
         tool_calls=[
             ToolCall(
-                name="Insert Ticket",
+                name="insert_ticket",
                 arguments={
                     "airline": "UA",
                     "flight_number": "1532",
@@ -241,12 +241,12 @@ goldens = [
     EvalData(
         category="List Tickets",
         query="Do I have any tickets?",
-        tool_calls=[ToolCall(name="List Tickets")],
+        tool_calls=[ToolCall(name="list_tickets")],
     ),
     EvalData(
         category="List Tickets",
         query="When is my next flight?",
-        tool_calls=[ToolCall(name="List Tickets")],
+        tool_calls=[ToolCall(name="list_tickets")],
     ),
     EvalData(
         category="Airline Related Question",
@@ -283,14 +283,14 @@ goldens = [
         query="Where can I get a snack near the gate for flight CY 352?",
         tool_calls=[
             ToolCall(
-                name="Search Flights By Flight Number",
+                name="search_flights_by_number",
                 arguments={
                     "airline": "CY",
                     "flight_number": "352",
                 },
             ),
             ToolCall(
-                name="Search Amenities",
+                name="search_amenities",
                 arguments={
                     "query": "snack near gate A2.",
                 },
@@ -302,13 +302,13 @@ goldens = [
         query="What are some flights from SFO to Chicago tomorrow?",
         tool_calls=[
             ToolCall(
-                name="Search Airport",
+                name="search_airports",
                 arguments={
                     "city": "Chicago",
                 },
             ),
             ToolCall(
-                name="List Flights",
+                name="list_flights",
                 arguments={
                     "departure_airport": "SFO",
                     "arrival_airport": "ORD",
@@ -62,7 +62,7 @@ async def run_llm_for_eval(
             eval_data.instruction = f"Answer user query based on context given. User query is {eval_data.query}."
 
         if eval_data.reset:
-            orc.user_session_reset(session, session_id)
+            await orc.user_session_reset(session, session_id)
     return eval_list
 
 
@@ -12,11 +12,22 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from . import langchain_tools, langgraph, vertexai_function_calling
-from .orchestrator import BaseOrchestrator, createOrchestrator
+import importlib
+from types import ModuleType
+
+from .orchestrator import ORCHESTRATORS, BaseOrchestrator, createOrchestrator
+
+
+def __getattr__(name: str) -> ModuleType:
+    # Orchestrator packages are imported on first use, see ORCHESTRATORS
+    if name in ORCHESTRATORS.values():
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 
 __ALL__ = [
     "BaseOrchestrator",
+    "ORCHESTRATORS",
     "createOrchestrator",
     "langchain_tools",
     "vertexai_function_calling",
@@ -0,0 +1,128 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import time
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import google.auth  # type: ignore
+from google.auth import compute_engine  # type: ignore
+from google.auth.transport.requests import Request  # type: ignore
+
+# Seconds before expiry at which a service ID token is refreshed
+ID_TOKEN_REFRESH_MARGIN = float(os.getenv("ID_TOKEN_REFRESH_MARGIN", default=300))
+# Lifetime assumed when the credentials do not report an expiry
+ID_TOKEN_DEFAULT_LIFETIME = 3600
+# Seconds to wait before retrying a failed background refresh
+ID_TOKEN_RETRY_DELAY = 10
+
+
+class IdTokenProvider:
+    """
+    Serves the ID token used to call the retrieval service on Cloud Run.
+
+    google-auth refreshes credentials with blocking HTTP requests, so refreshes
+    run in a worker thread. A background task renews the token
+    `refresh_margin` seconds before it expires; until then every request gets
+    the cached token without waiting. Only the very first request, or one made
+    after a refresh failed and the token expired, waits for a refresh, which
+    concurrent requests share.
+    """
+
+    def __init__(self, audience: str, refresh_margin: float = ID_TOKEN_REFRESH_MARGIN):
+        self.audience = audience
+        self.refresh_margin = refresh_margin
+        self._credentials: Any = None
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._refresh: Optional[asyncio.Task] = None
+        self._renewal: Optional[asyncio.Task] = None
+
+    async def get_token(self) -> str:
+        if self._token is not None and time.monotonic() < self._expires_at:
+            return self._token
+        if self._refresh is None or self._refresh.done():
+            self._refresh = asyncio.create_task(self._do_refresh())
+        await asyncio.shield(self._refresh)
+        assert self._token is not None
+        return self._token
+
+    async def _do_refresh(self):
+        token, lifetime = await asyncio.to_thread(self._fetch_token)
+        self._token = token
+        self._expires_at = time.monotonic() + lifetime
+        if self._renewal is None or self._renewal.done():
+            self._renewal = asyncio.create_task(self._renew())
+
+    async def _renew(self):
+        while True:
+            remaining = self._expires_at - time.monotonic()
+            # Short-lived tokens are renewed halfway through their lifetime
+            await asyncio.sleep(max(remaining - self.refresh_margin, remaining / 2, 1))
+            try:
+                token, lifetime = await asyncio.to_thread(self._fetch_token)
+            except Exception as err:
+                # The cached token stays in use until it actually expires
+                print(f"ID token refresh failed: {err}")
+                await asyncio.sleep(ID_TOKEN_RETRY_DELAY)
+                continue
+            self._token = token
+            self._expires_at = time.monotonic() + lifetime
+
+    def _fetch_token(self) -> tuple[str, float]:
+        """Refresh the credentials, blocking, and return the token and its lifetime."""
+        if self._credentials is None:
+            credentials, _ = google.auth.default()
+            if not hasattr(credentials, "id_token"):
+                # Use Compute Engine default credential
+                credentials = compute_engine.IDTokenCredentials(
+                    request=Request(),
+                    target_audience=self.audience,
+                    use_metadata_identity_endpoint=True,
+                )
+            self._credentials = credentials
+        self._credentials.refresh(Request())
+        token = getattr(self._credentials, "id_token", None) or self._credentials.token
+        expiry: Optional[datetime] = self._credentials.expiry
+        lifetime: float
+        if expiry is None:
+            lifetime = ID_TOKEN_DEFAULT_LIFETIME
+        else:
+            # google-auth reports expiry as a naive UTC datetime
+            lifetime = (expiry - datetime.utcnow()).total_seconds()
+        return token, max(lifetime, 0)
+
+    async def close(self):
+        for task in (self._refresh, self._renewal):
+            if task is not None:
+                task.cancel()
+        self._refresh = None
+        self._renewal = None
+
+
+_id_token_providers: Dict[str, IdTokenProvider] = {}
+
+
+def get_id_token_provider(audience: str) -> IdTokenProvider:
+    """Return the process-wide ID token provider for a service URL."""
+    if audience not in _id_token_providers:
+        _id_token_providers[audience] = IdTokenProvider(audience)
+    return _id_token_providers[audience]
+
+
+async def close_id_token_providers():
+    for provider in _id_token_providers.values():
+        await provider.close()
@@ -0,0 +1,143 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import os
+from types import SimpleNamespace
+from typing import Any, Optional
+
+import msgpack  # type: ignore
+from aiohttp import (
+    ClientResponse,
+    ClientSession,
+    ClientTimeout,
+    TCPConnector,
+    TraceConfig,
+    TraceRequestEndParams,
+    TraceRequestExceptionParams,
+    TraceRequestStartParams,
+)
+
+import tracing
+
+# Connection pool tuning for calls to the retrieval service
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", default=100))
+HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", default=50))
+HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("HTTP_KEEPALIVE_TIMEOUT", default=30))
+HTTP_DNS_CACHE_TTL = int(os.getenv("HTTP_DNS_CACHE_TTL", default=300))
+HTTP_REQUEST_TIMEOUT = float(os.getenv("HTTP_REQUEST_TIMEOUT", default=60))
+# Ask the retrieval service for msgpack instead of JSON response bodies
+HTTP_ACCEPT_MSGPACK = os.getenv("HTTP_ACCEPT_MSGPACK", default="false") == "true"
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+
+def create_trace_config() -> TraceConfig:
+    """
+    Trace each request in a client span, and send its traceparent so the
+    retrieval service continues the same trace.
+    """
+
+    async def on_request_start(
+        session: ClientSession, ctx: SimpleNamespace, params: TraceRequestStartParams
+    ):
+        ctx.span = tracing.start_span(
+            f"{params.method} {params.url.path}",
+            kind="client",
+            **{"http.method": params.method, "http.url": str(params.url)},
+        )
+        params.headers["traceparent"] = ctx.span.traceparent
+
+    async def on_request_end(
+        session: ClientSession, ctx: SimpleNamespace, params: TraceRequestEndParams
+    ):
+        status = params.response.status
+        ctx.span.set_attribute("http.status_code", status)
+        server_timing = params.response.headers.get("Server-Timing")
+        if server_timing:
+            ctx.span.set_attribute("http.server_timing", server_timing)
+        if status >= 400:
+            ctx.span.status = "error"
+        ctx.span.end()
+
+    async def on_request_exception(
+        session: ClientSession,
+        ctx: SimpleNamespace,
+        params: TraceRequestExceptionParams,
+    ):
+        ctx.span.record_error(params.exception)
+        ctx.span.end()
+
+    trace_config = TraceConfig()
+    trace_config.on_request_start.append(on_request_start)
+    trace_config.on_request_end.append(on_request_end)
+    trace_config.on_request_exception.append(on_request_exception)
+    return trace_config
+
+
+class HttpClientManager:
+    """
+    Owns the single aiohttp connector and ClientSession shared by every chat
+    session in the process. Per-user state such as auth headers is passed on
+    each request instead of living on the session.
+    """
+
+    def __init__(self):
+        self._connector: Optional[TCPConnector] = None
+        self._session: Optional[ClientSession] = None
+
+    async def get_session(self) -> ClientSession:
+        # The connector binds to the running event loop, so it is created lazily
+        if self._session is None or self._session.closed:
+            self._connector = TCPConnector(
+                limit=HTTP_POOL_LIMIT,
+                limit_per_host=HTTP_POOL_LIMIT_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=HTTP_DNS_CACHE_TTL,
+                enable_cleanup_closed=True,
+            )
+            self._session = ClientSession(
+                connector=self._connector,
+                timeout=ClientTimeout(total=HTTP_REQUEST_TIMEOUT),
+                raise_for_status=True,
+                trace_configs=[create_trace_config()],
+                headers={
+                    "Accept": (
+                        f"{MSGPACK_MEDIA_TYPE}, application/json"
+                        if HTTP_ACCEPT_MSGPACK
+                        else "application/json"
+                    )
+                },
+            )
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._connector = None
+
+
+_http_client_manager = HttpClientManager()
+
+
+def get_http_client_manager() -> HttpClientManager:
+    """Return the process-wide HTTP client manager."""
+    return _http_client_manager
+
+
+async def decode_response(response: ClientResponse) -> Any:
+    """Decode a retrieval service response body, msgpack or JSON."""
+    if response.content_type == MSGPACK_MEDIA_TYPE:
+        return msgpack.unpackb(await response.read())
+    return await response.json()
@@ -0,0 +1,62 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Optional
+from uuid import UUID
+
+from langchain_core.callbacks import AsyncCallbackHandler
+
+import tracing
+
+
+class SpanCallbackHandler(AsyncCallbackHandler):
+    """
+    Records the LLM and tool runs of an agent as spans. The executor starts
+    and ends runs through callbacks, so each span is a child of the span that
+    was current when the agent was invoked.
+    """
+
+    def __init__(self):
+        self._spans: dict[UUID, tracing.Span] = {}
+
+    async def on_chat_model_start(
+        self, serialized: dict[str, Any], messages: Any, *, run_id: UUID, **kwargs
+    ):
+        self._spans[run_id] = tracing.start_span("llm")
+
+    async def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs):
+        self._end(run_id)
+
+    async def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._end(run_id, error)
+
+    async def on_tool_start(
+        self, serialized: dict[str, Any], input_str: str, *, run_id: UUID, **kwargs
+    ):
+        name = serialized.get("name") or kwargs.get("name")
+        self._spans[run_id] = tracing.start_span(f"tool {name}")
+
+    async def on_tool_end(self, output: Any, *, run_id: UUID, **kwargs):
+        self._end(run_id)
+
+    async def on_tool_error(self, error: BaseException, *, run_id: UUID, **kwargs):
+        self._end(run_id, error)
+
+    def _end(self, run_id: UUID, error: Optional[BaseException] = None):
+        span = self._spans.pop(run_id, None)
+        if span is None:
+            return
+        if error is not None:
+            span.record_error(error)
+        span.end()
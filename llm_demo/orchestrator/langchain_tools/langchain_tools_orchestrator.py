@@ -16,23 +16,26 @@ import asyncio
 import os
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from aiohttp import ClientSession, TCPConnector
+from aiohttp import ClientSession
 from fastapi import HTTPException
-from langchain.agents import AgentType, initialize_agent
-from langchain.agents.agent import AgentExecutor
+from langchain.agents import AgentExecutor, create_tool_calling_agent
 from langchain.globals import set_verbose  # type: ignore
 from langchain.memory import ConversationBufferMemory
 from langchain_community.chat_message_histories import ChatMessageHistory
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.tools import StructuredTool
-from langchain_google_vertexai import ChatVertexAI
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.runnables.schema import StreamEvent
 from pytz import timezone
 
 from ..orchestrator import BaseOrchestrator, classproperty
+from ..request_context import RequestContext
+from ..session_store import SessionStore
+from ..streaming import chunk_text, tool_trace
+from .callbacks import SpanCallbackHandler
 from .tools import (
+    REQUEST_CONTEXT,
     get_confirmation_needing_tools,
     initialize_tools,
     insert_ticket,
@@ -49,59 +52,78 @@ BASE_HISTORY = {
 class UserAgent:
     client: ClientSession
     agent: AgentExecutor
+    context: RequestContext
 
     def __init__(
         self,
         client: ClientSession,
         agent: AgentExecutor,
         memory: ConversationBufferMemory,
+        context: RequestContext,
     ):
         self.client = client
         self.agent = agent
         self.memory = memory
+        self.context = context
 
     @classmethod
     def initialize_agent(
         cls,
         client: ClientSession,
-        tools: List[StructuredTool],
+        agent: AgentExecutor,
         history: List[BaseMessage],
-        prompt: ChatPromptTemplate,
-        model: str,
     ) -> "UserAgent":
-        # TODO: Use .bind_tools(tools) to bind the tools with the LLM.
-        llm = ChatVertexAI(max_output_tokens=512, model_name=model, temperature=0.0)
+        # Only the memory is per user, the agent executor is shared
         memory = ConversationBufferMemory(
             chat_memory=ChatMessageHistory(messages=history),
             memory_key="chat_history",
             input_key="input",
             output_key="output",
+            return_messages=True,
         )
-        agent = initialize_agent(
-            tools,
-            llm,
-            agent=AgentType.STRUCTURED_CHAT_ZERO_SHOT_REACT_DESCRIPTION,
-            memory=memory,
-            handle_parsing_errors=True,
-            max_iterations=3,
-            early_stopping_method="generate",
-            return_intermediate_steps=True,
-        )
-        agent.agent.llm_chain.prompt = prompt  # type: ignore
-        return UserAgent(client, agent, memory)
+        return UserAgent(client, agent, memory, RequestContext())
 
     async def close(self):
-        await self.client.close()
+        # The client is shared across sessions and closed by the orchestrator
+        self.context = RequestContext()
 
     async def invoke(self, prompt: str) -> Dict[str, Any]:
+        inputs = {"input": prompt, **self.memory.load_memory_variables({})}
+        # Tools read the user's context for the duration of this run
+        token = REQUEST_CONTEXT.set(self.context)
         try:
-            response = await self.agent.ainvoke({"input": prompt})
+            response = await self.agent.ainvoke(
+                inputs, config={"callbacks": [SpanCallbackHandler()]}
+            )
         except Exception as err:
             raise HTTPException(status_code=500, detail=f"Error invoking agent: {err}")
+        finally:
+            REQUEST_CONTEXT.reset(token)
+        self.memory.save_context({"input": prompt}, {"output": response["output"]})
         return response
 
+    async def stream(self, prompt: str) -> AsyncIterator[StreamEvent]:
+        """Run the agent and yield its LangChain events, the last one being the
+        executor's end event holding the full response."""
+        inputs = {"input": prompt, **self.memory.load_memory_variables({})}
+        response = None
+        token = REQUEST_CONTEXT.set(self.context)
+        try:
+            async for event in self.agent.astream_events(
+                inputs, config={"callbacks": [SpanCallbackHandler()]}, version="v2"
+            ):
+                if event["event"] == "on_chain_end" and not event["parent_ids"]:
+                    response = event["data"]["output"]
+                yield event
+        except Exception as err:
+            raise HTTPException(status_code=500, detail=f"Error invoking agent: {err}")
+        finally:
+            REQUEST_CONTEXT.reset(token)
+        if response is not None:
+            self.memory.save_context({"input": prompt}, {"output": response["output"]})
+
     async def insert_ticket(self, params: str):
-        return await insert_ticket(self.client, params)
+        return await insert_ticket(self.client, self.context, params)
 
     def reset_memory(self, base_message: List[BaseMessage]):
         self.memory.clear()
@@ -109,12 +131,12 @@ class UserAgent:
 
 
 class LangChainToolsOrchestrator(BaseOrchestrator):
-    _user_sessions: Dict[str, UserAgent]
-    # aiohttp context
-    connector = None
+    _user_sessions: SessionStore[UserAgent]
+    _agent: Optional[AgentExecutor] = None
 
     def __init__(self):
-        self._user_sessions = {}
+        self._user_sessions = SessionStore(on_evict=self.evict_user_session)
+        self.confirmation_needing_tools = get_confirmation_needing_tools()
 
     @classproperty
     def kind(cls):
@@ -135,7 +157,9 @@ class LangChainToolsOrchestrator(BaseOrchestrator):
         """
         return None
 
-    async def check_and_add_confirmations(self, response: Dict[str, Any]):
+    async def check_and_add_confirmations(
+        self, user_session: UserAgent, response: Dict[str, Any]
+    ):
         for step in response.get("intermediate_steps") or []:
             if len(step) > 0:
                 # Find the called tool in the step
@@ -143,17 +167,18 @@ class LangChainToolsOrchestrator(BaseOrchestrator):
                 # Check to see if the agent has made a decision to call Prepare Insert Ticket
                 # This tool is a no-op and requires user confirmation before continuing
                 if called_tool.tool in self.confirmation_needing_tools:
-                    if called_tool.tool == "Insert Ticket":
+                    if called_tool.tool == "insert_ticket":
                         flight_info = await validate_ticket(
-                            self.client, called_tool.tool_input
+                            user_session.client,
+                            user_session.context,
+                            called_tool.tool_input,
                         )
                         return {"tool": called_tool.tool, "params": flight_info}
                     return {"tool": called_tool.tool, "params": called_tool.tool_input}
         return None
 
     async def user_session_create(self, session: dict[str, Any]):
-        """Create and load an agent executor with tools and LLM."""
-        print("Initializing agent..")
+        """Create a user session with its own memory on the shared agent."""
         if "uuid" not in session:
             session["uuid"] = str(uuid.uuid4())
         id = session["uuid"]
@@ -161,19 +186,36 @@ class LangChainToolsOrchestrator(BaseOrchestrator):
             session["history"] = [BASE_HISTORY]
         history = self.parse_messages(session["history"])
         client = await self.create_client_session()
-        tools = await initialize_tools(client)
-        prompt = self.create_prompt_template(tools)
-        agent = UserAgent.initialize_agent(client, tools, history, prompt, self.MODEL)
-        self._user_sessions[id] = agent
-        self.confirmation_needing_tools = get_confirmation_needing_tools()
-        self.client = client
+        agent = await self.get_agent(client)
+        await self._user_sessions.put(
+            id, UserAgent.initialize_agent(client, agent, history)
+        )
+
+    async def get_agent(self, client: ClientSession) -> AgentExecutor:
+        """Build the tools, prompt and LLM once and share them across sessions."""
+        if self._agent is None:
+            print("Initializing agent..")
+            tools = await initialize_tools(client)
+            prompt = self.create_prompt_template()
+            llm = self.create_chat_model(max_output_tokens=512, temperature=0.0)
+            # Tools are bound to the LLM as native function declarations
+            agent = create_tool_calling_agent(llm, tools, prompt)
+            self._agent = AgentExecutor(
+                agent=agent,
+                tools=tools,
+                max_iterations=3,
+                return_intermediate_steps=True,
+            )
+        return self._agent
 
     async def user_session_invoke(self, uuid: str, prompt: str) -> dict[str, Any]:
         user_session = self.get_user_session(uuid)
         # Send prompt to LLM
         agent_response = await user_session.invoke(prompt)
         # Check for calls that may require confirmation to proceed
-        confirmation = await self.check_and_add_confirmations(agent_response)
+        confirmation = await self.check_and_add_confirmations(
+            user_session, agent_response
+        )
         # Build final response
         response = {}
         response["output"] = agent_response.get("output")
@@ -181,7 +223,31 @@ class LangChainToolsOrchestrator(BaseOrchestrator):
             response["confirmation"] = confirmation
         return response
 
-    def user_session_reset(self, session: dict[str, Any], uuid: str):
+    async def user_session_stream(
+        self, uuid: str, prompt: str
+    ) -> AsyncIterator[dict[str, Any]]:
+        user_session = self.get_user_session(uuid)
+        agent_response: Dict[str, Any] = {}
+        async for event in user_session.stream(prompt):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                text = chunk_text(event["data"]["chunk"])
+                if text:
+                    yield {"type": "token", "content": text}
+            elif kind == "on_tool_end":
+                trace = tool_trace(event["name"], event["data"].get("output"))
+                yield {"type": "trace", "content": trace}
+            elif kind == "on_chain_end" and not event["parent_ids"]:
+                agent_response = event["data"]["output"]
+        confirmation = await self.check_and_add_confirmations(
+            user_session, agent_response
+        )
+        response = {"output": agent_response.get("output")}
+        if confirmation:
+            response["confirmation"] = confirmation
+        yield {"type": "response", "content": response}
+
+    async def user_session_reset(self, session: dict[str, Any], uuid: str):
         user_session = self.get_user_session(uuid)
         del session["history"]
         base_history = self.get_base_history(session)
@@ -192,43 +258,18 @@ class LangChainToolsOrchestrator(BaseOrchestrator):
     def get_user_session(self, uuid: str) -> UserAgent:
         return self._user_sessions[uuid]
 
-    async def get_connector(self) -> TCPConnector:
-        if self.connector is None:
-            self.connector = TCPConnector(limit=100)
-        return self.connector
-
-    async def create_client_session(self) -> ClientSession:
-        return ClientSession(
-            connector=await self.get_connector(),
-            connector_owner=False,
-            headers={},
-            raise_for_status=True,
-        )
-
-    def create_prompt_template(self, tools: List[StructuredTool]) -> ChatPromptTemplate:
-        # Create new prompt template
-        tool_strings = "\n".join(
-            [f"> {tool.name}: {tool.description}" for tool in tools]
-        )
-        tool_names = ", ".join([tool.name for tool in tools])
-        format_instructions = FORMAT_INSTRUCTIONS.format(
-            tool_names=tool_names,
-        )
+    def create_prompt_template(self) -> ChatPromptTemplate:
+        # Tools are described to the LLM through native function declarations
         current_datetime = "Today's date and current time is {cur_datetime}."
-        template = "\n\n".join(
-            [
-                PREFIX,
-                current_datetime,
-                TOOLS_PREFIX,
-                tool_strings,
-                format_instructions,
-                SUFFIX,
-            ]
-        )
-        human_message_template = "{input}\n\n{agent_scratchpad}"
+        template = "\n\n".join([PREFIX, current_datetime, SUFFIX])
 
         prompt = ChatPromptTemplate.from_messages(
-            [("system", template), ("human", human_message_template)]
+            [
+                ("system", template),
+                MessagesPlaceholder("chat_history"),
+                ("human", "{input}"),
+                MessagesPlaceholder("agent_scratchpad"),
+            ]
         )
         prompt = prompt.partial(cur_datetime=self.get_datetime)
         return prompt
@@ -264,13 +305,24 @@ class LangChainToolsOrchestrator(BaseOrchestrator):
         user_session = self.get_user_session(uuid)
         if user_session:
             await user_session.close()
-            del self._user_sessions[uuid]
+            self._user_sessions.pop(uuid)
+
+    async def evict_user_session(self, uuid: str, user_session: UserAgent):
+        await user_session.close()
+
+    async def session_stats(self) -> dict[str, Any]:
+        stats = await super().session_stats()
+        stats["user_sessions"]["messages"] = sum(
+            len(s.memory.chat_memory.messages) for s in self._user_sessions.values()
+        )
+        return stats
 
     async def close_clients(self):
         close_client_tasks = [
             asyncio.create_task(a.close()) for a in self._user_sessions.values()
         ]
         await asyncio.gather(*close_client_tasks)
+        await super().close_clients()
 
 
 PREFIX = """The Cymbal Air Customer Service Assistant helps customers of Cymbal Air with their travel needs.
@@ -289,50 +341,6 @@ not answer questions about other peoples information for privacy reasons.
 Assistant is a powerful tool that can help answer a wide range of questions pertaining to travel on Cymbal Air
 as well as ammenities of San Francisco Airport."""
 
-TOOLS_PREFIX = """
-TOOLS:
-------
-
-Assistant has access to the following tools:"""
-
-FORMAT_INSTRUCTIONS = """Use a json blob to specify a tool by providing an action key (tool name)
-and an action_input key (tool input).
-
-Valid "action" values: "Final Answer" or {tool_names}
-
-Provide only ONE action per $JSON_BLOB, as shown:
-
-```
-{{{{
-  "action": $TOOL_NAME,
-  "action_input": $INPUT
-}}}}
-```
-
-Follow this format:
-
-Question: input question to answer
-Thought: consider previous and subsequent steps
-Action:
-```
-$JSON_BLOB
-```
-Observation: action result
-... (repeat Thought/Action/Observation N times)
-Thought: I know what to respond
-Action:
-```
-{{{{
-  "action": "Final Answer",
-  "action_input": "Final response to human"
-}}}}
-```"""
-
-SUFFIX = """Begin! Use tools if necessary. Respond directly if appropriate.
-If using a tool, reminder to ALWAYS respond with a valid json blob of a single action.
-Format is Action:```$JSON_BLOB```then Observation:.
-Thought:
-
-Previous conversation history:
-{chat_history}
-"""
+SUFFIX = """Use tools if necessary, calling several at once when they are independent.
+Respond directly if appropriate. Do NOT guess a date, airline code or flight number;
+ask the user if it is missing."""
@@ -0,0 +1,447 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#    http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, AsyncIterator, Callable, Iterator, Optional, Sequence
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+from ..session_store import SESSION_IDLE_TTL
+
+# Checkpointer backend: "memory", "sqlite" or "postgres"
+CHECKPOINTER = os.getenv("CHECKPOINTER", default="memory")
+# SQLite database path or Postgres connection string
+CHECKPOINTER_URI = os.getenv("CHECKPOINTER_URI", default="checkpoints.sqlite")
+# Number of most recent checkpoints kept for each thread
+CHECKPOINTER_KEEP_LAST = int(os.getenv("CHECKPOINTER_KEEP_LAST", default=5))
+# Seconds a thread is kept after its last checkpoint, longer than the session
+# idle TTL so no worker still holds a session whose thread is deleted
+CHECKPOINTER_THREAD_TTL = float(
+    os.getenv("CHECKPOINTER_THREAD_TTL", default=2 * SESSION_IDLE_TTL)
+)
+# Seconds between two sweeps for idle threads by the same saver
+IDLE_SWEEP_INTERVAL = 60
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS checkpoints (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    parent_checkpoint_id TEXT,
+    type TEXT,
+    checkpoint BLOB,
+    metadata_type TEXT,
+    metadata BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id)
+);
+CREATE TABLE IF NOT EXISTS writes (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    checkpoint_id TEXT NOT NULL,
+    task_id TEXT NOT NULL,
+    idx INTEGER NOT NULL,
+    channel TEXT NOT NULL,
+    type TEXT,
+    value BLOB,
+    task_path TEXT NOT NULL DEFAULT '',
+    PRIMARY KEY (thread_id, checkpoint_ns, checkpoint_id, task_id, idx)
+);
+CREATE TABLE IF NOT EXISTS threads (
+    thread_id TEXT PRIMARY KEY,
+    last_used REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS threads_last_used ON threads (last_used);
+"""
+
+
+class SQLiteSaver(BaseCheckpointSaver[int]):
+    """
+    Checkpoint saver backed by a SQLite file that several worker processes on
+    the same host can share.
+
+    Task writes are committed as soon as they are put, so a step that fails in
+    one worker can be resumed by another. Only the newest `keep_last`
+    checkpoints of each thread are retained, and threads without a new
+    checkpoint for `thread_ttl` seconds are deleted by whichever worker sweeps
+    next.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        keep_last: int = CHECKPOINTER_KEEP_LAST,
+        thread_ttl: float = CHECKPOINTER_THREAD_TTL,
+        clock: Callable[[], float] = time.time,
+    ):
+        super().__init__()
+        if keep_last < 1:
+            raise ValueError("keep_last must be at least 1")
+        self.keep_last = keep_last
+        self.thread_ttl = thread_ttl
+        self._clock = clock
+        self._next_sweep = float("-inf")
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = get_checkpoint_id(config)
+        with self._lock:
+            if checkpoint_id:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                    "metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ?",
+                    (thread_id, checkpoint_ns, checkpoint_id),
+                ).fetchone()
+            else:
+                row = self._conn.execute(
+                    "SELECT checkpoint_id, parent_checkpoint_id, type, checkpoint, "
+                    "metadata_type, metadata FROM checkpoints "
+                    "WHERE thread_id = ? AND checkpoint_ns = ? "
+                    "ORDER BY checkpoint_id DESC LIMIT 1",
+                    (thread_id, checkpoint_ns),
+                ).fetchone()
+            if row is None:
+                return None
+            return self._to_tuple(thread_id, checkpoint_ns, row)
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, "
+            "type, checkpoint, metadata_type, metadata FROM checkpoints"
+        )
+        clauses: list[str] = []
+        params: list[Any] = []
+        if config:
+            clauses.append("thread_id = ?")
+            params.append(config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                clauses.append("checkpoint_ns = ?")
+                params.append(checkpoint_ns)
+        if before and get_checkpoint_id(before):
+            clauses.append("checkpoint_id < ?")
+            params.append(get_checkpoint_id(before))
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        query += " ORDER BY checkpoint_id DESC"
+
+        with self._lock:
+            rows = self._conn.execute(query, params).fetchall()
+            results = []
+            for thread_id, checkpoint_ns, *row in rows:
+                checkpoint_tuple = self._to_tuple(thread_id, checkpoint_ns, row)
+                metadata = checkpoint_tuple.metadata
+                if filter and any(metadata.get(k) != v for k, v in filter.items()):
+                    continue
+                results.append(checkpoint_tuple)
+                if limit is not None and len(results) >= limit:
+                    break
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_type, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+        metadata_type, serialized_metadata = self.serde.dumps_typed(
+            get_checkpoint_metadata(config, metadata)
+        )
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO checkpoints VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint["id"],
+                    config["configurable"].get("checkpoint_id"),
+                    checkpoint_type,
+                    serialized_checkpoint,
+                    metadata_type,
+                    serialized_metadata,
+                ),
+            )
+            self._prune(thread_id, checkpoint_ns)
+            # Wall clock time, other processes compare against it
+            now = self._clock()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO threads VALUES (?, ?)", (thread_id, now)
+            )
+            if now >= self._next_sweep:
+                self._next_sweep = now + IDLE_SWEEP_INTERVAL
+                self._delete_idle_threads(now)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        rows = []
+        for idx, (channel, value) in enumerate(writes):
+            value_type, serialized_value = self.serde.dumps_typed(value)
+            rows.append(
+                (
+                    thread_id,
+                    checkpoint_ns,
+                    checkpoint_id,
+                    task_id,
+                    WRITES_IDX_MAP.get(channel, idx),
+                    channel,
+                    value_type,
+                    serialized_value,
+                    task_path,
+                )
+            )
+        # Regular writes are never overwritten, special channel writes are
+        regular = [row for row in rows if row[4] >= 0]
+        special = [row for row in rows if row[4] < 0]
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                regular,
+            )
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO writes VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                special,
+            )
+
+    def delete_thread(self, thread_id: str) -> None:
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM checkpoints WHERE thread_id = ?", (thread_id,)
+            )
+            self._conn.execute("DELETE FROM writes WHERE thread_id = ?", (thread_id,))
+            self._conn.execute("DELETE FROM threads WHERE thread_id = ?", (thread_id,))
+
+    def count_threads(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM threads").fetchone()
+        return count
+
+    def delete_idle_threads(self):
+        """Delete threads that had no new checkpoint for `thread_ttl` seconds."""
+        with self._lock, self._conn:
+            self._delete_idle_threads(self._clock())
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(
+            lambda: list(self.list(config, filter=filter, before=before, limit=limit))
+        )
+        for checkpoint_tuple in results:
+            yield checkpoint_tuple
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(
+            self.put, config, checkpoint, metadata, new_versions
+        )
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await asyncio.to_thread(self.delete_thread, thread_id)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        """Delete all but the newest checkpoints of a thread. Caller holds the lock."""
+        row = self._conn.execute(
+            "SELECT checkpoint_id FROM checkpoints "
+            "WHERE thread_id = ? AND checkpoint_ns = ? "
+            "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET ?",
+            (thread_id, checkpoint_ns, self.keep_last - 1),
+        ).fetchone()
+        if row is None:
+            return
+        for table in ("checkpoints", "writes"):
+            self._conn.execute(
+                f"DELETE FROM {table} "
+                "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id < ?",
+                (thread_id, checkpoint_ns, row[0]),
+            )
+
+    def _delete_idle_threads(self, now: float):
+        """Caller holds the lock and commits."""
+        idle = "SELECT thread_id FROM threads WHERE last_used < ?"
+        cutoff = (now - self.thread_ttl,)
+        for table in ("checkpoints", "writes"):
+            self._conn.execute(
+                f"DELETE FROM {table} WHERE thread_id IN ({idle})", cutoff
+            )
+        self._conn.execute("DELETE FROM threads WHERE last_used < ?", cutoff)
+
+    def _to_tuple(self, thread_id: str, checkpoint_ns: str, row) -> CheckpointTuple:
+        (
+            checkpoint_id,
+            parent_checkpoint_id,
+            checkpoint_type,
+            checkpoint,
+            metadata_type,
+            metadata,
+        ) = row
+        writes = self._conn.execute(
+            "SELECT task_id, channel, type, value FROM writes "
+            "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? "
+            "ORDER BY task_id, idx",
+            (thread_id, checkpoint_ns, checkpoint_id),
+        ).fetchall()
+        return CheckpointTuple(
+            config={
+                "configurable": {
+                    "thread_id": thread_id,
+                    "checkpoint_ns": checkpoint_ns,
+                    "checkpoint_id": checkpoint_id,
+                }
+            },
+            checkpoint=self.serde.loads_typed((checkpoint_type, checkpoint)),
+            metadata=self.serde.loads_typed((metadata_type, metadata)),
+            parent_config=(
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed((value_type, value)))
+                for task_id, channel, value_type, value in writes
+            ],
+        )
+
+
+async def create_checkpointer(
+    kind: str = CHECKPOINTER, uri: str = CHECKPOINTER_URI
+) -> BaseCheckpointSaver:
+    """Create the checkpoint saver configured for this process."""
+    if kind == "memory":
+        return MemorySaver()
+    if kind == "sqlite":
+        return SQLiteSaver(uri)
+    if kind == "postgres":
+        # Optional dependency, only needed when checkpoints live in Postgres
+        try:
+            from .postgres_checkpointer import create_postgres_saver
+        except ImportError as err:
+            raise ImportError(
+                "The postgres checkpointer needs the langgraph-checkpoint-postgres"
+                " and psycopg-pool packages"
+            ) from err
+        return await create_postgres_saver(
+            uri, keep_last=CHECKPOINTER_KEEP_LAST, thread_ttl=CHECKPOINTER_THREAD_TTL
+        )
+    raise TypeError(f"No checkpointer of kind {kind}")
+
+
+async def count_threads(checkpointer: BaseCheckpointSaver) -> Optional[int]:
+    """Number of threads the checkpoint saver holds, across all workers if shared."""
+    if isinstance(checkpointer, MemorySaver):
+        return len(checkpointer.storage)
+    if isinstance(checkpointer, SQLiteSaver):
+        return await asyncio.to_thread(checkpointer.count_threads)
+    if hasattr(checkpointer, "acount_threads"):
+        return await checkpointer.acount_threads()
+    return None
+
+
+async def close_checkpointer(checkpointer: BaseCheckpointSaver):
+    """Release the connections held by a checkpoint saver."""
+    if isinstance(checkpointer, SQLiteSaver):
+        checkpointer.close()
+    elif hasattr(checkpointer, "conn") and hasattr(checkpointer.conn, "close"):
+        # Postgres saver owns a connection pool
+        await checkpointer.conn.close()
+
+
+def is_shared(checkpointer: BaseCheckpointSaver) -> bool:
+    """
+    Whether the checkpoints are visible to other worker processes.
+
+    A worker evicting a session cannot tell whether another worker is still
+    serving it, so it leaves threads of a shared checkpointer alone. The saver
+    deletes them itself once they are idle for `CHECKPOINTER_THREAD_TTL`.
+    """
+    return not isinstance(checkpointer, MemorySaver)
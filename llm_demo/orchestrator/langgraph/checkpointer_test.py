@@ -0,0 +1,146 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import pytest
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import BaseCheckpointSaver, empty_checkpoint
+from langgraph.checkpoint.memory import MemorySaver
+
+from ..testing import FakeClock
+from .checkpointer import SQLiteSaver, count_threads, create_checkpointer
+
+
+def put_checkpoint(
+    saver: BaseCheckpointSaver, thread_id: str, step: int
+) -> RunnableConfig:
+    checkpoint = empty_checkpoint()
+    checkpoint["id"] = f"{step:04d}"
+    config: RunnableConfig = {
+        "configurable": {"thread_id": thread_id, "checkpoint_ns": ""}
+    }
+    return saver.put(config, checkpoint, {"step": step}, {})
+
+
+def test_put_and_get_tuple(tmp_path):
+    saver = SQLiteSaver(str(tmp_path / "checkpoints.sqlite"))
+    config = put_checkpoint(saver, "t1", 1)
+    put_checkpoint(saver, "t1", 2)
+
+    latest = saver.get_tuple({"configurable": {"thread_id": "t1"}})
+    assert latest is not None
+    assert latest.checkpoint["id"] == "0002"
+    assert latest.metadata["step"] == 2
+    assert latest.parent_config is None
+
+    first = saver.get_tuple(config)
+    assert first is not None and first.checkpoint["id"] == "0001"
+    assert saver.get_tuple({"configurable": {"thread_id": "t2"}}) is None
+    saver.close()
+
+
+def test_put_writes_is_visible_to_other_savers(tmp_path):
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = SQLiteSaver(path)
+    config = put_checkpoint(saver, "t1", 1)
+    saver.put_writes(config, [("messages", "hello"), ("answer", 42)], "task-1")
+    asyncio.run(saver.aput_writes(config, [("messages", "again")], "task-2"))
+
+    # A second worker process opens the same file and sees every write
+    other = SQLiteSaver(path)
+    checkpoint_tuple = other.get_tuple(config)
+    assert checkpoint_tuple is not None
+    assert checkpoint_tuple.pending_writes == [
+        ("task-1", "messages", "hello"),
+        ("task-1", "answer", 42),
+        ("task-2", "messages", "again"),
+    ]
+    other.close()
+    saver.close()
+
+
+def test_put_prunes_old_checkpoints(tmp_path):
+    saver = SQLiteSaver(str(tmp_path / "checkpoints.sqlite"), keep_last=2)
+    for step in range(1, 5):
+        config = put_checkpoint(saver, "t1", step)
+        saver.put_writes(config, [("messages", step)], "task")
+    put_checkpoint(saver, "t2", 1)
+
+    listed = list(saver.list({"configurable": {"thread_id": "t1"}}))
+    assert [t.checkpoint["id"] for t in listed] == ["0004", "0003"]
+    assert [t.pending_writes for t in listed] == [
+        [("task", "messages", 4)],
+        [("task", "messages", 3)],
+    ]
+    assert len(list(saver.list(None))) == 3
+    assert [t.checkpoint["id"] for t in saver.list(None, filter={"step": 1})] == [
+        "0001"
+    ]
+    rows = saver._conn.execute("SELECT COUNT(*) FROM writes").fetchone()
+    assert rows == (2,)
+    saver.close()
+
+
+def test_delete_thread(tmp_path):
+    saver = SQLiteSaver(str(tmp_path / "checkpoints.sqlite"))
+    config = put_checkpoint(saver, "t1", 1)
+    saver.put_writes(config, [("messages", "hello")], "task")
+    put_checkpoint(saver, "t2", 1)
+
+    asyncio.run(saver.adelete_thread("t1"))
+    assert saver.get_tuple({"configurable": {"thread_id": "t1"}}) is None
+    assert saver.get_tuple({"configurable": {"thread_id": "t2"}}) is not None
+    rows = saver._conn.execute("SELECT COUNT(*) FROM writes").fetchone()
+    assert rows == (0,)
+    saver.close()
+
+
+def test_put_deletes_idle_threads(tmp_path):
+    clock = FakeClock()
+    path = str(tmp_path / "checkpoints.sqlite")
+    saver = SQLiteSaver(path, thread_ttl=100, clock=clock)
+    config = put_checkpoint(saver, "t1", 1)
+    saver.put_writes(config, [("messages", "hello")], "task")
+    clock.now = 50
+    put_checkpoint(saver, "t2", 1)
+
+    # Another worker sweeps when it next saves a checkpoint
+    other = SQLiteSaver(path, thread_ttl=100, clock=clock)
+    clock.now = 120
+    put_checkpoint(other, "t3", 1)
+    assert saver.get_tuple({"configurable": {"thread_id": "t1"}}) is None
+    assert saver.get_tuple({"configurable": {"thread_id": "t2"}}) is not None
+    rows = saver._conn.execute("SELECT COUNT(*) FROM writes").fetchone()
+    assert rows == (0,)
+
+    clock.now = 160
+    saver.delete_idle_threads()
+    threads = saver._conn.execute("SELECT thread_id FROM threads").fetchall()
+    assert threads == [("t3",)]
+    assert asyncio.run(count_threads(saver)) == 1
+    other.close()
+    saver.close()
+
+
+def test_create_checkpointer_rejects_unknown_kind():
+    with pytest.raises(TypeError, match="No checkpointer of kind redis"):
+        asyncio.run(create_checkpointer("redis"))
+
+
+def test_count_threads_of_memory_saver():
+    saver = MemorySaver()
+    put_checkpoint(saver, "t1", 1)
+    put_checkpoint(saver, "t2", 1)
+    assert asyncio.run(count_threads(saver)) == 2
@@ -15,23 +15,44 @@
 import asyncio
 import os
 import uuid
-from datetime import datetime
-from typing import Annotated, Any, Dict, List, Literal, Optional, Sequence, TypedDict
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    Dict,
+    List,
+    Literal,
+    Optional,
+    Sequence,
+    TypedDict,
+)
 
-from aiohttp import ClientSession, TCPConnector
 from fastapi import HTTPException
 from langchain.globals import set_verbose  # type: ignore
 from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, ToolMessage
-from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from langchain_core.prompts import MessagesPlaceholder
 from langchain_core.runnables import RunnableConfig, RunnableLambda
-from langchain_core.tools import StructuredTool
-from langgraph.checkpoint.base import empty_checkpoint
-from langgraph.checkpoint.memory import MemorySaver
-from pytz import timezone
 
 from ..orchestrator import BaseOrchestrator, classproperty
+from ..session_store import SessionStore
+from ..streaming import chunk_text
+from .checkpointer import (
+    CHECKPOINTER,
+    close_checkpointer,
+    count_threads,
+    create_checkpointer,
+    is_shared,
+)
+from .prompt import CompiledPrompt
 from .react_graph import create_graph
-from .tools import initialize_tools
+from .tool_cache import ToolResultCache
+from .tool_guard import ToolGuard
+from .tools import (
+    get_cached_tool_scopes,
+    get_idempotent_tools,
+    get_tool_timeouts,
+    initialize_tools,
+)
 
 DEBUG = bool(os.getenv("DEBUG", default=False))
 set_verbose(DEBUG)
@@ -42,15 +63,14 @@ BASE_HISTORY = {
 
 
 class LangGraphOrchestrator(BaseOrchestrator):
-    _user_sessions: Dict[str, str]
-    # aiohttp context
-    connector = None
-    client: Optional[ClientSession] = None
+    _user_sessions: SessionStore[str]
 
     def __init__(self):
-        self._user_sessions = {}
+        self._user_sessions = SessionStore(on_evict=self.evict_user_session)
         self._langgraph_app = None
         self._checkpointer = None
+        self._tool_cache = ToolResultCache(get_cached_tool_scopes())
+        self._tool_guard = ToolGuard(get_idempotent_tools(), get_tool_timeouts())
 
     @classproperty
     def kind(cls):
@@ -65,23 +85,34 @@ class LangGraphOrchestrator(BaseOrchestrator):
 
     async def user_session_decline_ticket(self, uuid: str) -> dict[str, Any]:
         config = self.get_config(uuid)
+        state = await self._langgraph_app.aget_state(config)
         human_message = HumanMessage(
             content="I changed my mind. Decline ticket booking."
         )
-        self._langgraph_app.update_state(config, {"messages": [human_message]})
+        messages = self.answer_pending_booking(state.values["messages"])
+        await self._langgraph_app.aupdate_state(
+            config, {"messages": [*messages, human_message]}
+        )
         response = await self.user_session_invoke(uuid, None)
         return response
 
     async def user_session_create(self, session: dict[str, Any]):
         """Create and load an agent executor with tools and LLM."""
-        client = await self.create_client_session()
         if self._langgraph_app is None:
             print("Initializing graph..")
+            client = await self.create_client_session()
             tools = await initialize_tools(client)
-            prompt = self.create_prompt_template(tools)
-            checkpointer = MemorySaver()
+            prompt = self.compile_prompt()
+            checkpointer = await create_checkpointer()
             langgraph_app = await create_graph(
-                tools, checkpointer, prompt, self.MODEL, client, DEBUG
+                tools,
+                checkpointer,
+                prompt,
+                self.create_chat_model(max_output_tokens=512, temperature=0.0),
+                client,
+                DEBUG,
+                self._tool_cache,
+                self._tool_guard,
             )
             self._checkpointer = checkpointer
             self._langgraph_app = langgraph_app
@@ -94,30 +125,89 @@ class LangGraphOrchestrator(BaseOrchestrator):
             session["history"] = [BASE_HISTORY]
         history = self.parse_messages(session["history"])
 
+        # Registering first purges the checkpoints of an expired session id
+        await self._user_sessions.put(session_id, "")
         config = self.get_config(session_id)
-        self._langgraph_app.update_state(config, {"messages": history})
-        self._user_sessions[session_id] = ""
-        self.client = client
+        # With a shared checkpointer another worker may already hold the thread
+        state = await self._langgraph_app.aget_state(config)
+        if not state.values.get("messages"):
+            await self._langgraph_app.aupdate_state(config, {"messages": history})
 
     async def user_session_invoke(
         self, uuid: str, user_prompt: Optional[str]
     ) -> dict[str, Any]:
         config = self.get_config(uuid)
-        cur_message_index = (
-            len(self._langgraph_app.get_state(config).values["messages"]) - 1
-        )
-        if user_prompt:
-            user_query = [HumanMessage(content=user_prompt)]
-            app_input = {
-                "messages": user_query,
-                "user_id_token": self.get_user_id_token(uuid),
-            }
-        else:
-            app_input = None
+        state = await self._langgraph_app.aget_state(config)
+        cur_message_index = len(state.values["messages"]) - 1
         final_state = await self._langgraph_app.ainvoke(
-            app_input,
+            self.get_app_input(uuid, user_prompt, state.values["messages"]),
             config=config,
         )
+        return self.build_response(final_state, cur_message_index)
+
+    async def user_session_stream(
+        self, uuid: str, user_prompt: str
+    ) -> AsyncIterator[dict[str, Any]]:
+        config = self.get_config(uuid)
+        state = await self._langgraph_app.aget_state(config)
+        cur_message_index = len(state.values["messages"]) - 1
+        async for event in self._langgraph_app.astream_events(
+            self.get_app_input(uuid, user_prompt, state.values["messages"]),
+            config=config,
+            version="v2",
+        ):
+            kind = event["event"]
+            if kind == "on_chat_model_stream":
+                text = chunk_text(event["data"]["chunk"])
+                if text:
+                    yield {"type": "token", "content": text}
+            elif kind == "on_chain_end" and event["name"] == "tools":
+                # Read the node output so cached results are traced as well
+                output = event["data"].get("output") or {}
+                for trace in self.retrieve_trace(output.get("messages", [])):
+                    yield {"type": "trace", "content": trace}
+        # The run may stop early at the booking confirmation interrupt
+        final_state = await self._langgraph_app.aget_state(config)
+        response = self.build_response(final_state.values, cur_message_index)
+        yield {"type": "response", "content": response}
+
+    def get_app_input(
+        self, uuid: str, user_prompt: Optional[str], messages: List[BaseMessage]
+    ) -> Optional[dict[str, Any]]:
+        if not user_prompt:
+            # Resume the graph from its last checkpoint
+            return None
+        # A new question while a booking awaits confirmation skips the booking
+        return {
+            "messages": [
+                *self.answer_pending_booking(messages),
+                HumanMessage(content=user_prompt),
+            ],
+            "user_id_token": self.get_user_id_token(uuid),
+        }
+
+    def answer_pending_booking(self, messages: List[BaseMessage]) -> List[ToolMessage]:
+        """
+        Return a tool response for a booking the user did not confirm, since
+        the model requires every tool call to be followed by its response.
+        """
+        last_message = messages[-1] if messages else None
+        if isinstance(last_message, AIMessage) and last_message.additional_kwargs.get(
+            "confirmation"
+        ):
+            return [
+                ToolMessage(
+                    content="The user did not confirm the booking.",
+                    name=tool_call["name"],
+                    tool_call_id=tool_call["id"],
+                )
+                for tool_call in last_message.tool_calls
+            ]
+        return []
+
+    def build_response(
+        self, final_state: dict[str, Any], cur_message_index: int
+    ) -> dict[str, Any]:
         messages = final_state["messages"]
         # Retrieve tracing information
         trace = self.retrieve_trace(messages[cur_message_index:])
@@ -148,24 +238,23 @@ class LangGraphOrchestrator(BaseOrchestrator):
                 add_kwargs = m.additional_kwargs
                 if add_kwargs and add_kwargs.get("sql"):
                     trace_info["sql"] = add_kwargs.get("sql")
+                if add_kwargs and add_kwargs.get("cache"):
+                    trace_info["cache"] = add_kwargs.get("cache")
                 trace.append(trace_info)
         return trace
 
-    def user_session_reset(self, session: dict[str, Any], uuid: str):
+    async def user_session_reset(self, session: dict[str, Any], uuid: str):
         del session["history"]
         base_history = self.get_base_history(session)
         session["history"] = [base_history]
         history = self.parse_messages(session["history"])
 
         # Reset graph checkpointer
-        checkpoint = empty_checkpoint()
-        config = self.get_config(uuid)
-        self._checkpointer.put(
-            config=config, checkpoint=checkpoint, metadata={}, new_versions={}
-        )
+        await self._checkpointer.adelete_thread(uuid)
 
         # Update state with message history
-        self._langgraph_app.update_state(config, {"messages": history})
+        config = self.get_config(uuid)
+        await self._langgraph_app.aupdate_state(config, {"messages": history})
 
     def get_user_session(self, uuid: str):
         raise NotImplementedError("Irrelevant to LangGraph.")
@@ -176,50 +265,9 @@ class LangGraphOrchestrator(BaseOrchestrator):
     def get_user_id_token(self, uuid: str) -> Optional[str]:
         return self._user_sessions.get(uuid)
 
-    async def get_connector(self) -> TCPConnector:
-        if self.connector is None:
-            self.connector = TCPConnector(limit=100)
-        return self.connector
-
-    async def create_client_session(self) -> ClientSession:
-        return ClientSession(
-            connector=await self.get_connector(),
-            connector_owner=False,
-            headers={},
-            raise_for_status=True,
-        )
-
-    def create_prompt_template(self, tools: List[StructuredTool]) -> ChatPromptTemplate:
-        # Create new prompt template
-        tool_strings = "\n".join(
-            [f"> {tool.name}: {tool.description}" for tool in tools]
-        )
-        tool_names = ", ".join([tool.name for tool in tools])
-        format_instructions = FORMAT_INSTRUCTIONS.format(
-            tool_names=tool_names,
-        )
-        current_datetime = "Today's date and current time is {cur_datetime}."
-        template = "\n\n".join(
-            [
-                PREFIX,
-                current_datetime,
-                TOOLS_PREFIX,
-                tool_strings,
-                format_instructions,
-                SUFFIX,
-            ]
-        )
-
-        prompt = ChatPromptTemplate.from_messages(
-            [("system", template), ("placeholder", "{messages}")]
-        )
-        prompt = prompt.partial(cur_datetime=self.get_datetime)
-        return prompt
-
-    def get_datetime(self):
-        formatter = "%A, %m/%d/%Y, %H:%M:%S"
-        now = datetime.now(timezone("US/Pacific"))
-        return now.strftime(formatter)
+    def compile_prompt(self) -> CompiledPrompt:
+        # Tools are described to the model through native function declarations
+        return CompiledPrompt("\n\n".join([PREFIX, SUFFIX]))
 
     def parse_messages(self, datas: List[Any]) -> List[BaseMessage]:
         messages: List[BaseMessage] = []
@@ -247,14 +295,31 @@ class LangGraphOrchestrator(BaseOrchestrator):
         return {"configurable": {"thread_id": uuid, "checkpoint_ns": ""}}
 
     async def user_session_signout(self, uuid: str):
-        checkpoint = empty_checkpoint()
-        config = self.get_config(uuid)
-        self._checkpointer.put(config=config, checkpoint=checkpoint, metadata={})
-        del self._user_sessions[uuid]
+        await self._checkpointer.adelete_thread(uuid)
+        self._user_sessions.pop(uuid)
+
+    async def evict_user_session(self, uuid: str, user_id_token: str):
+        # Threads in a shared checkpointer may still be in use by other workers,
+        # see is_shared for how long they are kept
+        if not is_shared(self._checkpointer):
+            await self._checkpointer.adelete_thread(uuid)
 
     async def close_clients(self):
-        if self.client:
-            await self.client.close()
+        await super().close_clients()
+        if self._checkpointer is not None:
+            await close_checkpointer(self._checkpointer)
+        self._tool_guard.close()
+
+    async def session_stats(self) -> dict[str, Any]:
+        stats = await super().session_stats()
+        stats["tool_cache"] = self._tool_cache.stats()
+        stats["tool_breakers"] = self._tool_guard.stats()
+        if self._checkpointer is not None:
+            stats["checkpointer"] = {
+                "kind": CHECKPOINTER,
+                "threads": await count_threads(self._checkpointer),
+            }
+        return stats
 
 
 PREFIX = """The Cymbal Air Customer Service Assistant helps customers of Cymbal Air with their travel needs.
@@ -273,38 +338,6 @@ not answer questions about other peoples information for privacy reasons.
 Assistant is a powerful tool that can help answer a wide range of questions pertaining to travel on Cymbal Air
 as well as ammenities of San Francisco Airport."""
 
-TOOLS_PREFIX = """
-TOOLS:
-------
-Assistant can ask the user to use tools to look up information that may be helpful in answering the users original question. The tools the human can use are:
-
-"""
-
-FORMAT_INSTRUCTIONS = """
-When responding, please output a response in one of two formats:
-
-** Option 1:**
-Use this is you want to use a tool.
-Markdown code snippet formatted in the following schema:
-```json
-{{{{
-  "action": string, \ The action to take. Must be one of {tool_names}
-  "action_input": string \ The input to the action
-}}}}
-```
-
-**Option 2:**
-Use this if you want to respond directly to the human.
-Markdown code snippet formatted following schema:
-```json
-{{{{
-  "action": "Final Answer",
-  "action_input": string \ You should put what you want to return to user here
-}}}}
-```
-"""
-
-SUFFIX = """Begin! Use tools if necessary. Respond directly if appropriate.
-
-Remember to respond with a markdown code snippet of a json a single action, and NOTHING else.
-"""
+SUFFIX = """Use tools if necessary, calling several at once when they are independent.
+Respond directly if appropriate. Do NOT guess a date, airline code or flight number;
+ask the user if it is missing."""
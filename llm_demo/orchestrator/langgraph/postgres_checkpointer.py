@@ -0,0 +1,151 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Needs the optional langgraph-checkpoint-postgres and psycopg-pool packages,
+# only import this module when checkpoints live in Postgres.
+
+import time
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import ChannelVersions, Checkpoint, CheckpointMetadata
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver  # type: ignore
+from psycopg_pool import AsyncConnectionPool  # type: ignore
+
+from .checkpointer import IDLE_SWEEP_INTERVAL
+
+# Last checkpoint time of each thread, taken from the database clock
+THREADS_SCHEMA = [
+    """CREATE TABLE IF NOT EXISTS checkpoint_threads (
+    thread_id TEXT PRIMARY KEY,
+    last_used TIMESTAMPTZ NOT NULL DEFAULT now()
+);""",
+    """CREATE INDEX IF NOT EXISTS checkpoint_threads_last_used
+    ON checkpoint_threads (last_used);""",
+]
+
+# Blobs hold channel values by version, drop those no checkpoint refers to
+DELETE_UNUSED_BLOBS_SQL = """
+DELETE FROM checkpoint_blobs b
+WHERE b.thread_id = %s AND b.checkpoint_ns = %s AND NOT EXISTS (
+    SELECT 1 FROM checkpoints c
+    WHERE c.thread_id = b.thread_id
+        AND c.checkpoint_ns = b.checkpoint_ns
+        AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+)
+"""
+
+
+class PostgresSaver(AsyncPostgresSaver):
+    """
+    AsyncPostgresSaver that retains only the newest `keep_last` checkpoints of
+    each thread and deletes threads idle for `thread_ttl` seconds, like
+    SQLiteSaver.
+    """
+
+    def __init__(self, pool: AsyncConnectionPool, *, keep_last: int, thread_ttl: float):
+        super().__init__(pool)  # type: ignore[arg-type]
+        if keep_last < 1:
+            raise ValueError("keep_last must be at least 1")
+        self.keep_last = keep_last
+        self.thread_ttl = thread_ttl
+        self._next_sweep = float("-inf")
+
+    async def setup(self) -> None:
+        await super().setup()
+        async with self._cursor() as cur:
+            for statement in THREADS_SCHEMA:
+                await cur.execute(statement)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = await super().aput(config, checkpoint, metadata, new_versions)
+        thread_id = next_config["configurable"]["thread_id"]
+        await self.aprune(thread_id, next_config["configurable"]["checkpoint_ns"])
+        async with self._cursor() as cur:
+            await cur.execute(
+                "INSERT INTO checkpoint_threads VALUES (%s, now()) "
+                "ON CONFLICT (thread_id) DO UPDATE SET last_used = now()",
+                (thread_id,),
+            )
+        if time.monotonic() >= self._next_sweep:
+            self._next_sweep = time.monotonic() + IDLE_SWEEP_INTERVAL
+            await self.adelete_idle_threads()
+        return next_config
+
+    async def aprune(self, thread_id: str, checkpoint_ns: str):
+        """Delete all but the newest checkpoints of a thread."""
+        async with self._cursor(pipeline=True) as cur:
+            await cur.execute(
+                "SELECT checkpoint_id FROM checkpoints "
+                "WHERE thread_id = %s AND checkpoint_ns = %s "
+                "ORDER BY checkpoint_id DESC LIMIT 1 OFFSET %s",
+                (thread_id, checkpoint_ns, self.keep_last - 1),
+            )
+            row = await cur.fetchone()
+            if row is None:
+                return
+            for table in ("checkpoints", "checkpoint_writes"):
+                await cur.execute(
+                    f"DELETE FROM {table} WHERE thread_id = %s "
+                    "AND checkpoint_ns = %s AND checkpoint_id < %s",
+                    (thread_id, checkpoint_ns, row["checkpoint_id"]),
+                )
+            await cur.execute(DELETE_UNUSED_BLOBS_SQL, (thread_id, checkpoint_ns))
+
+    async def adelete_thread(self, thread_id: str) -> None:
+        await super().adelete_thread(thread_id)
+        async with self._cursor() as cur:
+            await cur.execute(
+                "DELETE FROM checkpoint_threads WHERE thread_id = %s", (thread_id,)
+            )
+
+    async def acount_threads(self) -> int:
+        async with self._cursor() as cur:
+            await cur.execute("SELECT COUNT(*) AS n FROM checkpoint_threads")
+            row = await cur.fetchone()
+        return row["n"]
+
+    async def adelete_idle_threads(self):
+        """Delete threads that had no new checkpoint for `thread_ttl` seconds."""
+        async with self._cursor(pipeline=True) as cur:
+            await cur.execute(
+                "DELETE FROM checkpoint_threads "
+                "WHERE last_used < now() - make_interval(secs => %s) "
+                "RETURNING thread_id",
+                (self.thread_ttl,),
+            )
+            thread_ids = [row["thread_id"] for row in await cur.fetchall()]
+            if not thread_ids:
+                return
+            for table in ("checkpoints", "checkpoint_writes", "checkpoint_blobs"):
+                await cur.execute(
+                    f"DELETE FROM {table} WHERE thread_id = ANY(%s)", (thread_ids,)
+                )
+
+
+async def create_postgres_saver(
+    uri: str, *, keep_last: int, thread_ttl: float
+) -> PostgresSaver:
+    pool = AsyncConnectionPool(
+        uri, kwargs={"autocommit": True, "prepare_threshold": 0}, open=False
+    )
+    await pool.open()
+    checkpointer = PostgresSaver(pool, keep_last=keep_last, thread_ttl=thread_ttl)
+    await checkpointer.setup()
+    return checkpointer
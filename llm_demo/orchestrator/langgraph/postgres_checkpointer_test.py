@@ -0,0 +1,112 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import uuid
+
+import pytest
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import empty_checkpoint
+
+pytest.importorskip("langgraph.checkpoint.postgres")
+
+from .postgres_checkpointer import PostgresSaver, create_postgres_saver
+
+# Connection string of a scratch Postgres database, the tests are skipped without
+CHECKPOINTER_TEST_URI = os.getenv("CHECKPOINTER_TEST_URI")
+
+pytestmark = pytest.mark.skipif(
+    not CHECKPOINTER_TEST_URI, reason="CHECKPOINTER_TEST_URI is not set"
+)
+
+
+async def put_checkpoint(
+    saver: PostgresSaver, thread_id: str, step: int
+) -> RunnableConfig:
+    checkpoint = empty_checkpoint()
+    checkpoint["id"] = f"{step:04d}"
+    checkpoint["channel_values"] = {"messages": [f"message {step}"]}
+    checkpoint["channel_versions"] = {"messages": step}
+    config: RunnableConfig = {
+        "configurable": {"thread_id": thread_id, "checkpoint_ns": ""}
+    }
+    return await saver.aput(config, checkpoint, {"step": step}, {"messages": step})
+
+
+async def count_rows(saver: PostgresSaver, table: str, thread_id: str) -> int:
+    async with saver._cursor() as cur:
+        await cur.execute(
+            f"SELECT COUNT(*) AS n FROM {table} WHERE thread_id = %s", (thread_id,)
+        )
+        row = await cur.fetchone()
+    return row["n"]
+
+
+def test_aput_prunes_old_checkpoints():
+    thread_id = str(uuid.uuid4())
+
+    async def run():
+        saver = await create_postgres_saver(
+            CHECKPOINTER_TEST_URI, keep_last=2, thread_ttl=3600
+        )
+        try:
+            for step in range(1, 5):
+                config = await put_checkpoint(saver, thread_id, step)
+                await saver.aput_writes(config, [("messages", step)], "task")
+            thread: RunnableConfig = {"configurable": {"thread_id": thread_id}}
+            listed = [t async for t in saver.alist(thread)]
+            latest = await saver.aget_tuple(config)
+            counts = [
+                await count_rows(saver, table, thread_id)
+                for table in ("checkpoints", "checkpoint_writes", "checkpoint_blobs")
+            ]
+            await saver.adelete_thread(thread_id)
+            return listed, latest, counts
+        finally:
+            await saver.conn.close()
+
+    listed, latest, counts = asyncio.run(run())
+    assert [t.checkpoint["id"] for t in listed] == ["0004", "0003"]
+    assert latest is not None
+    assert latest.checkpoint["channel_values"] == {"messages": ["message 4"]}
+    assert latest.pending_writes == [("task", "messages", 4)]
+    assert counts == [2, 2, 2]
+
+
+def test_adelete_idle_threads():
+    idle_thread, active_thread = str(uuid.uuid4()), str(uuid.uuid4())
+
+    async def run():
+        saver = await create_postgres_saver(
+            CHECKPOINTER_TEST_URI, keep_last=2, thread_ttl=0.5
+        )
+        try:
+            await put_checkpoint(saver, idle_thread, 1)
+            await asyncio.sleep(1)
+            await put_checkpoint(saver, active_thread, 1)
+            await saver.adelete_idle_threads()
+            assert await saver.acount_threads() >= 1
+            counts = [
+                await count_rows(saver, table, thread_id)
+                for thread_id in (idle_thread, active_thread)
+                for table in ("checkpoints", "checkpoint_blobs", "checkpoint_threads")
+            ]
+            await saver.adelete_thread(active_thread)
+            counts.append(await count_rows(saver, "checkpoint_threads", active_thread))
+            return counts
+        finally:
+            await saver.conn.close()
+
+    assert asyncio.run(run()) == [0, 0, 0, 1, 1, 1, 0]
@@ -0,0 +1,72 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import time
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence
+
+from langchain_core.messages import BaseMessage, SystemMessage
+from pytz import timezone
+
+DATETIME_FORMAT = "%A, %m/%d/%Y, %H:%M:%S"
+
+
+class CurrentDatetime:
+    """
+    Formats the current time in a fixed timezone. The timezone is resolved
+    once and the text is reused for every call within the same second.
+    """
+
+    def __init__(self, tz_name: str = "US/Pacific", fmt: str = DATETIME_FORMAT):
+        self.tz = timezone(tz_name)
+        self.fmt = fmt
+        self._second = -1
+        self._text = ""
+
+    def __call__(self) -> str:
+        second = int(time.time())
+        if second != self._second:
+            self._text = datetime.fromtimestamp(second, self.tz).strftime(self.fmt)
+            self._second = second
+        return self._text
+
+
+class CompiledPrompt:
+    """
+    System prompt rendered once, ahead of the conversation.
+
+    The model receives the static instructions as the first system message,
+    byte-for-byte the same on every step, followed by a short system message
+    with the current date. Gemini joins both into its system instruction, so
+    everything that changes between calls comes after a stable prefix that
+    Vertex AI context caching can reuse.
+    """
+
+    def __init__(
+        self,
+        static_text: str,
+        current_datetime: Optional[Callable[[], str]] = None,
+    ):
+        self.static_message = SystemMessage(content=static_text)
+        self._current_datetime = current_datetime or CurrentDatetime()
+
+    @property
+    def static_text(self) -> str:
+        return self.static_message.content  # type: ignore[return-value]
+
+    def format_messages(self, messages: Sequence[BaseMessage]) -> List[BaseMessage]:
+        date_message = SystemMessage(
+            content=f"Today's date and current time is {self._current_datetime()}."
+        )
+        return [self.static_message, date_message, *messages]
@@ -12,26 +12,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import json
-import uuid
-from typing import Annotated, Literal, Sequence, TypedDict
+from typing import Annotated, Literal, Optional, Sequence, TypedDict
 
 from aiohttp import ClientSession
+from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import (
     AIMessage,
     BaseMessage,
     HumanMessage,
-    ToolCall,
     ToolMessage,
 )
-from langchain_core.prompts.chat import ChatPromptTemplate
 from langchain_core.runnables import RunnableConfig, RunnableLambda
-from langchain_google_vertexai import ChatVertexAI
-from langgraph.checkpoint.memory import MemorySaver
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.graph import END, StateGraph
 from langgraph.graph.message import add_messages
 from langgraph.managed import IsLastStep
 
+import tracing
+
+from .prompt import CompiledPrompt
+from .tool_cache import ToolResultCache
+from .tool_guard import ToolGuard
 from .tool_node import ToolNode
 from .tools import (
     TicketInfo,
@@ -53,11 +55,13 @@ class UserState(TypedDict):
 
 async def create_graph(
     tools,
-    checkpointer: MemorySaver,
-    prompt: ChatPromptTemplate,
-    model_name: str,
+    checkpointer: BaseCheckpointSaver,
+    prompt: CompiledPrompt,
+    chat_model: BaseChatModel,
     client: ClientSession,
     debug: bool,
+    tool_cache: Optional[ToolResultCache] = None,
+    tool_guard: Optional[ToolGuard] = None,
 ):
     """
     Creates a graph that works with a chat model that utilizes tool calling.
@@ -66,9 +70,12 @@ async def create_graph(
         tools: A list of StructuredTools that will bind with the chat model.
         checkpointer: The checkpoint saver object. This is useful for persisting
             the state of the graph (e.g., as chat memory).
-        prompt: Initial prompt for the model. This applies to messages before they
-            are passed into the LLM.
-        model_name: The chat model name.
+        prompt: Compiled system prompt, placed before the messages passed into
+            the LLM.
+        chat_model: The chat model, tools are bound to it here.
+        tool_cache: Optional cache of tool results shared by every session.
+        tool_guard: Optional timeouts, concurrency limit and circuit breakers
+            applied to tool calls.
 
     Returns:
         A compilled LangChain runnable that can be used for chat interactions.
@@ -82,14 +89,12 @@ async def create_graph(
         End --> [*]
     """
     # tool node
-    tool_node = ToolNode(tools)
+    tool_node = ToolNode(tools, cache=tool_cache, guard=tool_guard)
 
     # model node
-    # TODO: Use .bind_tools(tools) to bind the tools with the LLM.
-    model = ChatVertexAI(max_output_tokens=512, model_name=model_name, temperature=0.0)
-
-    # Add the prompt to the model to create a model runnable
-    model_runnable = prompt | model
+    # Tools are bound with the schemas the LLM sees, which leave out injected
+    # arguments such as the user's ID token
+    model = chat_model.bind_tools([convert_to_openai_tool(tool) for tool in tools])
 
     async def acall_model(state: UserState, config: RunnableConfig):
         """
@@ -97,37 +102,11 @@ async def create_graph(
         After invoking model, it will return AIMessage back to the user.
         """
         messages = state["messages"]
-        res = await model_runnable.ainvoke({"messages": messages}, config)
-
-        # TODO: Remove the temporary fix of parsing LLM response and invoking
-        # tools until we use bind_tools API and have automatic response parsing
-        # and tool calling. (see
-        # https://langchain-ai.github.io/langgraph/#example)
-        if "```json" in res.content:
-            try:
-                response = str(res.content).replace("```json", "").replace("```", "")
-                json_response = json.loads(response)
-                action = json_response.get("action")
-                action_input = json_response.get("action_input")
-                if action == "Final Answer":
-                    res = AIMessage(content=action_input)
-                else:
-                    res = AIMessage(
-                        content="suggesting a tool call",
-                        tool_calls=[
-                            ToolCall(
-                                id=str(uuid.uuid4()), name=action, args=action_input
-                            )
-                        ],
-                    )
-            except Exception as e:
-                json_response = response
-                res = AIMessage(
-                    content="Sorry, failed to generate the right format for response"
-                )
+        with tracing.span("llm"):
+            res = await model.ainvoke(prompt.format_messages(messages), config)
 
         # if model exceed the number of steps and has not yet return a final answer
-        if state["is_last_step"] and hasattr(res, "tool_calls"):
+        if state["is_last_step"] and isinstance(res, AIMessage) and res.tool_calls:
             return {
                 "messages": [
                     AIMessage(
@@ -151,7 +130,7 @@ async def create_graph(
             for tool_call in last_message.tool_calls:
                 tool_name = tool_call["name"]
                 if tool_name in confirmation_needing_tools:
-                    if tool_name == "Insert Ticket":
+                    if tool_name == "insert_ticket":
                         return "booking_validation"
             return "continue"
         # Otherwise, we stop (reply to the user)
@@ -160,27 +139,29 @@ async def create_graph(
     async def booking_validation_node(state: UserState, config: RunnableConfig):
         """
         The node representing async function that validate the ticket.
-        After ticket validation, it will return AIMessage with updated ticket args.
+        After ticket validation, it replaces the model's tool call message with
+        one holding only the booking call and the validated ticket args.
         """
         messages = state["messages"]
         last_message = messages[-1]
         user_id_token = state["user_id_token"]
         if hasattr(last_message, "tool_calls") and len(last_message.tool_calls) > 0:
-            tool_call = last_message.tool_calls[0]
+            tool_call = next(
+                call
+                for call in last_message.tool_calls
+                if call["name"] == "insert_ticket"
+            )
             # Run ticket validation and return the correct ticket information
             flight_info = await validate_ticket(
                 client, tool_call.get("args"), user_id_token
             )
 
+            # Other calls in the same step are dropped so the booking call is
+            # the only one left waiting for a response while the user decides
             new_message = AIMessage(
+                id=last_message.id,
                 content="Please confirm if you would like to book the ticket.",
-                tool_calls=[
-                    ToolCall(
-                        id=str(uuid.uuid4()),
-                        name=tool_call.get("name"),
-                        args=flight_info,
-                    )
-                ],
+                tool_calls=[{**tool_call, "args": flight_info}],
                 additional_kwargs={"confirmation": True},
             )
             return {"messages": [new_message]}
@@ -211,12 +192,13 @@ async def create_graph(
             ticket_info = TicketInfo(**tool_args)
             output = await insert_ticket(client, ticket_info, user_id_token)
             tool_call_id = tool_call.get("id")
+            # The tool response must directly follow the tool call message
             tool_message = ToolMessage(
-                content=output, name="Insert Ticket", tool_call_id=tool_call_id
+                content=output, name="insert_ticket", tool_call_id=tool_call_id
             )
             human_message = HumanMessage(content="Looks good to me.")
             ai_message = AIMessage(content=output)
-            return {"messages": [human_message, tool_message, ai_message]}
+            return {"messages": [tool_message, human_message, ai_message]}
 
     # Define constant node strings
     AGENT_NODE = "agent"
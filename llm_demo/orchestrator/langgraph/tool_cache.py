@@ -0,0 +1,95 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Literal, Optional
+
+TOOL_CACHE_TTL = float(os.getenv("TOOL_CACHE_TTL", default=300))
+TOOL_CACHE_MAX_ENTRIES = int(os.getenv("TOOL_CACHE_MAX_ENTRIES", default=1024))
+
+# "global" results are shared by every session, "session" results only by
+# later calls in the same conversation
+CacheScope = Literal["global", "session"]
+CacheKey = tuple[str, str, str]
+
+
+class ToolResultCache:
+    """
+    TTL and LRU bounded cache of tool results keyed on the tool name and its
+    normalized arguments. Only tools listed in `scopes` are cached, so tools
+    that read or change user data always reach the retrieval service.
+    """
+
+    def __init__(
+        self,
+        scopes: Dict[str, CacheScope],
+        ttl: float = TOOL_CACHE_TTL,
+        max_entries: int = TOOL_CACHE_MAX_ENTRIES,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.scopes = scopes
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._clock = clock
+        self._entries: OrderedDict[CacheKey, tuple[Any, float]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def key(
+        self, tool_name: str, args: Dict[str, Any], session_id: Optional[str]
+    ) -> Optional[CacheKey]:
+        """Return the cache key of a call, or None if the tool is not cached."""
+        scope = self.scopes.get(tool_name)
+        if scope is None or (scope == "session" and not session_id):
+            return None
+        # Unset arguments and surrounding whitespace do not change the result
+        normalized = {
+            name: value.strip() if isinstance(value, str) else value
+            for name, value in args.items()
+            if value is not None and name != "user_id_token"
+        }
+        return (
+            tool_name,
+            session_id if scope == "session" and session_id else "",
+            json.dumps(normalized, sort_keys=True, default=str),
+        )
+
+    def get(self, key: CacheKey) -> Optional[Any]:
+        entry = self._entries.get(key)
+        if entry is not None and self._clock() - entry[1] > self.ttl:
+            del self._entries[key]
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[0]
+
+    def put(self, key: CacheKey, value: Any):
+        self._entries[key] = (value, self._clock())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "ttl": self.ttl,
+        }
@@ -0,0 +1,101 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import Dict, Optional
+
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+
+from ..testing import FakeClock
+from .tool_cache import CacheScope, ToolResultCache
+from .tool_node import ToolNode
+
+
+def make_cache(clock: Optional[FakeClock] = None, **kwargs) -> ToolResultCache:
+    scopes: Dict[str, CacheScope] = {
+        "search_airports": "global",
+        "list_flights": "session",
+    }
+    return ToolResultCache(scopes, clock=clock or FakeClock(), **kwargs)
+
+
+def test_key_normalizes_arguments():
+    cache = make_cache()
+    key = cache.key("search_airports", {"city": " Denver ", "name": None}, "s1")
+    assert key == ("search_airports", "", '{"city": "Denver"}')
+    assert key == cache.key(
+        "search_airports", {"city": "Denver", "user_id_token": "token"}, "s2"
+    )
+
+
+def test_key_of_uncached_tools_and_scopes():
+    cache = make_cache()
+    assert cache.key("list_tickets", {}, "s1") is None
+    assert cache.key("list_flights", {"date": "2024-01-01"}, None) is None
+    key_1 = cache.key("list_flights", {"date": "2024-01-01"}, "s1")
+    key_2 = cache.key("list_flights", {"date": "2024-01-01"}, "s2")
+    assert key_1 is not None and key_1[1] == "s1"
+    assert key_1 != key_2
+
+
+def test_get_expires_after_ttl():
+    clock = FakeClock()
+    cache = make_cache(clock, ttl=10)
+    key = ("search_airports", "", "{}")
+    cache.put(key, {"results": []})
+    clock.now = 10
+    assert cache.get(key) == {"results": []}
+    clock.now = 10.5
+    assert cache.get(key) is None
+    assert cache.stats() == {"entries": 0, "hits": 1, "misses": 1, "ttl": 10}
+
+
+def test_put_evicts_least_recently_used():
+    cache = make_cache(max_entries=2)
+    keys = [("search_airports", "", str(i)) for i in range(3)]
+    cache.put(keys[0], 0)
+    cache.put(keys[1], 1)
+    cache.get(keys[0])
+    cache.put(keys[2], 2)
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) == 0
+    assert cache.get(keys[2]) == 2
+
+
+def test_tool_node_reuses_cached_results():
+    calls = []
+
+    async def search_airports(city: str, user_id_token=None):
+        calls.append(city)
+        return {"results": [city], "sql": "SELECT"}
+
+    tool = StructuredTool.from_function(
+        coroutine=search_airports,
+        name="search_airports",
+        description="Search airports by city",
+    )
+    node = ToolNode([tool], cache=make_cache())
+    message = AIMessage(
+        content="",
+        tool_calls=[{"name": "search_airports", "args": {"city": "Denver"}, "id": "1"}],
+    )
+    config = {"configurable": {"thread_id": "s1"}}
+
+    for expected in ("miss", "hit"):
+        output = asyncio.run(node.ainvoke({"messages": [message]}, config))
+        tool_message = output["messages"][0]
+        assert tool_message.additional_kwargs["cache"] == expected
+        assert tool_message.content == '["Denver"]'
+    assert calls == ["Denver"]
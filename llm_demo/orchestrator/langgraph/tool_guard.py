@@ -0,0 +1,294 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import os
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    TypeVar,
+    Union,
+)
+
+import aiohttp
+
+# Seconds a tool call may take unless set for the tool, hedged attempt included
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", default=10))
+# Tool calls running at once across all sessions
+TOOL_MAX_IN_FLIGHT = int(os.getenv("TOOL_MAX_IN_FLIGHT", default=16))
+# Seconds before an idempotent call still running gets a second attempt
+TOOL_HEDGE_DELAY = float(os.getenv("TOOL_HEDGE_DELAY", default=2))
+# Consecutive failures that open a tool's circuit, and seconds it stays open
+TOOL_BREAKER_FAILURES = int(os.getenv("TOOL_BREAKER_FAILURES", default=5))
+TOOL_BREAKER_RESET = float(os.getenv("TOOL_BREAKER_RESET", default=30))
+
+T = TypeVar("T")
+
+
+class ToolCallError(Exception):
+    """Raised in place of a tool's result when the guarded call fails."""
+
+
+class ToolUnavailable(ToolCallError):
+    """Raised when a tool call timed out, its backend failed, or its circuit
+    is open."""
+
+
+class ToolCallRejected(ToolCallError):
+    """Raised when a tool refused the call: bad arguments or a 4xx response."""
+
+
+def is_backend_failure(err: BaseException) -> bool:
+    """
+    Whether an error means the tool's backend is unhealthy: a timeout, a
+    connection error or a 5xx response. Bad arguments and 4xx responses are
+    the caller's fault and leave the circuit alone.
+    """
+    if isinstance(err, aiohttp.ClientResponseError):
+        return err.status >= 500
+    return isinstance(
+        err, (TimeoutError, ConnectionError, aiohttp.ClientConnectionError)
+    )
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures and rejects calls
+    until `reset_timeout` has passed, then lets a single trial call through.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self.failures = 0
+        self._opened_at: Optional[float] = None
+        self._trial_running = False
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at < self.reset_timeout:
+            return "open"
+        return "half-open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half-open" and not self._trial_running:
+            self._trial_running = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self._opened_at = None
+        self._trial_running = False
+
+    def release(self):
+        """End a call whose outcome says nothing about the tool's health."""
+        self._trial_running = False
+
+    def record_failure(self):
+        self.failures += 1
+        self._trial_running = False
+        if self._opened_at is not None or self.failures >= self.failure_threshold:
+            self._opened_at = self._clock()
+
+
+class ToolGuard:
+    """
+    Runs tool calls with a per-tool timeout, a cap on calls in flight and a
+    circuit breaker per tool. Calls to idempotent tools are hedged: if the
+    first attempt is slow or its backend fails, a second one is started in a
+    free slot and the first successful result wins.
+    """
+
+    def __init__(
+        self,
+        idempotent_tools: Iterable[str] = (),
+        timeouts: Optional[Dict[str, float]] = None,
+        default_timeout: float = TOOL_TIMEOUT,
+        max_in_flight: int = TOOL_MAX_IN_FLIGHT,
+        hedge_delay: float = TOOL_HEDGE_DELAY,
+        breaker_failures: int = TOOL_BREAKER_FAILURES,
+        breaker_reset: float = TOOL_BREAKER_RESET,
+    ):
+        self.idempotent_tools = set(idempotent_tools)
+        self.timeouts = timeouts or {}
+        self.default_timeout = default_timeout
+        self.max_in_flight = max_in_flight
+        self.hedge_delay = hedge_delay
+        self._breaker_failures = breaker_failures
+        self._breaker_reset = breaker_reset
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._semaphore = asyncio.Semaphore(max_in_flight)
+        self._executor: Optional[ThreadPoolExecutor] = None
+
+    def timeout(self, tool_name: str) -> float:
+        return self.timeouts.get(tool_name, self.default_timeout)
+
+    def breaker(self, tool_name: str) -> CircuitBreaker:
+        if tool_name not in self._breakers:
+            self._breakers[tool_name] = CircuitBreaker(
+                self._breaker_failures, self._breaker_reset
+            )
+        return self._breakers[tool_name]
+
+    async def arun(self, tool_name: str, call: Callable[[], Awaitable[T]]) -> T:
+        breaker = self.breaker(tool_name)
+        if not breaker.allow():
+            raise ToolUnavailable(f"{tool_name} circuit is open")
+        started = False
+
+        async def attempt() -> T:
+            nonlocal started
+            async with self._semaphore:
+                started = True
+                if tool_name in self.idempotent_tools:
+                    return await self._hedged(call)
+                return await call()
+
+        # The timeout covers the wait for a slot as well as the call
+        try:
+            result = await asyncio.wait_for(attempt(), self.timeout(tool_name))
+        except Exception as err:
+            if not started:
+                # Timed out waiting behind other calls, the tool was not tried
+                breaker.release()
+                raise ToolUnavailable(f"{tool_name} waited too long to run") from err
+            self._record_error(breaker, err)
+            if isinstance(err, asyncio.TimeoutError):
+                raise ToolUnavailable(f"{tool_name} timed out") from err
+            raise self._failed(tool_name, err) from err
+        breaker.record_success()
+        return result
+
+    def run_all(
+        self, calls: Sequence[tuple[str, Callable[[], T]]]
+    ) -> List[Union[T, ToolCallError]]:
+        """
+        Blocking variant that runs calls at once on a shared thread pool,
+        without hedging. A ToolCallError is returned in place of the result of
+        each failed call.
+
+        A thread cannot be stopped: a call that times out keeps its worker
+        until it returns, and later calls queue for the remaining workers.
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        start = time.monotonic()
+        futures: List[Optional[Future]] = [
+            self._executor.submit(call) if self.breaker(name).allow() else None
+            for name, call in calls
+        ]
+        results: List[Union[T, ToolCallError]] = []
+        for (name, _), future in zip(calls, futures):
+            breaker = self.breaker(name)
+            if future is None:
+                results.append(ToolUnavailable(f"{name} circuit is open"))
+                continue
+            remaining = self.timeout(name) - (time.monotonic() - start)
+            try:
+                results.append(future.result(max(remaining, 0)))
+            except FutureTimeoutError:
+                # Only stops a call still queued for a worker
+                future.cancel()
+                breaker.record_failure()
+                results.append(ToolUnavailable(f"{name} timed out"))
+            except Exception as err:
+                self._record_error(breaker, err)
+                results.append(self._failed(name, err))
+            else:
+                breaker.record_success()
+        return results
+
+    def _record_error(self, breaker: CircuitBreaker, err: BaseException):
+        if is_backend_failure(err):
+            breaker.record_failure()
+        else:
+            breaker.release()
+
+    def _failed(self, tool_name: str, err: BaseException) -> ToolCallError:
+        failure: ToolCallError
+        if is_backend_failure(err):
+            failure = ToolUnavailable(f"{tool_name} failed: {err}")
+        else:
+            failure = ToolCallRejected(f"{tool_name} rejected the call: {err}")
+        failure.__cause__ = err
+        return failure
+
+    async def _hedged(self, call: Callable[[], Awaitable[T]]) -> T:
+        """Run `call` in the caller's slot, racing a second attempt if needed."""
+        pending = {asyncio.ensure_future(call())}
+        hedged = False
+        error: Optional[BaseException] = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(
+                    pending,
+                    timeout=None if hedged else self.hedge_delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+                if hedged:
+                    continue
+                hedged = True
+                if error is not None and not is_backend_failure(error):
+                    # A rejected call fails the same way when tried again
+                    break
+                if self._semaphore.locked():
+                    # No slot to spare, the first attempt runs on alone
+                    continue
+                # Returns at once as a slot is free
+                await self._semaphore.acquire()
+                second = asyncio.ensure_future(call())
+                # Also runs when the attempt is cancelled before it starts
+                second.add_done_callback(lambda _: self._semaphore.release())
+                pending.add(second)
+            assert error is not None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {"state": breaker.state, "failures": breaker.failures}
+            for name, breaker in self._breakers.items()
+        }
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
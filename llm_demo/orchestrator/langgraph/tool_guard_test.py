@@ -0,0 +1,265 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import time
+
+import aiohttp
+import pytest
+from langchain_core.messages import AIMessage
+from langchain_core.tools import StructuredTool
+from multidict import CIMultiDict, CIMultiDictProxy
+from yarl import URL
+
+from ..testing import FakeClock
+from .tool_guard import (
+    CircuitBreaker,
+    ToolCallError,
+    ToolCallRejected,
+    ToolGuard,
+    ToolUnavailable,
+)
+from .tool_node import ToolNode
+
+
+def response_error(status: int) -> aiohttp.ClientResponseError:
+    url = URL("http://127.0.0.1:8080/airports/search")
+    request_info = aiohttp.RequestInfo(url, "GET", CIMultiDictProxy(CIMultiDict()))
+    return aiohttp.ClientResponseError(request_info, (), status=status)
+
+
+def test_breaker_opens_and_lets_one_trial_through():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.state == "closed"
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+    assert not breaker.allow()
+
+    # A failed trial opens the circuit again, a successful one closes it
+    breaker.record_failure()
+    assert breaker.state == "open"
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.failures == 0
+
+
+def test_breaker_release_ends_trial_without_closing():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.state == "half-open"
+    assert breaker.allow()
+
+
+def run_guarded(guard: ToolGuard, *calls):
+    async def run():
+        results = []
+        for call in calls:
+            try:
+                results.append(await guard.arun("search", call))
+            except ToolCallError as err:
+                results.append(err)
+        return results
+
+    return asyncio.run(run())
+
+
+@pytest.mark.parametrize(
+    "error, counted",
+    [
+        (asyncio.TimeoutError(), True),
+        (aiohttp.ServerDisconnectedError(), True),
+        (response_error(503), True),
+        (response_error(404), False),
+        (ValueError("bad argument"), False),
+    ],
+)
+def test_arun_counts_only_backend_failures(error, counted):
+    guard = ToolGuard(breaker_failures=1)
+
+    async def fail():
+        raise error
+
+    (result,) = run_guarded(guard, fail)
+    assert isinstance(result, ToolUnavailable if counted else ToolCallRejected)
+    assert result.__cause__ is error
+    assert guard.breaker("search").state == ("open" if counted else "closed")
+
+
+def test_arun_times_out_and_opens_circuit():
+    guard = ToolGuard(default_timeout=0.05, breaker_failures=2)
+
+    async def slow():
+        await asyncio.sleep(1)
+
+    results = run_guarded(guard, slow, slow, slow)
+    assert [str(r) for r in results] == [
+        "search timed out",
+        "search timed out",
+        "search circuit is open",
+    ]
+
+
+def test_arun_timeout_covers_waiting_for_a_slot():
+    guard = ToolGuard(default_timeout=0.05, max_in_flight=1, breaker_failures=1)
+
+    async def run():
+        async def slow():
+            await asyncio.sleep(1)
+
+        async def fast():
+            return "done"
+
+        return await asyncio.gather(
+            guard.arun("slow", slow),
+            guard.arun("search", fast),
+            return_exceptions=True,
+        )
+
+    slow_result, queued_result = asyncio.run(run())
+    assert str(slow_result) == "slow timed out"
+    assert str(queued_result) == "search waited too long to run"
+    # Waiting behind another tool says nothing about this one
+    assert guard.breaker("search").state == "closed"
+
+
+def test_arun_hedges_idempotent_calls():
+    guard = ToolGuard(idempotent_tools=["search"], hedge_delay=0.01)
+    attempts = []
+
+    async def first_slow():
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            await asyncio.sleep(1)
+            return "first"
+        return "second"
+
+    start = time.monotonic()
+    assert run_guarded(guard, first_slow) == ["second"]
+    assert attempts == [0, 1]
+    assert time.monotonic() - start < 0.5
+
+
+def test_arun_hedges_only_in_a_free_slot():
+    guard = ToolGuard(idempotent_tools=["search"], max_in_flight=1, hedge_delay=0.01)
+    attempts = []
+
+    async def slow():
+        attempts.append(len(attempts))
+        await asyncio.sleep(0.1)
+        return "first"
+
+    assert run_guarded(guard, slow) == ["first"]
+    assert attempts == [0]
+
+
+def test_arun_hedges_backend_failures_but_not_rejected_calls():
+    guard = ToolGuard(idempotent_tools=["search"], hedge_delay=1)
+    attempts = []
+
+    async def fail_once(error: Exception):
+        attempts.append(len(attempts))
+        if len(attempts) == 1:
+            raise error
+        return "second"
+
+    start = time.monotonic()
+    assert run_guarded(guard, lambda: fail_once(response_error(502))) == ["second"]
+    assert time.monotonic() - start < 0.5
+
+    attempts.clear()
+    (result,) = run_guarded(guard, lambda: fail_once(response_error(400)))
+    assert isinstance(result, ToolCallRejected)
+    assert attempts == [0]
+
+
+def test_arun_releases_hedge_slots():
+    guard = ToolGuard(idempotent_tools=["search"], max_in_flight=2, hedge_delay=0.01)
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return "done"
+
+    assert run_guarded(guard, slow, slow) == ["done", "done"]
+    assert guard._semaphore._value == 2
+
+
+def test_run_all_returns_failures_in_place():
+    guard = ToolGuard(default_timeout=0.1, breaker_failures=1)
+    guard.breaker("open").record_failure()
+
+    def bad_request():
+        raise response_error(400)
+
+    results = guard.run_all(
+        [
+            ("ok", lambda: "result"),
+            ("slow", lambda: time.sleep(0.5)),
+            ("bad", bad_request),
+            ("open", lambda: "never called"),
+        ]
+    )
+    guard.close()
+    assert results[0] == "result"
+    assert str(results[1]) == "slow timed out"
+    assert isinstance(results[2], ToolCallRejected)
+    assert str(results[3]) == "open circuit is open"
+    assert guard.stats()["slow"]["state"] == "open"
+    assert guard.stats()["bad"]["state"] == "closed"
+
+
+@pytest.mark.parametrize(
+    "error, content",
+    [
+        (
+            response_error(503),
+            "The search tool is temporarily unavailable. Let the user know and "
+            "suggest trying again later.",
+        ),
+        (
+            ValueError("unknown airport"),
+            "The search tool rejected the call: unknown airport. Check the "
+            "arguments, or ask the user for the missing details.",
+        ),
+    ],
+)
+def test_tool_node_tells_unavailable_from_rejected_calls(error, content):
+    async def search(code: str, user_id_token=None):
+        raise error
+
+    tool = StructuredTool.from_function(
+        coroutine=search, name="search", description="Search airports"
+    )
+    node = ToolNode([tool], guard=ToolGuard())
+    message = AIMessage(
+        content="",
+        tool_calls=[{"name": "search", "args": {"code": "XYZ"}, "id": "1"}],
+    )
+    config = {"configurable": {"thread_id": "s1"}}
+    output = asyncio.run(node.ainvoke({"messages": [message]}, config))
+    tool_message = output["messages"][0]
+    assert tool_message.status == "error"
+    assert tool_message.content == content
@@ -14,9 +14,9 @@
 
 import asyncio
 import copy
+import functools
 import json
 import uuid
-from itertools import repeat
 from typing import Any, Callable, Dict, Optional, Sequence, Union
 
 from langchain_core.messages import AIMessage, AnyMessage, ToolCall, ToolMessage
@@ -26,6 +26,11 @@ from langchain_core.tools import BaseTool
 from langchain_core.tools import tool as create_tool
 from langgraph.utils.runnable import RunnableCallable
 
+import tracing
+
+from .tool_cache import CacheKey, ToolResultCache
+from .tool_guard import ToolCallError, ToolGuard, ToolUnavailable
+
 
 def str_output(output: Any) -> str:
     if isinstance(output, str):
@@ -43,6 +48,12 @@ class ToolNode(RunnableCallable):
     either in StateGraph with a "messages" key or in MessageGraph. If multiple
     tool calls are requested, they will be run in parallel. The output will be
     a list of ToolMessages, one for each tool call.
+
+    Results of tools covered by `cache` are reused for identical calls, and
+    each ToolMessage records whether it was a cache "hit" or "miss". With a
+    `guard`, calls get timeouts, concurrency limits and circuit breakers, and
+    a failed call is answered with a fallback ToolMessage instead of raising,
+    which tells the model whether to retry later or fix the request.
     """
 
     def __init__(
@@ -51,8 +62,12 @@ class ToolNode(RunnableCallable):
         *,
         name: str = "tools",
         tags: Optional[list[str]] = None,
+        cache: Optional[ToolResultCache] = None,
+        guard: Optional[ToolGuard] = None,
     ) -> None:
         super().__init__(self._func, self._afunc, name=name, tags=tags, trace=False)
+        self.cache = cache
+        self.guard = guard
         self.tools_by_name: Dict[str, BaseTool] = {}
         for tool_ in tools:
             if not isinstance(tool_, BaseTool):
@@ -74,28 +89,47 @@ class ToolNode(RunnableCallable):
 
         user_id_token = input.get("user_id_token")
 
-        def run_one(call: ToolCall, user_id_token: Optional[str]):
+        def invoke_tool(call: ToolCall) -> Callable[[], Any]:
             args = copy.copy(call["args"]) or {}
             args["user_id_token"] = user_id_token
-            response = self.tools_by_name[call["name"]].invoke(args, config)
-            output = response.get("results")
-            sql = response.get("sql")
-            tool_call_id = call.get("id") or str(uuid.uuid4())
-            return ToolMessage(
-                content=str_output(output),
-                name=call["name"],
-                tool_call_id=tool_call_id,
-                additional_kwargs={"sql": sql},
+            tool = self.tools_by_name[call["name"]]
+            return functools.partial(tool.invoke, args, config)
+
+        keys = [self.cache_key(call, config) for call in message.tool_calls]
+        cached = [self.cache.get(key) if self.cache and key else None for key in keys]
+        misses = [
+            call
+            for call, response in zip(message.tool_calls, cached)
+            if response is None
+        ]
+        if self.guard is not None:
+            fetched = iter(
+                self.guard.run_all(
+                    [(call["name"], invoke_tool(call)) for call in misses]
+                )
             )
-
-        with get_executor_for_config(config) as executor:
-            outputs = [
-                *executor.map(run_one, message.tool_calls, repeat(user_id_token))
-            ]
-            if output_type == "list":
-                return outputs
-            else:
-                return {"messages": outputs}
+        else:
+            with get_executor_for_config(config) as executor:
+                fetched = iter(
+                    [*executor.map(lambda call: invoke_tool(call)(), misses)]
+                )
+
+        outputs = []
+        for call, key, response in zip(message.tool_calls, keys, cached):
+            cache_status = None if key is None else "hit"
+            if response is None:
+                response = next(fetched)
+                if isinstance(response, ToolCallError):
+                    outputs.append(self.fallback_message(call, response))
+                    continue
+                if self.cache and key:
+                    cache_status = "miss"
+                    self.cache.put(key, response)
+            outputs.append(self.tool_message(call, response, cache_status))
+        if output_type == "list":
+            return outputs
+        else:
+            return {"messages": outputs}
 
     async def _afunc(self, input: dict[str, Any], config: RunnableConfig) -> Any:
         if messages := input.get("messages", []):
@@ -110,18 +144,32 @@ class ToolNode(RunnableCallable):
         user_id_token = input.get("user_id_token")
 
         async def run_one(call: ToolCall, user_id_token: Optional[str]):
+            with tracing.span(f"tool {call['name']}") as span:
+                message = await call_one(call, user_id_token)
+                if message.status == "error":
+                    span.status = "error"
+                return message
+
+        async def call_one(call: ToolCall, user_id_token: Optional[str]):
             args = copy.copy(call["args"]) or {}
             args["user_id_token"] = user_id_token
-            response = await self.tools_by_name[call["name"]].ainvoke(args, config)
-            output = response.get("results")
-            sql = response.get("sql")
-            tool_call_id = call.get("id") or str(uuid.uuid4())
-            return ToolMessage(
-                content=str_output(output),
-                name=call["name"],
-                tool_call_id=tool_call_id,
-                additional_kwargs={"sql": sql},
-            )
+            key = self.cache_key(call, config)
+            response = self.cache.get(key) if self.cache and key else None
+            cache_status = None if key is None else "hit"
+            if response is None:
+                tool = self.tools_by_name[call["name"]]
+                invoke = functools.partial(tool.ainvoke, args, config)
+                if self.guard is None:
+                    response = await invoke()
+                else:
+                    try:
+                        response = await self.guard.arun(call["name"], invoke)
+                    except ToolCallError as err:
+                        return self.fallback_message(call, err)
+                if self.cache and key:
+                    cache_status = "miss"
+                    self.cache.put(key, response)
+            return self.tool_message(call, response, cache_status)
 
         outputs = await asyncio.gather(
             *(run_one(call, user_id_token) for call in message.tool_calls)
@@ -130,3 +178,45 @@ class ToolNode(RunnableCallable):
             return outputs
         else:
             return {"messages": outputs}
+
+    def cache_key(self, call: ToolCall, config: RunnableConfig) -> Optional[CacheKey]:
+        if self.cache is None:
+            return None
+        session_id = config.get("configurable", {}).get("thread_id")
+        return self.cache.key(call["name"], call["args"] or {}, session_id)
+
+    def tool_message(
+        self, call: ToolCall, response: Any, cache_status: Optional[str]
+    ) -> ToolMessage:
+        if not isinstance(response, dict):
+            # Tools answer with a plain message when nothing matches
+            response = {"results": response}
+        additional_kwargs = {"sql": response.get("sql")}
+        if cache_status:
+            additional_kwargs["cache"] = cache_status
+        return ToolMessage(
+            content=str_output(response.get("results")),
+            name=call["name"],
+            tool_call_id=call.get("id") or str(uuid.uuid4()),
+            additional_kwargs=additional_kwargs,
+        )
+
+    def fallback_message(self, call: ToolCall, err: ToolCallError) -> ToolMessage:
+        if isinstance(err, ToolUnavailable):
+            content = (
+                f"The {call['name']} tool is temporarily unavailable. Let the "
+                "user know and suggest trying again later."
+            )
+        else:
+            # Trying again later would fail the same way
+            content = (
+                f"The {call['name']} tool rejected the call: {err.__cause__}. "
+                "Check the arguments, or ask the user for the missing details."
+            )
+        return ToolMessage(
+            content=content,
+            name=call["name"],
+            tool_call_id=call.get("id") or str(uuid.uuid4()),
+            status="error",
+            additional_kwargs={"error": str(err)},
+        )
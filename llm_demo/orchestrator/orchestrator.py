@@ -12,8 +12,23 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import importlib
+import os
 from abc import ABC, abstractmethod
-from typing import Any, Optional
+from typing import TYPE_CHECKING, Any, AsyncIterator, Optional
+
+from aiohttp import ClientSession
+
+from .auth import close_id_token_providers
+from .http_client import get_http_client_manager
+from .request_context import RequestContext
+from .session_store import SessionStore
+
+if TYPE_CHECKING:
+    from langchain_core.language_models.chat_models import BaseChatModel
+
+# LLM behind the orchestrators: "vertexai", or "scripted" to run offline
+LLM_BACKEND = os.getenv("LLM_BACKEND", default="vertexai")
 
 
 class classproperty:
@@ -26,6 +41,7 @@ class classproperty:
 
 class BaseOrchestrator(ABC):
     MODEL = "gemini-pro"
+    _user_sessions: SessionStore
 
     @classproperty
     @abstractmethod
@@ -47,8 +63,20 @@ class BaseOrchestrator(ABC):
         """Invoke user session and return a response from llm orchestrator."""
         raise NotImplementedError("Subclass should implement this!")
 
+    async def user_session_stream(
+        self, uuid: str, prompt: str
+    ) -> AsyncIterator[dict[str, Any]]:
+        """
+        Invoke user session and yield "token" and "trace" events as they are
+        produced, followed by a "response" event holding the same dict that
+        `user_session_invoke` returns. Orchestrators that cannot stream only
+        yield the final response.
+        """
+        response = await self.user_session_invoke(uuid, prompt)
+        yield {"type": "response", "content": response}
+
     @abstractmethod
-    def user_session_reset(self, session: dict[str, Any], uuid: str):
+    async def user_session_reset(self, session: dict[str, Any], uuid: str):
         """Reset and clear history from user session."""
         raise NotImplementedError("Subclass should implement this!")
 
@@ -69,25 +97,68 @@ class BaseOrchestrator(ABC):
         """Sign out from user session. Clear and restart session."""
         raise NotImplementedError("Subclass should implement this!")
 
+    async def create_client_session(self) -> ClientSession:
+        """Return the ClientSession shared by all user sessions."""
+        return await get_http_client_manager().get_session()
+
+    async def close_clients(self):
+        """Close the shared HTTP client, its connection pool and token refresh."""
+        await get_http_client_manager().close()
+        await close_id_token_providers()
+
+    def create_chat_model(self, **kwargs) -> "BaseChatModel":
+        """Create the LangChain chat model of the configured LLM backend."""
+        # Imported here, a scripted run never loads the Vertex AI clients
+        if LLM_BACKEND == "vertexai":
+            from langchain_google_vertexai import ChatVertexAI
+
+            return ChatVertexAI(model_name=self.MODEL, **kwargs)
+        if LLM_BACKEND == "scripted":
+            from .scripted_llm import ScriptedChatModel
+
+            return ScriptedChatModel()
+        raise TypeError(f"No LLM backend of kind {LLM_BACKEND}")
+
+    def create_generative_model(self, **kwargs) -> Any:
+        """Create the Vertex AI SDK model of the configured LLM backend."""
+        if LLM_BACKEND == "vertexai":
+            from vertexai.generative_models import GenerativeModel  # type: ignore
+
+            return GenerativeModel(self.MODEL, **kwargs)
+        if LLM_BACKEND == "scripted":
+            from .scripted_llm import ScriptedGenerativeModel
+
+            return ScriptedGenerativeModel(**kwargs)
+        raise TypeError(f"No LLM backend of kind {LLM_BACKEND}")
+
+    async def session_stats(self) -> dict[str, Any]:
+        """Return size and eviction metrics of the stores this orchestrator holds."""
+        return {"user_sessions": self._user_sessions.stats()}
+
     def set_user_session_header(self, uuid: str, user_id_token: str):
+        # Replace rather than update the context, runs in flight keep theirs
         user_session = self.get_user_session(uuid)
-        user_session.client.headers["User-Id-Token"] = f"Bearer {user_id_token}"
+        user_session.context = RequestContext(user_id_token)
 
     def get_user_id_token(self, uuid: str) -> Optional[str]:
         if self.user_session_exist(uuid):
-            user_session = self.get_user_session(uuid)
-            if user_session.client and "User-Id-Token" in user_session.client.headers:
-                token = user_session.client.headers["User-Id-Token"]
-                parts = str(token).split(" ")
-                if len(parts) != 2 or parts[0] != "Bearer":
-                    raise Exception("Invalid ID token")
-                return parts[1]
+            return self.get_user_session(uuid).context.user_id_token
         return None
 
 
+# Orchestrator packages by kind. Only the configured one is imported, so a
+# process never loads the LLM frameworks used by the other orchestrators.
+ORCHESTRATORS: dict[str, str] = {
+    "langchain-tools": "langchain_tools",
+    "langgraph": "langgraph",
+    "vertexai-function-calling": "vertexai_function_calling",
+}
+
+
 def createOrchestrator(orchestration_type: str) -> "BaseOrchestrator":
+    if orchestration_type in ORCHESTRATORS:
+        importlib.import_module(f".{ORCHESTRATORS[orchestration_type]}", __package__)
     for cls in BaseOrchestrator.__subclasses__():
-        s = f"{orchestration_type} == {cls.kind}"
         if orchestration_type == cls.kind:
             return cls()  # type: ignore
     raise TypeError(f"No orchestration type of kind {orchestration_type}")
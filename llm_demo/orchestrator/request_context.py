@@ -0,0 +1,40 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+from .auth import get_id_token_provider
+
+
+@dataclass(frozen=True)
+class RequestContext:
+    """
+    Per-user state sent with each call to the retrieval service. It is never
+    changed in place: signing in replaces a session's context, so a call that
+    is already running keeps the context it started with, and headers are
+    built fresh for every request instead of living on the shared client.
+    """
+
+    user_id_token: Optional[str] = None
+
+    async def headers(self, base_url: str) -> Dict[str, str]:
+        headers = {}
+        if self.user_id_token:
+            headers["User-Id-Token"] = f"Bearer {self.user_id_token}"
+        if not "http://" in base_url:
+            # Append ID Token to make authenticated requests to Cloud Run services
+            token = await get_id_token_provider(base_url).get_token()
+            headers["Authorization"] = f"Bearer {token}"
+        return headers
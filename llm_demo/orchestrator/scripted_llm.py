@@ -0,0 +1,341 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import os
+import random
+import re
+import time
+import uuid
+from typing import Any, AsyncIterator, Iterator, List, Optional, Sequence
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    ToolMessage,
+)
+from langchain_core.messages.tool import tool_call_chunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.utils.function_calling import convert_to_openai_tool
+from pydantic import ConfigDict, Field
+from vertexai.generative_models import Content, GenerationResponse  # type: ignore
+
+# Seconds before each reply of the scripted LLM, e.g. "fixed:0.5",
+# "uniform:0.2,1.5", "normal:0.8,0.2" or "lognormal:0.8,0.5" (median, sigma)
+SCRIPTED_LLM_LATENCY = os.getenv("SCRIPTED_LLM_LATENCY", default="fixed:0")
+# Seconds between the streamed chunks of a reply
+SCRIPTED_LLM_CHUNK_LATENCY = os.getenv("SCRIPTED_LLM_CHUNK_LATENCY", default="fixed:0")
+# JSON file with the rules that pick the tool called for a prompt
+SCRIPTED_LLM_SCRIPT = os.getenv("SCRIPTED_LLM_SCRIPT")
+SCRIPTED_LLM_SEED = int(os.getenv("SCRIPTED_LLM_SEED", default=0))
+# Characters of a tool result quoted in the answer
+ANSWER_RESULT_CHARS = 300
+
+# The first rule whose pattern matches the prompt, and that names a tool the
+# model was given, is called with its args. "{prompt}" is replaced by the
+# prompt. Tool names differ between orchestrators, so rules list them all.
+DEFAULT_RULES: list[dict[str, Any]] = [
+    # Bookings wait for the user to confirm, like those of a real model
+    {
+        "pattern": r"\bbook",
+        "tools": ["insert_ticket"],
+        "args": {
+            "airline": "UA",
+            "flight_number": "1532",
+            "departure_airport": "SFO",
+            "arrival_airport": "DEN",
+            "departure_time": "2025-01-01 05:50:00",
+            "arrival_time": "2025-01-01 09:23:00",
+        },
+    },
+    {"pattern": r"\bticket", "tools": ["list_tickets"], "args": {}},
+    {
+        "pattern": r"polic|baggage|luggage|refund|cancel",
+        "tools": ["search_policies", "policies_search"],
+        "args": {"query": "{prompt}"},
+    },
+    {
+        "pattern": r".",
+        "tools": ["search_amenities", "amenities_search"],
+        "args": {"query": "{prompt}"},
+    },
+]
+
+DISTRIBUTION_PATTERN = re.compile(r"^(fixed|uniform|normal|lognormal):([0-9.,]+)$")
+
+
+class Latency:
+    """Random delays in seconds, following a distribution such as "uniform:0.2,1"."""
+
+    def __init__(self, spec: str, rng: random.Random):
+        match = DISTRIBUTION_PATTERN.match(spec.replace(" ", ""))
+        if not match:
+            raise ValueError(f"Invalid latency distribution {spec!r}")
+        self.kind = match.group(1)
+        self.params = [float(p) for p in match.group(2).split(",")]
+        self.rng = rng
+
+    def sample(self) -> float:
+        if self.kind == "fixed":
+            return self.params[0]
+        if self.kind == "uniform":
+            return self.rng.uniform(*self.params)
+        if self.kind == "normal":
+            return max(0.0, self.rng.gauss(*self.params))
+        median, sigma = self.params
+        return median * self.rng.lognormvariate(0, sigma)
+
+
+class Script:
+    """
+    Decides what the scripted LLM replies: a first call to the tool picked by
+    the rules, then an answer quoting that tool's result.
+    """
+
+    def __init__(
+        self,
+        rules: Optional[list[dict[str, Any]]] = None,
+        latency: str = SCRIPTED_LLM_LATENCY,
+        chunk_latency: str = SCRIPTED_LLM_CHUNK_LATENCY,
+        seed: int = SCRIPTED_LLM_SEED,
+    ):
+        self.rules = DEFAULT_RULES if rules is None else rules
+        rng = random.Random(seed)
+        self.latency = Latency(latency, rng)
+        self.chunk_latency = Latency(chunk_latency, rng)
+
+    @classmethod
+    def from_env(cls) -> "Script":
+        if SCRIPTED_LLM_SCRIPT is None:
+            return cls()
+        with open(SCRIPTED_LLM_SCRIPT, "r") as f:
+            return cls(json.load(f))
+
+    def tool_call(
+        self, prompt: str, tool_names: Sequence[str]
+    ) -> Optional[tuple[str, dict[str, Any]]]:
+        """The tool and arguments the rules pick for a prompt, if any."""
+        for rule in self.rules:
+            if not re.search(rule["pattern"], prompt, re.IGNORECASE):
+                continue
+            for name in rule["tools"]:
+                if name in tool_names:
+                    args = {
+                        k: v.replace("{prompt}", prompt) if isinstance(v, str) else v
+                        for k, v in rule["args"].items()
+                    }
+                    return name, args
+        return None
+
+    def answer(self, prompt: str, tool_result: Optional[str] = None) -> str:
+        if tool_result is None:
+            return f"This is a scripted answer to: {prompt}"
+        return f"Here is what I found: {tool_result[:ANSWER_RESULT_CHARS]}"
+
+    def chunks(self, text: str) -> list[str]:
+        """Split an answer into streamed chunks of one word each."""
+        return re.findall(r"\S+\s*", text) or [text]
+
+
+class ScriptedChatModel(BaseChatModel):
+    """
+    LangChain chat model that follows a Script instead of calling Vertex AI,
+    to load test an orchestrator offline. It calls one tool for a question,
+    then answers, waiting the script's latency before each reply.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    script: Script = Field(default_factory=Script.from_env)
+
+    @property
+    def _llm_type(self) -> str:
+        return "scripted"
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any):
+        names = [convert_to_openai_tool(tool)["function"]["name"] for tool in tools]
+        return self.bind(tool_names=names, **kwargs)
+
+    def reply(
+        self, messages: List[BaseMessage], tool_names: Sequence[str]
+    ) -> AIMessage:
+        prompt = next(
+            (str(m.content) for m in reversed(messages) if isinstance(m, HumanMessage)),
+            "",
+        )
+        last = messages[-1] if messages else None
+        if isinstance(last, ToolMessage):
+            return AIMessage(content=self.script.answer(prompt, str(last.content)))
+        call = self.script.tool_call(prompt, tool_names)
+        if call is None:
+            return AIMessage(content=self.script.answer(prompt))
+        name, args = call
+        return AIMessage(
+            content="",
+            tool_calls=[{"name": name, "args": args, "id": f"call_{uuid.uuid4().hex}"}],
+        )
+
+    def _generate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        tool_names: Sequence[str] = (),
+        **kwargs: Any,
+    ) -> ChatResult:
+        time.sleep(self.script.latency.sample())
+        message = self.reply(messages, tool_names)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        tool_names: Sequence[str] = (),
+        **kwargs: Any,
+    ) -> ChatResult:
+        await asyncio.sleep(self.script.latency.sample())
+        message = self.reply(messages, tool_names)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def _stream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        tool_names: Sequence[str] = (),
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        time.sleep(self.script.latency.sample())
+        for i, chunk in enumerate(self.reply_chunks(messages, tool_names)):
+            if i:
+                time.sleep(self.script.chunk_latency.sample())
+            yield chunk
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Any = None,
+        tool_names: Sequence[str] = (),
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        await asyncio.sleep(self.script.latency.sample())
+        for i, chunk in enumerate(self.reply_chunks(messages, tool_names)):
+            if i:
+                await asyncio.sleep(self.script.chunk_latency.sample())
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(chunk.text, chunk=chunk)
+            yield chunk
+
+    def reply_chunks(
+        self, messages: List[BaseMessage], tool_names: Sequence[str]
+    ) -> list[ChatGenerationChunk]:
+        message = self.reply(messages, tool_names)
+        if message.tool_calls:
+            tool_call_chunks = [
+                tool_call_chunk(
+                    name=call["name"],
+                    args=json.dumps(call["args"]),
+                    id=call["id"],
+                    index=i,
+                )
+                for i, call in enumerate(message.tool_calls)
+            ]
+            return [
+                ChatGenerationChunk(
+                    message=AIMessageChunk(
+                        content="", tool_call_chunks=tool_call_chunks
+                    )
+                )
+            ]
+        return [
+            ChatGenerationChunk(message=AIMessageChunk(content=text))
+            for text in self.script.chunks(str(message.content))
+        ]
+
+
+class ScriptedGenerativeModel:
+    """
+    Stands in for vertexai's GenerativeModel in the function calling
+    orchestrator, following a Script like ScriptedChatModel. Responses are
+    real GenerationResponse objects built from dicts.
+    """
+
+    def __init__(
+        self,
+        tools: Optional[list[Any]] = None,
+        system_instruction: Optional[str] = None,
+        script: Optional[Script] = None,
+    ):
+        self.script = script or Script.from_env()
+        self.tool_names = [
+            declaration["name"]
+            for tool in tools or []
+            for declaration in tool.to_dict().get("function_declarations", [])
+        ]
+
+    async def generate_content_async(
+        self, contents: Any, *, stream: bool = False, **kwargs: Any
+    ) -> Any:
+        await asyncio.sleep(self.script.latency.sample())
+        parts = self.reply(contents)
+        if not stream:
+            return response_of(parts)
+        return self.stream(parts)
+
+    async def stream(
+        self, parts: list[dict[str, Any]]
+    ) -> AsyncIterator[GenerationResponse]:
+        if "function_call" in parts[0]:
+            yield response_of(parts)
+            return
+        for i, text in enumerate(self.script.chunks(parts[0]["text"])):
+            if i:
+                await asyncio.sleep(self.script.chunk_latency.sample())
+            yield response_of([{"text": text}])
+
+    def reply(self, contents: Any) -> list[dict[str, Any]]:
+        if isinstance(contents, str):
+            # A plain prompt, such as a request to summarize the history
+            return [{"text": self.script.answer(contents)}]
+        user_contents: list[Content] = [c for c in contents if c.role == "user"]
+        prompts = [
+            part.text
+            for content in user_contents
+            for part in content.parts
+            if "text" in part.to_dict()
+        ]
+        prompt = prompts[-1] if prompts else ""
+        last = [part.to_dict() for part in contents[-1].parts] if contents else []
+        results = [p["function_response"] for p in last if "function_response" in p]
+        if results:
+            result = json.dumps(results[0]["response"].get("content"), default=str)
+            return [{"text": self.script.answer(prompt, result)}]
+        call = self.script.tool_call(prompt, self.tool_names)
+        if call is None:
+            return [{"text": self.script.answer(prompt)}]
+        name, args = call
+        return [{"function_call": {"name": name, "args": args}}]
+
+
+def response_of(parts: list[dict[str, Any]]) -> GenerationResponse:
+    return GenerationResponse.from_dict(
+        {"candidates": [{"content": {"role": "model", "parts": parts}}]}
+    )
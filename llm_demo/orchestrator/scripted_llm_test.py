@@ -0,0 +1,165 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import random
+
+import pytest
+from langchain_core.messages import HumanMessage, ToolMessage
+from langchain_core.tools import StructuredTool
+from vertexai.generative_models import (  # type: ignore
+    Content,
+    FunctionDeclaration,
+    Part,
+    Tool,
+)
+
+from .scripted_llm import Latency, Script, ScriptedChatModel, ScriptedGenerativeModel
+
+RULES = [
+    {"pattern": r"coffee", "tools": ["missing"], "args": {}},
+    {
+        "pattern": r"coffee",
+        "tools": ["search_amenities", "amenities_search"],
+        "args": {"query": "{prompt} at SFO", "top_k": 5},
+    },
+]
+
+
+def test_tool_call_picks_first_rule_with_a_given_tool():
+    script = Script(RULES)
+    assert script.tool_call("Where is COFFEE?", ["amenities_search"]) == (
+        "amenities_search",
+        {"query": "Where is COFFEE? at SFO", "top_k": 5},
+    )
+    assert script.tool_call("Where is coffee?", ["list_tickets"]) is None
+    assert script.tool_call("Hello", ["amenities_search"]) is None
+
+
+def test_default_rules_book_and_list_tickets():
+    script = Script()
+    tools = ["insert_ticket", "list_tickets"]
+    name, args = script.tool_call("Book the first flight, please", tools)
+    assert name == "insert_ticket"
+    assert args["flight_number"] == "1532"
+    assert script.tool_call("Do I have any tickets?", tools) == ("list_tickets", {})
+
+
+@pytest.mark.parametrize(
+    "spec, low, high",
+    [
+        ("fixed:0.5", 0.5, 0.5),
+        ("uniform: 0.2, 1", 0.2, 1),
+        ("normal:0.1,5", 0, float("inf")),
+        ("lognormal:0.8,0.5", 0, float("inf")),
+    ],
+)
+def test_latency_samples_its_distribution(spec, low, high):
+    latency = Latency(spec, random.Random(0))
+    assert all(low <= latency.sample() <= high for _ in range(100))
+
+
+@pytest.mark.parametrize("spec", ["gamma:1", "fixed:", "uniform:a,b", "0.5"])
+def test_latency_rejects_invalid_spec(spec):
+    with pytest.raises(ValueError, match="Invalid latency distribution"):
+        Latency(spec, random.Random(0))
+
+
+def chat_model():
+    async def search_amenities(query: str, top_k: int):
+        return []
+
+    tool = StructuredTool.from_function(
+        coroutine=search_amenities,
+        name="search_amenities",
+        description="Search airport amenities",
+    )
+    return ScriptedChatModel(script=Script(RULES)).bind_tools([tool])
+
+
+def test_chat_model_calls_a_tool_then_answers():
+    model = chat_model()
+    messages: list = [HumanMessage(content="Where is coffee?")]
+    call = asyncio.run(model.ainvoke(messages))
+    assert [(c["name"], c["args"]) for c in call.tool_calls] == [
+        ("search_amenities", {"query": "Where is coffee? at SFO", "top_k": 5})
+    ]
+
+    messages += [
+        call,
+        ToolMessage(content="Cafe", tool_call_id=call.tool_calls[0]["id"]),
+    ]
+    answer = asyncio.run(model.ainvoke(messages))
+    assert answer.content == "Here is what I found: Cafe"
+    assert not answer.tool_calls
+
+
+def test_chat_model_streams_tool_calls_and_words():
+    model = chat_model()
+
+    async def stream(messages):
+        return [chunk async for chunk in model.astream(messages)]
+
+    prompt = HumanMessage(content="Where is coffee?")
+    (call,) = asyncio.run(stream([prompt]))
+    (call_chunk,) = call.tool_call_chunks
+    assert call_chunk["name"] == "search_amenities"
+    assert json.loads(call_chunk["args"])["top_k"] == 5
+
+    result = ToolMessage(content="Cafe", tool_call_id=call_chunk["id"])
+    chunks = asyncio.run(stream([prompt, call, result]))
+    assert [chunk.content for chunk in chunks] == [
+        "Here ",
+        "is ",
+        "what ",
+        "I ",
+        "found: ",
+        "Cafe",
+    ]
+
+
+def test_generative_model_answers_function_responses():
+    declaration = FunctionDeclaration(
+        name="amenities_search",
+        description="Search airport amenities",
+        parameters={"type": "object", "properties": {"query": {"type": "string"}}},
+    )
+    model = ScriptedGenerativeModel(
+        tools=[Tool(function_declarations=[declaration])], script=Script(RULES)
+    )
+    contents = [Content(role="user", parts=[Part.from_text("Where is coffee?")])]
+    response = asyncio.run(model.generate_content_async(contents))
+    call_part = response.candidates[0].content.parts[0]
+    assert call_part.function_call.name == "amenities_search"
+    assert call_part.function_call.args["query"] == "Where is coffee? at SFO"
+
+    contents += [
+        Content(role="model", parts=[call_part]),
+        Content(
+            parts=[
+                Part.from_function_response(
+                    name="amenities_search", response={"content": [{"name": "Cafe"}]}
+                )
+            ]
+        ),
+    ]
+
+    async def stream():
+        responses = await model.generate_content_async(contents, stream=True)
+        return [response.text async for response in responses]
+
+    assert "".join(asyncio.run(stream())) == (
+        'Here is what I found: [{"name": "Cafe"}]'
+    )
@@ -0,0 +1,152 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import inspect
+import os
+import resource
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Generic, Iterator, Optional, TypeVar
+
+SESSION_MAX_ENTRIES = int(os.getenv("SESSION_MAX_ENTRIES", default=1000))
+SESSION_IDLE_TTL = float(os.getenv("SESSION_IDLE_TTL", default=3600))
+
+T = TypeVar("T")
+EvictCallback = Callable[[str, T], Optional[Awaitable[None]]]
+
+
+class SessionStore(Generic[T]):
+    """
+    LRU store of user sessions bounded by entry count and idle time.
+
+    Reading a session marks it as recently used. Entries past the idle TTL are
+    hidden immediately and released on the next write or `evict_expired` call,
+    which run `on_evict` so per-session resources can be closed.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SESSION_MAX_ENTRIES,
+        idle_ttl: float = SESSION_IDLE_TTL,
+        on_evict: Optional[EvictCallback] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        if max_entries < 1:
+            raise ValueError("max_entries must be at least 1")
+        self.max_entries = max_entries
+        self.idle_ttl = idle_ttl
+        self._on_evict = on_evict
+        self._clock = clock
+        self._entries: OrderedDict[str, tuple[T, float]] = OrderedDict()
+        self._evicted = 0
+        self._expired = 0
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        entry = self._entries.get(key)
+        return entry is not None and not self._is_expired(entry[1])
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __getitem__(self, key: str) -> T:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def get(self, key: str) -> Optional[T]:
+        entry = self._entries.get(key)
+        if entry is None or self._is_expired(entry[1]):
+            return None
+        self._entries[key] = (entry[0], self._clock())
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def values(self) -> Iterator[T]:
+        return (value for value, _ in self._entries.values())
+
+    def __setitem__(self, key: str, value: T):
+        """Replace the value of a live session, e.g. after login."""
+        if key not in self:
+            raise KeyError(key)
+        self._entries[key] = (value, self._clock())
+        self._entries.move_to_end(key)
+
+    async def put(self, key: str, value: T):
+        entry = self._entries.get(key)
+        if entry is not None and self._is_expired(entry[1]):
+            # Release the stale session before its id is reused
+            self._expired += 1
+            await self._release(key)
+        self._entries[key] = (value, self._clock())
+        self._entries.move_to_end(key)
+        await self.evict_expired()
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self._evicted += 1
+            await self._release(oldest)
+
+    def pop(self, key: str) -> Optional[T]:
+        """Remove a session without running the eviction callback."""
+        entry = self._entries.pop(key, None)
+        return entry[0] if entry else None
+
+    async def evict_expired(self):
+        # Entries are kept in last-used order, so expired ones are at the front
+        while self._entries:
+            key, (_, last_used) = next(iter(self._entries.items()))
+            if not self._is_expired(last_used):
+                break
+            self._expired += 1
+            await self._release(key)
+
+    def stats(self) -> dict[str, Any]:
+        """Session counts and eviction totals."""
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "idle_ttl": self.idle_ttl,
+            "evicted": self._evicted,
+            "expired": self._expired,
+        }
+
+    async def _release(self, key: str):
+        value, _ = self._entries.pop(key)
+        if self._on_evict is not None:
+            result = self._on_evict(key, value)
+            if inspect.isawaitable(result):
+                await result
+
+    def _is_expired(self, last_used: float) -> bool:
+        return self._clock() - last_used > self.idle_ttl
+
+
+def memory_usage() -> dict[str, Optional[int]]:
+    """
+    Current and peak resident set size of this process in kB. Only the current
+    size shows whether evicting sessions gives memory back.
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            rss_pages = int(statm.read().split()[1])
+        rss_kb: Optional[int] = rss_pages * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError, IndexError):
+        # Not available outside Linux
+        rss_kb = None
+    return {
+        "rss_kb": rss_kb,
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    }
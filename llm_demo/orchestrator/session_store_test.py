@@ -0,0 +1,104 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import pytest
+
+from .session_store import SessionStore, memory_usage
+from .testing import FakeClock
+
+
+def test_put_evicts_least_recently_used():
+    evicted = []
+    store: SessionStore[str] = SessionStore(
+        max_entries=2, on_evict=lambda key, value: evicted.append((key, value))
+    )
+
+    async def run():
+        await store.put("a", "token-a")
+        await store.put("b", "token-b")
+        assert store.get("a") == "token-a"
+        await store.put("c", "token-c")
+
+    asyncio.run(run())
+    assert evicted == [("b", "token-b")]
+    assert "b" not in store
+    assert "a" in store and "c" in store
+    assert store.stats()["evicted"] == 1
+
+
+def test_expired_sessions_are_hidden_then_released():
+    clock = FakeClock()
+    evicted = []
+
+    async def on_evict(key: str, value: str):
+        evicted.append(key)
+
+    store: SessionStore[str] = SessionStore(idle_ttl=10, on_evict=on_evict, clock=clock)
+
+    async def run():
+        await store.put("a", "token-a")
+        await store.put("b", "token-b")
+        clock.now = 5
+        store.get("b")
+        clock.now = 12
+        # Expired entries disappear at once but are released on the next write
+        assert "a" not in store
+        assert store.get("a") is None
+        assert len(store) == 2
+        await store.evict_expired()
+
+    asyncio.run(run())
+    assert evicted == ["a"]
+    assert list(store.values()) == ["token-b"]
+    assert store.stats()["expired"] == 1
+
+
+def test_put_releases_expired_session_before_reuse():
+    clock = FakeClock()
+    evicted = []
+    store: SessionStore[str] = SessionStore(
+        idle_ttl=10, on_evict=lambda key, value: evicted.append(value), clock=clock
+    )
+
+    async def run():
+        await store.put("a", "old")
+        clock.now = 11
+        await store.put("a", "new")
+
+    asyncio.run(run())
+    assert evicted == ["old"]
+    assert store["a"] == "new"
+
+
+def test_setitem_and_pop():
+    store: SessionStore[str] = SessionStore(on_evict=pytest.fail)
+    with pytest.raises(KeyError):
+        store["a"] = "token"
+    asyncio.run(store.put("a", ""))
+    store["a"] = "token"
+    assert store["a"] == "token"
+    assert store.pop("a") == "token"
+    assert store.pop("a") is None
+    assert 1 not in store
+    with pytest.raises(KeyError):
+        store["a"]
+
+
+def test_memory_usage_reports_current_and_peak_rss():
+    usage = memory_usage()
+    # The peak is only sampled by the kernel, compare loosely
+    assert usage["rss_kb"] is not None
+    assert 0 < usage["rss_kb"] < 2 * usage["max_rss_kb"]
@@ -0,0 +1,42 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from typing import Any
+
+from langchain_core.messages import BaseMessageChunk
+
+
+def chunk_text(chunk: BaseMessageChunk) -> str:
+    """Return the text of a streamed chat model chunk, which carries no text
+    while the model is generating tool calls."""
+    if isinstance(chunk.content, str):
+        return chunk.content
+    return "".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in chunk.content
+    )
+
+
+def tool_trace(name: str, output: Any) -> dict[str, Any]:
+    """Build a trace entry, in the format rendered by the UI, from a tool result."""
+    trace: dict[str, Any] = {"tool_call_id": name}
+    if isinstance(output, dict) and "results" in output:
+        if output.get("sql"):
+            trace["sql"] = output["sql"]
+        output = output["results"]
+    trace["results"] = (
+        output if isinstance(output, str) else json.dumps(output, default=str)
+    )
+    return trace
@@ -16,9 +16,9 @@ import asyncio
 import os
 import uuid
 from datetime import datetime
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Dict, List, Optional
 
-from aiohttp import ClientSession, TCPConnector
+from aiohttp import ClientSession
 from fastapi import HTTPException
 from google.protobuf.json_format import MessageToDict  # type: ignore
 from pytz import timezone
@@ -29,7 +29,13 @@ from vertexai.preview.generative_models import (  # type: ignore
     Part,
 )
 
+import tracing
+
+from ..http_client import decode_response
 from ..orchestrator import BaseOrchestrator, classproperty
+from ..request_context import RequestContext
+from ..session_store import SessionStore
+from ..streaming import tool_trace
 from .functions import (
     BASE_URL,
     assistant_tool,
@@ -38,6 +44,12 @@ from .functions import (
     get_headers,
     insert_ticket,
 )
+from .history import (
+    FUNCTION_RESPONSE_MAX_CHARS,
+    ChatHistory,
+    content_to_text,
+    truncate_function_response,
+)
 
 DEBUG = os.getenv("DEBUG", default=False)
 BASE_HISTORY = {
@@ -49,22 +61,40 @@ BASE_HISTORY = {
 class UserModel:
     client: ClientSession
     model: GenerativeModel
-    history: List[Content]
-
-    def __init__(self, client: ClientSession, model: GenerativeModel):
+    summary_model: GenerativeModel
+    history: ChatHistory
+    context: RequestContext
+
+    def __init__(
+        self,
+        client: ClientSession,
+        model: GenerativeModel,
+        summary_model: GenerativeModel,
+    ):
         self.client = client
         self.model = model
-        self.history = []
-
-    @classmethod
-    def initialize_model(cls, client: ClientSession, model: str) -> "UserModel":
-        model = GenerativeModel(model, tools=[assistant_tool()])
-        return UserModel(client, model)
+        self.summary_model = summary_model
+        self.history = ChatHistory(self.summarize)
+        self.context = RequestContext()
 
     async def close(self):
-        await self.client.close()
+        # The client is shared across sessions and closed by the orchestrator
+        self.context = RequestContext()
+        self.history.clear()
 
     async def invoke(self, input_prompt: str) -> Dict[str, Any]:
+        response: Dict[str, Any] = {}
+        async for event in self.stream(input_prompt):
+            if event["type"] == "response":
+                response = event["content"]
+        return response
+
+    async def stream(self, input_prompt: str) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the multi turn function calling loop, yielding model text as
+        "token" events and function results as "trace" events while they are
+        generated, followed by the final "response".
+        """
         prompt = self.get_prompt()
         user_prompt_content = Content(
             role="user",
@@ -72,46 +102,96 @@ class UserModel:
                 Part.from_text(prompt + input_prompt),
             ],
         )
-        self.history.append(user_prompt_content)
-        model_response = await self.request_model(user_prompt_content)
+        self.history.start_turn(user_prompt_content)
         self.debug_log(f"Prompt:\n{prompt}\n\nQuestion: {input_prompt}.")
-        self.debug_log(f"\nFunction call response:\n{model_response}")
-        response_function_call_content = model_response.candidates[0].content
-        part_response = response_function_call_content.parts[0]
-        confirmation = None
-
-        # implement multi turn chat with while loop
-        while "function_call" in part_response._raw_part:
-            self.history.append(response_function_call_content)
-            function_call = MessageToDict(part_response.function_call._pb)
-            function_name = function_call.get("name")
-            if function_name in get_confirmation_needing_tools():
-                function_response = self.confirmation_response(
-                    function_name, function_call.get("args")
+        try:
+            confirmation = None
+            trace = []
+            # Text of every response this turn, as streamed in token events
+            output = ""
+
+            # implement multi turn chat with while loop
+            while True:
+                model_text = ""
+                function_call_parts = []
+                contents = await self.history.contents()
+                async for chunk in self.request_model_stream(contents):
+                    if not chunk.candidates:
+                        continue
+                    for part_response in chunk.candidates[0].content.parts:
+                        if "function_call" in part_response._raw_part:
+                            function_call_parts.append(part_response)
+                        elif "text" in part_response._raw_part:
+                            model_text += part_response.text
+                            yield {"type": "token", "content": part_response.text}
+                output += model_text
+                if not function_call_parts:
+                    break
+
+                # All calls of a response are answered together in one turn,
+                # kept after any text the model wrote along with them
+                text_parts = [Part.from_text(model_text)] if model_text else []
+                function_call_content = Content(
+                    role="model", parts=text_parts + function_call_parts
                 )
-                confirmation = {
-                    "tool": function_name,
-                    "params": function_call.get("args"),
-                }
-            else:
-                function_response = await self.request_function(function_call)
-            self.debug_log(f"Function response:\n{function_response}")
-            part = Part.from_function_response(
-                name=function_call["name"],
-                response={
-                    "content": function_response,
-                },
-            )
-            content = Content(
-                parts=[part],
-            )
-            self.history.append(content)
-            model_response = await self.request_model(self.history)
-            response_function_call_content = model_response.candidates[0].content
-            part_response = response_function_call_content.parts[0]
+                self.debug_log(f"\nFunction call response:\n{function_call_content}")
+                self.history.append(function_call_content)
+                function_calls = [
+                    MessageToDict(part._raw_part.function_call._pb)
+                    for part in function_call_parts
+                ]
+                needs_confirmation = [
+                    function_call.get("name") in get_confirmation_needing_tools()
+                    for function_call in function_calls
+                ]
+                # Retrieval calls are independent of each other, run them at once
+                retrieval_responses = iter(
+                    await asyncio.gather(
+                        *(
+                            self.request_function(function_call)
+                            for function_call, confirm in zip(
+                                function_calls, needs_confirmation
+                            )
+                            if not confirm
+                        )
+                    )
+                )
+                parts = []
+                for function_call, confirm in zip(function_calls, needs_confirmation):
+                    function_name = function_call.get("name")
+                    if confirm:
+                        function_response = self.confirmation_response(
+                            function_name, function_call.get("args")
+                        )
+                        confirmation = {
+                            "tool": function_name,
+                            "params": function_call.get("args"),
+                        }
+                    else:
+                        function_response = next(retrieval_responses)
+                        trace.append(tool_trace(function_name, function_response))
+                        yield {"type": "trace", "content": trace[-1]}
+                        function_response = truncate_function_response(
+                            function_response, FUNCTION_RESPONSE_MAX_CHARS
+                        )
+                    self.debug_log(f"Function response:\n{function_response}")
+                    parts.append(
+                        Part.from_function_response(
+                            name=function_name,
+                            response={
+                                "content": function_response,
+                            },
+                        )
+                    )
+                content = Content(
+                    parts=parts,
+                )
+                self.history.append(content)
 
-        if "text" in part_response._raw_part:
-            model_text = part_response.text
+            if not model_text:
+                raise HTTPException(
+                    status_code=500, detail="Error: Chat model response unknown"
+                )
             model_content = Content(
                 role="model",
                 parts=[
@@ -119,32 +199,50 @@ class UserModel:
                 ],
             )
             self.history.append(model_content)
-            self.debug_log(f"Output content: {model_text}")
-            return {"output": model_text, "confirmation": confirmation}
-        else:
-            raise HTTPException(
-                status_code=500, detail="Error: Chat model response unknown"
-            )
+            self.history.end_turn()
+        except BaseException:
+            # Never keep a function call without its response
+            self.history.discard_turn()
+            raise
+        self.debug_log(f"Output content: {output}")
+        response = {"output": output, "confirmation": confirmation, "trace": trace}
+        yield {"type": "response", "content": response}
 
     def get_prompt(self) -> str:
         formatter = "%A, %m/%d/%Y, %H:%M:%S"
         now = datetime.now(timezone("US/Pacific")).strftime("%A, %m/%d/%Y, %H:%M:%S")
-        prompt = f"{PREFIX}\nToday's date and current time is {now}."
+        prompt = f"Today's date and current time is {now}.\n"
         return prompt
 
     def debug_log(self, output: str) -> None:
         if DEBUG:
             print(output)
 
-    async def request_model(self, contents: List[Content]):
+    async def summarize(self, summary: str, contents: List[Content]) -> str:
+        """Fold turns leaving the history window into the running summary."""
+        conversation = "\n".join(content_to_text(content) for content in contents)
+        response = await self.summary_model.generate_content_async(
+            SUMMARY_PROMPT.format(summary=summary or "None", conversation=conversation),
+            generation_config=GenerationConfig(temperature=0, max_output_tokens=256),
+        )
+        return response.text
+
+    async def request_model_stream(self, contents: List[Content]):
+        # Not made current, the span stays open while the caller handles chunks
+        span = tracing.start_span("llm")
         try:
-            model_response = await self.model.generate_content_async(
+            response_stream = await self.model.generate_content_async(
                 contents,
                 generation_config=GenerationConfig(temperature=0),
+                stream=True,
             )
+            async for chunk in response_stream:
+                yield chunk
         except Exception as err:
+            span.record_error(err)
             raise HTTPException(status_code=500, detail=f"Error invoking agent: {err}")
-        return model_response
+        finally:
+            span.end()
 
     def confirmation_response(self, function_name, function_params):
         if function_name == "insert_ticket":
@@ -155,31 +253,29 @@ class UserModel:
         url = function_request(function_call["name"])
         params = function_call["args"]
         self.debug_log(f"Function url is {url}.\nParams is {params}.")
-        response = await self.client.get(
-            url=f"{BASE_URL}/{url}",
-            params=params,
-            headers=get_headers(self.client),
-        )
-        response_json = await response.json()
+        with tracing.span(f"tool {function_call['name']}"):
+            response = await self.client.get(
+                url=f"{BASE_URL}/{url}",
+                params=params,
+                headers=await get_headers(self.context),
+            )
+            response_json = await decode_response(response)
         response_results = response_json.get("results")
         return response_results
 
     async def insert_ticket(self, params: str):
-        return await insert_ticket(self.client, params)
+        return await insert_ticket(self.client, self.context, params)
 
     def reset_memory(self, model: str):
         """reinitiate chat model to reset memory."""
-        del self.history
-        self.history = []
+        self.history.clear()
 
 
 class FunctionCallingOrchestrator(BaseOrchestrator):
-    _user_sessions: Dict[str, UserModel]
-    # aiohttp context
-    connector = None
+    _user_sessions: SessionStore[UserModel]
 
     def __init__(self):
-        self._user_sessions = {}
+        self._user_sessions = SessionStore(on_evict=self.evict_user_session)
 
     @classproperty
     def kind(cls):
@@ -209,9 +305,12 @@ class FunctionCallingOrchestrator(BaseOrchestrator):
         if "history" not in session:
             session["history"] = [BASE_HISTORY]
         client = await self.create_client_session()
-        model = UserModel.initialize_model(client, self.MODEL)
-        self._user_sessions[id] = model
-        self.client = client
+        # The system instruction is sent once per request, not with every prompt
+        chat_model = self.create_generative_model(
+            tools=[assistant_tool()], system_instruction=PREFIX
+        )
+        model = UserModel(client, chat_model, self.create_generative_model())
+        await self._user_sessions.put(id, model)
 
     async def user_session_invoke(self, uuid: str, prompt: str) -> dict[str, Any]:
         user_session = self.get_user_session(uuid)
@@ -219,7 +318,14 @@ class FunctionCallingOrchestrator(BaseOrchestrator):
         response = await user_session.invoke(prompt)
         return response
 
-    def user_session_reset(self, session: dict[str, Any], uuid: str):
+    async def user_session_stream(
+        self, uuid: str, prompt: str
+    ) -> AsyncIterator[dict[str, Any]]:
+        user_session = self.get_user_session(uuid)
+        async for event in user_session.stream(prompt):
+            yield event
+
+    async def user_session_reset(self, session: dict[str, Any], uuid: str):
         user_session = self.get_user_session(uuid)
         del session["history"]
         base_history = self.get_base_history(session)
@@ -229,19 +335,6 @@ class FunctionCallingOrchestrator(BaseOrchestrator):
     def get_user_session(self, uuid: str) -> UserModel:
         return self._user_sessions[uuid]
 
-    async def get_connector(self) -> TCPConnector:
-        if self.connector is None:
-            self.connector = TCPConnector(limit=100)
-        return self.connector
-
-    async def create_client_session(self) -> ClientSession:
-        return ClientSession(
-            connector=await self.get_connector(),
-            connector_owner=False,
-            headers={},
-            raise_for_status=True,
-        )
-
     def get_base_history(self, session: dict[str, Any]):
         if "user_info" in session:
             base_history = {
@@ -257,13 +350,24 @@ class FunctionCallingOrchestrator(BaseOrchestrator):
         user_session = self.get_user_session(uuid)
         if user_session:
             await user_session.close()
-            del self._user_sessions[uuid]
+            self._user_sessions.pop(uuid)
+
+    async def evict_user_session(self, uuid: str, user_session: UserModel):
+        await user_session.close()
+
+    async def session_stats(self) -> dict[str, Any]:
+        stats = await super().session_stats()
+        stats["user_sessions"]["messages"] = sum(
+            len(s.history) for s in self._user_sessions.values()
+        )
+        return stats
 
     async def close_clients(self):
         close_client_tasks = [
             asyncio.create_task(a.close()) for a in self._user_sessions.values()
         ]
         await asyncio.gather(*close_client_tasks)
+        await super().close_clients()
 
 
 PREFIX = """The Cymbal Air Customer Service Assistant helps customers of Cymbal Air with their travel needs.
@@ -281,3 +385,13 @@ conversations and provide responses that are coherent and relevant to the topic
 Assistant is a powerful tool that can help answer a wide range of questions pertaining to travel on Cymbal Air
 as well as ammenities of San Francisco Airport.
 """
+
+SUMMARY_PROMPT = """Summarize the conversation between a Cymbal Air customer and the
+assistant in a few sentences. Keep names, airports, flight numbers, dates and
+any booking decisions. Merge it with the previous summary.
+
+Previous summary: {summary}
+
+Conversation:
+{conversation}
+"""
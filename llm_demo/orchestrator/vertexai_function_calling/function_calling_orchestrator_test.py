@@ -0,0 +1,66 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import Any
+
+from ..scripted_llm import response_of
+from .function_calling_orchestrator import UserModel
+
+
+class TextThenCallModel:
+    """Writes some text along with a function call, then answers."""
+
+    def __init__(self):
+        self.requests: list[list[Any]] = []
+
+    async def generate_content_async(self, contents, *, stream=False, **kwargs):
+        self.requests.append(list(contents))
+        if len(self.requests) == 1:
+            chunks = [
+                [{"text": "Let me look. "}],
+                [{"function_call": {"name": "amenities_search", "args": {}}}],
+            ]
+        else:
+            chunks = [[{"text": "Try the cafe."}]]
+
+        async def stream_chunks():
+            for parts in chunks:
+                yield response_of(parts)
+
+        return stream_chunks()
+
+
+def test_stream_keeps_text_written_with_function_calls():
+    model = TextThenCallModel()
+    user = UserModel(None, model, model)  # type: ignore[arg-type]
+
+    async def request_function(function_call):
+        return [{"name": "Cafe"}]
+
+    user.request_function = request_function  # type: ignore[method-assign]
+
+    async def run():
+        return [event async for event in user.stream("Where is coffee?")]
+
+    events = asyncio.run(run())
+    tokens = [event["content"] for event in events if event["type"] == "token"]
+    assert tokens == ["Let me look. ", "Try the cafe."]
+    assert events[-1]["content"]["output"] == "Let me look. Try the cafe."
+
+    call_content = model.requests[1][-2]
+    assert call_content.role == "model"
+    parts = call_content.to_dict()["parts"]
+    assert parts[0] == {"text": "Let me look. "}
+    assert parts[1]["function_call"]["name"] == "amenities_search"
@@ -14,12 +14,15 @@
 
 import json
 import os
+from typing import Dict
 
 import aiohttp
 from vertexai.preview import generative_models  # type: ignore
 
+from ..http_client import decode_response
+from ..request_context import RequestContext
+
 BASE_URL = os.getenv("BASE_URL", default="http://127.0.0.1:8080")
-CREDENTIALS = None
 
 search_airports_func = generative_models.FunctionDeclaration(
     name="airports_search",
@@ -187,7 +190,9 @@ list_tickets_func = generative_models.FunctionDeclaration(
 )
 
 
-async def insert_ticket(client: aiohttp.ClientSession, params: str):
+async def insert_ticket(
+    client: aiohttp.ClientSession, context: RequestContext, params: str
+):
     ticket_info = json.loads(params)
     response = await client.post(
         url=f"{BASE_URL}/tickets/insert",
@@ -199,38 +204,15 @@ async def insert_ticket(client: aiohttp.ClientSession, params: str):
             "departure_time": ticket_info.get("departure_time").replace("T", " "),
             "arrival_time": ticket_info.get("arrival_time").replace("T", " "),
         },
-        headers=get_headers(client),
+        headers=await get_headers(context),
     )
-    response = await response.json()
+    response = await decode_response(response)
     return response
 
 
-def get_id_token():
-    global CREDENTIALS
-    if CREDENTIALS is None:
-        CREDENTIALS, _ = google.auth.default()
-        if not hasattr(CREDENTIALS, "id_token"):
-            # Use Compute Engine default credential
-            CREDENTIALS = compute_engine.IDTokenCredentials(
-                request=Request(),
-                target_audience=BASE_URL,
-                use_metadata_identity_endpoint=True,
-            )
-    if not CREDENTIALS.valid:
-        CREDENTIALS.refresh(Request())
-    if hasattr(CREDENTIALS, "id_token"):
-        return CREDENTIALS.id_token
-    else:
-        return CREDENTIALS.token
-
-
-def get_headers(client: aiohttp.ClientSession):
-    """Helper method to generate ID tokens for authenticated requests"""
-    headers = client.headers
-    if not "http://" in BASE_URL:
-        # Append ID Token to make authenticated requests to Cloud Run services
-        headers["Authorization"] = f"Bearer {get_id_token()}"
-    return headers
+async def get_headers(context: RequestContext) -> Dict[str, str]:
+    """Build the headers of one request for a user session's context"""
+    return await context.headers(BASE_URL)
 
 
 def function_request(function_call_name: str) -> str:
@@ -0,0 +1,173 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import os
+from typing import Any, Awaitable, Callable, List, Optional
+
+from vertexai.preview.generative_models import Content, Part  # type: ignore
+
+# Estimated tokens of history kept verbatim before old turns are summarized
+HISTORY_TOKEN_BUDGET = int(os.getenv("HISTORY_TOKEN_BUDGET", default=4000))
+# Number of most recent turns that are always sent verbatim
+HISTORY_KEEP_TURNS = int(os.getenv("HISTORY_KEEP_TURNS", default=2))
+# Serialized size above which function responses are cut down
+FUNCTION_RESPONSE_MAX_CHARS = int(
+    os.getenv("FUNCTION_RESPONSE_MAX_CHARS", default=4000)
+)
+# Characters of each function response included in the summarization prompt
+SUMMARY_EXCERPT_CHARS = 500
+# Rough average for Gemini tokenizers, good enough for budgeting
+CHARS_PER_TOKEN = 4
+
+Summarizer = Callable[[str, List[Content]], Awaitable[str]]
+
+
+def estimate_tokens(content: Content) -> int:
+    return len(json.dumps(content.to_dict(), default=str)) // CHARS_PER_TOKEN + 1
+
+
+def truncate_function_response(response: Any, max_chars: int) -> Any:
+    """
+    Cut a function response down to roughly `max_chars` serialized characters.
+    Lists keep their leading items so the model still sees whole records.
+    """
+    if len(json.dumps(response, default=str)) <= max_chars:
+        return response
+    if isinstance(response, list):
+        kept, size = [], 2
+        for item in response:
+            size += len(json.dumps(item, default=str)) + 2
+            if size > max_chars:
+                break
+            kept.append(item)
+        return {
+            "results": kept,
+            "note": f"Showing {len(kept)} of {len(response)} results.",
+        }
+    return str(response)[:max_chars] + "... (truncated)"
+
+
+def content_to_text(content: Content) -> str:
+    """Render a Content as plain text for the summarization prompt."""
+    lines = []
+    for part in content.to_dict().get("parts", []):
+        if "text" in part:
+            lines.append(f"{content.role or 'user'}: {part['text']}")
+        elif "function_call" in part:
+            call = part["function_call"]
+            lines.append(f"model called {call.get('name')}({call.get('args')})")
+        elif "function_response" in part:
+            # Results are only context for the summary, a short excerpt will do
+            response = part["function_response"]
+            excerpt = str(response.get("response"))[:SUMMARY_EXCERPT_CHARS]
+            lines.append(f"{response.get('name')} returned {excerpt}")
+    return "\n".join(lines)
+
+
+class ChatHistory:
+    """
+    Conversation history of a UserModel kept within a token budget.
+
+    History is stored as turns, each starting with a user prompt and holding
+    the function calls, function responses and model reply it produced, so
+    windowing never separates a function call from its response. When a turn
+    ends over budget, the oldest turns leave the window and are folded into a
+    running summary in the background; the next request waits for it.
+    """
+
+    def __init__(
+        self,
+        summarize: Summarizer,
+        token_budget: int = HISTORY_TOKEN_BUDGET,
+        keep_turns: int = HISTORY_KEEP_TURNS,
+    ):
+        self._summarize = summarize
+        self.token_budget = token_budget
+        self.keep_turns = keep_turns
+        self.summary = ""
+        self._turns: List[List[Content]] = []
+        self._tokens: List[int] = []
+        self._compaction: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return sum(len(turn) for turn in self._turns)
+
+    def start_turn(self, content: Content):
+        self._turns.append([])
+        self._tokens.append(0)
+        self.append(content)
+
+    def append(self, content: Content):
+        self._turns[-1].append(content)
+        self._tokens[-1] += estimate_tokens(content)
+
+    def discard_turn(self):
+        """Drop an unfinished turn, e.g. when the model request failed."""
+        if self._turns:
+            self._turns.pop()
+            self._tokens.pop()
+
+    async def contents(self) -> List[Content]:
+        """Return the summary and windowed turns to send to the model."""
+        if self._compaction is not None:
+            await self._compaction
+            self._compaction = None
+        contents = []
+        if self.summary:
+            contents.append(
+                Content(
+                    role="user",
+                    parts=[
+                        Part.from_text(
+                            f"Summary of our earlier conversation: {self.summary}"
+                        )
+                    ],
+                )
+            )
+            contents.append(Content(role="model", parts=[Part.from_text("Noted.")]))
+        for turn in self._turns:
+            contents.extend(turn)
+        return contents
+
+    def end_turn(self):
+        """Move the oldest turns out of the window if it is over budget."""
+        evicted: List[Content] = []
+        while (
+            len(self._turns) > self.keep_turns and sum(self._tokens) > self.token_budget
+        ):
+            evicted.extend(self._turns.pop(0))
+            self._tokens.pop(0)
+        if evicted:
+            self._compaction = asyncio.create_task(
+                self._compact(self._compaction, evicted)
+            )
+
+    def clear(self):
+        if self._compaction is not None:
+            self._compaction.cancel()
+            self._compaction = None
+        self.summary = ""
+        self._turns.clear()
+        self._tokens.clear()
+
+    async def _compact(self, previous: Optional[asyncio.Task], evicted: List[Content]):
+        if previous is not None:
+            await previous
+        try:
+            self.summary = await self._summarize(self.summary, evicted)
+        except Exception as err:
+            # Keep the previous summary, the evicted turns are dropped either way
+            print(f"History summarization failed: {err}")
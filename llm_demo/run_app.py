@@ -13,28 +13,90 @@
 # limitations under the License.
 
 
+import argparse
 import asyncio
+import importlib
 import os
+import sys
+import time
 
 import uvicorn
+from fastapi import FastAPI
 
-from app import init_app
+PORT = int(os.getenv("PORT", default=8081))
+HOST = os.getenv("HOST", default="0.0.0.0")
+ORCHESTRATION_TYPE = os.getenv("ORCHESTRATION_TYPE", default="langchain-tools")
+CLIENT_ID = os.getenv("CLIENT_ID")
+MIDDLEWARE_SECRET = os.getenv("MIDDLEWARE_SECRET", default="this is a secret")
 
 
-async def main():
-    PORT = int(os.getenv("PORT", default=8081))
-    HOST = os.getenv("HOST", default="0.0.0.0")
-    ORCHESTRATION_TYPE = os.getenv("ORCHESTRATION_TYPE", default="langchain-tools")
-    CLIENT_ID = os.getenv("CLIENT_ID")
-    MIDDLEWARE_SECRET = os.getenv("MIDDLEWARE_SECRET", default="this is a secret")
+def create_app() -> FastAPI:
+    # Imported here so that --measure-startup times the app's own imports
+    from app import init_app
+
     app = init_app(
         ORCHESTRATION_TYPE, client_id=CLIENT_ID, middleware_secret=MIDDLEWARE_SECRET
     )
     if app is None:
         raise TypeError("app not instantiated")
+    return app
+
+
+async def main():
+    app = create_app()
     server = uvicorn.Server(uvicorn.Config(app, host=HOST, port=PORT, log_level="info"))
     await server.serve()
 
 
+async def measure_startup():
+    """
+    Report how long the app takes to import, to build, and to answer its first
+    and second request, without binding a port.
+    """
+    import httpx
+
+    start = time.perf_counter()
+    importlib.import_module("app")
+
+    imported = time.perf_counter()
+    app = create_app()
+    created = time.perf_counter()
+    timings = [
+        ("import", imported - start),
+        (f"init_app ({ORCHESTRATION_TYPE})", created - imported),
+    ]
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(
+            transport=transport, base_url="http://localhost"
+        ) as client:
+            for name in ("first request", "second request"):
+                request_start = time.perf_counter()
+                try:
+                    response = await client.get("/")
+                    status = str(response.status_code)
+                except Exception as err:
+                    status = type(err).__name__
+                timings.append(
+                    (f"{name} (GET / {status})", time.perf_counter() - request_start)
+                )
+
+    modules = [m for m in sys.modules if m.split(".")[0] == "orchestrator"]
+    for name, seconds in timings:
+        print(f"{name:<40} {seconds * 1000:10.1f} ms")
+    print(
+        f"{'total to first response':<40} {sum(t for _, t in timings[:3]) * 1000:10.1f} ms"
+    )
+    print(f"{'orchestrator modules loaded':<40} {len(modules):10d}")
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    parser = argparse.ArgumentParser(description="Run the LLM demo app")
+    parser.add_argument(
+        "--measure-startup",
+        action="store_true",
+        help="Report import and first request latency, then exit",
+    )
+    args = parser.parse_args()
+    asyncio.run(measure_startup() if args.measure_startup else main())
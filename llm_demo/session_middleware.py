@@ -0,0 +1,281 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+import json
+import os
+import secrets
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Any, Optional
+
+import itsdangerous
+from itsdangerous.exc import BadSignature
+from starlette.datastructures import MutableHeaders
+from starlette.requests import HTTPConnection
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from orchestrator.session_store import SessionStore
+
+# Session backend: "memory" or "sqlite"
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", default="memory")
+# SQLite database path, shared by the workers on one host
+SESSION_BACKEND_URI = os.getenv("SESSION_BACKEND_URI", default="sessions.sqlite")
+# Seconds a session is kept after its last request
+SESSION_MAX_AGE = int(os.getenv("SESSION_MAX_AGE", default=14 * 24 * 60 * 60))
+# Sessions held by the in-memory backend before the least recently used go
+SESSION_BACKEND_MAX_ENTRIES = int(
+    os.getenv("SESSION_BACKEND_MAX_ENTRIES", default=10000)
+)
+
+SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    session_id TEXT PRIMARY KEY,
+    data TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS sessions_updated_at ON sessions (updated_at);
+"""
+
+SessionData = dict[str, Any]
+
+
+class SessionBackend(ABC):
+    """Stores session data, such as the chat history, keyed by session id."""
+
+    @abstractmethod
+    async def load(self, session_id: str) -> Optional[SessionData]:
+        raise NotImplementedError("Subclass should implement this!")
+
+    @abstractmethod
+    async def save(self, session_id: str, data: SessionData):
+        raise NotImplementedError("Subclass should implement this!")
+
+    @abstractmethod
+    async def delete(self, session_id: str):
+        raise NotImplementedError("Subclass should implement this!")
+
+    async def stats(self) -> dict[str, Any]:
+        """Number of sessions the backend holds."""
+        return {}
+
+    def close(self):
+        pass
+
+
+class MemorySessionBackend(SessionBackend):
+    """
+    Keeps session dicts in process memory, bounded by count and idle time.
+    Requests of the same session share one dict, so nothing is serialized.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = SESSION_BACKEND_MAX_ENTRIES,
+        idle_ttl: float = SESSION_MAX_AGE,
+    ):
+        self._sessions: SessionStore[SessionData] = SessionStore(
+            max_entries=max_entries, idle_ttl=idle_ttl
+        )
+
+    async def load(self, session_id: str) -> Optional[SessionData]:
+        return self._sessions.get(session_id)
+
+    async def save(self, session_id: str, data: SessionData):
+        await self._sessions.put(session_id, data)
+
+    async def delete(self, session_id: str):
+        self._sessions.pop(session_id)
+
+    async def stats(self) -> dict[str, Any]:
+        return self._sessions.stats()
+
+
+class SQLiteSessionBackend(SessionBackend):
+    """
+    Keeps sessions as JSON in a SQLite file that several worker processes on
+    the same host can share. Sessions idle for longer than `max_age` are
+    deleted on write.
+    """
+
+    def __init__(self, path: str, max_age: float = SESSION_MAX_AGE):
+        self.max_age = max_age
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SQLITE_SCHEMA)
+
+    async def load(self, session_id: str) -> Optional[SessionData]:
+        return await asyncio.to_thread(self._load, session_id)
+
+    async def save(self, session_id: str, data: SessionData):
+        await asyncio.to_thread(self._save, session_id, json.dumps(data))
+
+    async def delete(self, session_id: str):
+        await asyncio.to_thread(self._delete, session_id)
+
+    async def stats(self) -> dict[str, Any]:
+        return await asyncio.to_thread(self._stats)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+    def _stats(self) -> dict[str, Any]:
+        with self._lock:
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM sessions").fetchone()
+        return {"entries": count, "max_age": self.max_age}
+
+    def _load(self, session_id: str) -> Optional[SessionData]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data FROM sessions WHERE session_id = ? AND updated_at > ?",
+                (session_id, time.time() - self.max_age),
+            ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _save(self, session_id: str, data: str):
+        now = time.time()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)",
+                (session_id, data, now),
+            )
+            self._conn.execute(
+                "DELETE FROM sessions WHERE updated_at <= ?", (now - self.max_age,)
+            )
+
+    def _delete(self, session_id: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            )
+
+
+def create_session_backend(
+    kind: str = SESSION_BACKEND, uri: str = SESSION_BACKEND_URI
+) -> SessionBackend:
+    """Create the session backend configured for this process."""
+    if kind == "memory":
+        return MemorySessionBackend()
+    if kind == "sqlite":
+        return SQLiteSessionBackend(uri)
+    raise TypeError(f"No session backend of kind {kind}")
+
+
+class ServerSessionMiddleware:
+    """
+    Drop-in replacement for Starlette's SessionMiddleware that keeps
+    `request.session` on the server. The cookie only holds a signed, random
+    session id, so neither the chat history nor its signature travels with
+    each request.
+
+    The session is saved right before the last body message is sent, so data
+    added while streaming a response is kept as well.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        secret_key: str,
+        backend: SessionBackend,
+        session_cookie: str = "session",
+        max_age: int = SESSION_MAX_AGE,
+        same_site: str = "lax",
+        https_only: bool = False,
+    ):
+        self.app = app
+        self.backend = backend
+        self.signer = itsdangerous.Signer(secret_key)
+        self.session_cookie = session_cookie
+        self.max_age = max_age
+        self.security_flags = f"httponly; samesite={same_site}"
+        if https_only:
+            self.security_flags += "; secure"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+
+        session_id, cookie = await self.load_session(scope)
+        saved = False
+
+        async def save():
+            nonlocal saved
+            saved = True
+            if not cookie:
+                return
+            if scope["session"]:
+                await self.backend.save(session_id, scope["session"])
+            else:
+                await self.backend.delete(session_id)
+
+        async def send_wrapper(message: Message):
+            nonlocal session_id, cookie
+            if message["type"] == "http.response.start":
+                if scope["session"]:
+                    if not cookie:
+                        session_id = secrets.token_urlsafe(32)
+                        cookie = self.signer.sign(session_id).decode()
+                    # Sent again on every response to extend its lifetime
+                    self.set_cookie(message, cookie, persist=True)
+                elif cookie:
+                    self.set_cookie(message, "null", persist=False)
+            elif message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                await save()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The client went away before the response was complete
+            if not saved and cookie:
+                await save()
+
+    async def load_session(self, scope: Scope) -> tuple[str, Optional[str]]:
+        """
+        Set scope["session"] and return the session id and its signed cookie
+        value. A new session has no cookie yet and gets an id once it has data.
+        """
+        scope["session"] = {}
+        cookie = HTTPConnection(scope).cookies.get(self.session_cookie)
+        if not cookie:
+            return "", None
+        try:
+            session_id = self.signer.unsign(cookie).decode()
+        except BadSignature:
+            return "", None
+        data = await self.backend.load(session_id)
+        if data is None:
+            # Unknown or expired ids are never reused
+            return "", None
+        scope["session"] = data
+        return session_id, cookie
+
+    def set_cookie(self, message: Message, value: str, *, persist: bool):
+        expiry = (
+            f"Max-Age={self.max_age}; "
+            if persist
+            else "expires=Thu, 01 Jan 1970 00:00:00 GMT; "
+        )
+        MutableHeaders(scope=message).append(
+            "Set-Cookie",
+            f"{self.session_cookie}={value}; path=/; {expiry}{self.security_flags}",
+        )
@@ -0,0 +1,117 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from session_middleware import (
+    MemorySessionBackend,
+    ServerSessionMiddleware,
+    SessionBackend,
+    SQLiteSessionBackend,
+    create_session_backend,
+)
+
+
+def make_client(backend: SessionBackend) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(ServerSessionMiddleware, secret_key="secret", backend=backend)
+
+    @app.get("/read")
+    async def read(request: Request):
+        return dict(request.session)
+
+    @app.get("/login")
+    async def login(request: Request):
+        request.session["user"] = "alice"
+        return {}
+
+    @app.get("/logout")
+    async def logout(request: Request):
+        request.session.clear()
+        return {}
+
+    @app.get("/stream")
+    async def stream(request: Request):
+        async def chunks():
+            yield "a"
+            # Added after the response headers went out
+            request.session.setdefault("history", []).append("answer")
+            yield "b"
+
+        return StreamingResponse(chunks())
+
+    return TestClient(app)
+
+
+def test_cookie_only_holds_signed_session_id():
+    backend = MemorySessionBackend()
+    client = make_client(backend)
+    response = client.get("/read")
+    assert "set-cookie" not in response.headers
+
+    response = client.get("/login")
+    cookie = client.cookies["session"]
+    session_id, _ = cookie.rsplit(".", 1)
+    assert "alice" not in cookie
+    assert "Max-Age=1209600" in response.headers["set-cookie"]
+    assert asyncio.run(backend.load(session_id)) == {"user": "alice"}
+    assert client.get("/read").json() == {"user": "alice"}
+
+    # A tampered cookie starts a new, empty session
+    client.cookies["session"] = session_id + ".forged"
+    assert client.get("/read").json() == {}
+
+
+def test_session_is_saved_after_last_chunk(tmp_path):
+    backend = SQLiteSessionBackend(str(tmp_path / "sessions.sqlite"))
+    client = make_client(backend)
+    client.get("/login")
+    assert client.get("/stream").text == "ab"
+    assert client.get("/read").json() == {"user": "alice", "history": ["answer"]}
+
+    # A second worker on the same host sees the session
+    other = make_client(SQLiteSessionBackend(str(tmp_path / "sessions.sqlite")))
+    other.cookies["session"] = client.cookies["session"]
+    assert other.get("/read").json()["history"] == ["answer"]
+
+
+def test_clearing_the_session_deletes_it():
+    backend = MemorySessionBackend()
+    client = make_client(backend)
+    client.get("/login")
+    session_id, _ = client.cookies["session"].rsplit(".", 1)
+
+    response = client.get("/logout")
+    assert "session=null" in response.headers["set-cookie"]
+    assert asyncio.run(backend.load(session_id)) is None
+
+
+def test_create_session_backend_rejects_unknown_kind():
+    with pytest.raises(TypeError, match="No session backend of kind redis"):
+        create_session_backend("redis")
+
+
+def test_backends_report_entry_counts(tmp_path):
+    for backend in (
+        MemorySessionBackend(),
+        SQLiteSessionBackend(str(tmp_path / "sessions.sqlite")),
+    ):
+        make_client(backend).get("/login")
+        make_client(backend).get("/login")
+        assert asyncio.run(backend.stats())["entries"] == 2
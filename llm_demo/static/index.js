@@ -68,41 +68,88 @@ async function submitMessage() {
     logMessage("human", msg)
     // Clear message
     $('.chat-bar input').val('');
-    window.setTimeout(() => {
+    const loaderTimer = window.setTimeout(() => {
         $('#loader-container').show();
         $('.chat-content').scrollTop($('.chat-content').prop("scrollHeight"));
     }, 400);
+    // Bubble holding the answer while its tokens arrive
+    let streamId = undefined;
+    let toolTrace = [];
     try {
-        // Prompt LLM
-        let answer = await askQuestion(msg);
-        $('#loader-container').hide();
-        // Add response to UI
-        if (answer.type === "message") {
-            logMessage("ai", answer.content, answer.trace)
-        } else if (answer.type === "confirmation") {
-            const messageId = generateRandomID(10);
-            buildConfirmation(answer.content, messageId)
-        }
+        // Prompt LLM and render its events as they are received
+        await askQuestion(msg, (answer) => {
+            if (answer.type === "token") {
+                window.clearTimeout(loaderTimer);
+                $('#loader-container').hide();
+                if (streamId === undefined) {
+                    streamId = generateRandomID(10);
+                    $('.inner-content').append(buildMessage("ai", "").replace('class="innermsg"', `class="innermsg streaming" id="${streamId}"`));
+                }
+                $(`#${streamId}`).append(document.createTextNode(answer.content));
+                $('.chat-content').scrollTop($('.chat-content').prop("scrollHeight"));
+            } else if (answer.type === "trace") {
+                toolTrace.push(answer.content);
+            } else {
+                window.clearTimeout(loaderTimer);
+                $('#loader-container').hide();
+                if (streamId !== undefined) {
+                    $(`#${streamId}`).closest('.chat-bubble').remove();
+                }
+                // Add response to UI
+                if (answer.type === "message") {
+                    logMessage("ai", answer.content, answer.trace || (toolTrace.length ? toolTrace : null))
+                } else if (answer.type === "confirmation") {
+                    const messageId = generateRandomID(10);
+                    buildConfirmation(answer.content, messageId)
+                } else {
+                    console.error(answer.content)
+                    logMessage("ai", "Sorry, we couldn't answer your question 😢")
+                }
+            }
+        });
     } catch (err) {
+        window.clearTimeout(loaderTimer);
+        $('#loader-container').hide();
         window.alert(`Error when submitting question: ${err}`);
     }
 }
 
-// Send request to backend
-async function askQuestion(prompt) {
-    const response = await fetch('chat', {
+// Send request to backend and pass each server-sent event to onEvent
+async function askQuestion(prompt, onEvent) {
+    const response = await fetch('chat/stream', {
         method: 'POST',
         headers: {
             'Content-Type': 'application/json'
         },
         body: JSON.stringify({ prompt }),
     });
-    if (response.ok) {
-        const text_response = await response.text();
-        return JSON.parse(text_response)
-    } else {
+    if (!response.ok) {
         console.error(await response.text())
-        return { type: "message", content: "Sorry, we couldn't answer your question 😢" }
+        onEvent({ type: "message", content: "Sorry, we couldn't answer your question 😢" })
+        return
+    }
+    const reader = response.body.pipeThrough(new TextDecoderStream()).getReader();
+    let buffer = '';
+    let answered = false;
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) {
+            break;
+        }
+        buffer += value;
+        const events = buffer.split('\n\n');
+        buffer = events.pop();
+        for (const event of events) {
+            if (event.startsWith('data: ')) {
+                const data = JSON.parse(event.slice(6));
+                answered ||= ["message", "confirmation", "error"].includes(data.type);
+                onEvent(data);
+            }
+        }
+    }
+    // A stream cut short by the server or the network still ends the turn
+    if (!answered) {
+        onEvent({ type: "error", content: "Chat stream ended without a response" });
     }
 }
 
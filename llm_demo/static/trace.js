@@ -20,12 +20,23 @@ export function create_trace(toolcalls) {
     const toolcalls_len = toolcalls.length;
     for (let i=0; i < toolcalls_len; i++) {
         let toolcall = toolcalls[i];
-        trace += trace_section_title(toolcall.tool_call_id);
+        let title = toolcall.tool_call_id;
+        if (toolcall.cache) {
+            title += ` (cache ${toolcall.cache})`;
+        }
+        trace += trace_section_title(title);
 
-        trace += trace_header("SQL Executed:");
-        trace += trace_sql(toolcall.sql);
-        trace += trace_header("Results:");
-        trace += trace_results(toolcall.results);
+        if (toolcall.sql) {
+            trace += trace_header("SQL Executed:");
+            trace += trace_sql(toolcall.sql);
+        }
+        if (toolcall.spans) {
+            trace += trace_spans(toolcall.spans);
+        }
+        if (toolcall.results !== undefined) {
+            trace += trace_header("Results:");
+            trace += trace_results(toolcall.results);
+        }
 
         if (i < toolcalls_len-1) {
             trace += '<br>';
@@ -50,6 +61,23 @@ function trace_sql(sql) {
     return '<div class="codeblock">' + sql + '</div>'
 }
 
+// Format span timings into a table indented by nesting depth
+function trace_spans(spans) {
+    let trace_string = '<table border="1"><tr><th>Span</th><th>ms</th></tr>';
+    for (let i=0; i<spans.length; i++) {
+        let span = spans[i];
+        let indent = '&nbsp;&nbsp;'.repeat(span.depth - 1);
+        let name = indent + span.name;
+        if (span.status == "error") {
+            name = '<span class="error">' + name + '</span>';
+        }
+        trace_string += '<tr><td>' + name + '</td><td>' + span.duration_ms + '</td></tr>';
+    }
+    trace_string += '</table>';
+
+    return '<div class="results">' + trace_string + '</div>';
+}
+
 // Format trace results into tables
 function trace_results(res) {
     let results;
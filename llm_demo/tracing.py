@@ -0,0 +1,283 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Copied into both llm_demo and retrieval_service, which deploy from their own
+# directories. The lint workflow fails unless the copies are identical.
+
+import json
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Iterator, Optional
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+# Span exporter: "none" or "file"
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", default="none")
+# JSON lines file written by the "file" exporter
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", default="spans.jsonl")
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-[0-9a-f]{2}$")
+SERVER_TIMING_DURATION_PATTERN = re.compile(r"dur=([0-9.]+)")
+
+
+class Span:
+    """
+    A timed operation within a trace, modelled on OpenTelemetry spans. The
+    first span of a trace in this process is its local root and keeps every
+    span that finishes under it, so a request can report its own timings.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        kind: str = "internal",
+        parent: Optional["Span"] = None,
+        remote_parent: Optional[tuple[str, str]] = None,
+        attributes: Optional[dict[str, Any]] = None,
+    ):
+        self.name = name
+        self.kind = kind
+        self.span_id = secrets.token_hex(8)
+        self.trace_id: str
+        self.parent_id: Optional[str]
+        if parent is not None:
+            self.trace_id, self.parent_id = parent.trace_id, parent.span_id
+            self.root: Span = parent.root
+        else:
+            self.trace_id, self.parent_id = remote_parent or (
+                secrets.token_hex(16),
+                None,
+            )
+            self.root = self
+        self.attributes = dict(attributes or {})
+        self.status = "ok"
+        self.finished: list[Span] = []
+        self.start_time = time.time()
+        self.end_time: Optional[float] = None
+        self._start = time.perf_counter()
+        self.duration = 0.0
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def record_error(self, err: BaseException):
+        self.status = "error"
+        self.attributes["error.type"] = type(err).__name__
+        self.attributes["error.message"] = str(err)
+
+    def end(self):
+        if self.end_time is not None:
+            return
+        self.duration = time.perf_counter() - self._start
+        self.end_time = self.start_time + self.duration
+        if self.root is not self:
+            self.root.finished.append(self)
+        if _exporter is not None:
+            _exporter.export(self)
+
+    @property
+    def traceparent(self) -> str:
+        """W3C trace context header value that makes this span the parent."""
+        return f"00-{self.trace_id}-{self.span_id}-01"
+
+    def to_dict(self) -> dict[str, Any]:
+        """The span in the field names of OTLP JSON."""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": int(self.start_time * 1e9),
+            "endTimeUnixNano": int((self.end_time or self.start_time) * 1e9),
+            "attributes": self.attributes,
+            "status": self.status,
+        }
+
+
+class FileSpanExporter:
+    """Appends finished spans as JSON lines from a background thread."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span):
+        self._queue.put(span.to_dict())
+
+    def shutdown(self):
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        with open(self.path, "a", encoding="utf-8") as f:
+            while True:
+                batch = [self._queue.get()]
+                while not self._queue.empty():
+                    batch.append(self._queue.get())
+                for span in batch:
+                    if span is None:
+                        return
+                    f.write(json.dumps(span, default=str) + "\n")
+                f.flush()
+
+
+def create_exporter(kind: str = TRACE_EXPORTER) -> Optional[FileSpanExporter]:
+    if kind == "none":
+        return None
+    if kind == "file":
+        return FileSpanExporter(TRACE_EXPORT_PATH)
+    raise TypeError(f"No span exporter of kind {kind}")
+
+
+_exporter = create_exporter()
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def set_exporter(exporter: Optional[FileSpanExporter]):
+    global _exporter
+    _exporter = exporter
+
+
+def shutdown():
+    """Write out the spans still queued by the exporter."""
+    if _exporter is not None:
+        _exporter.shutdown()
+        set_exporter(None)
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, kind: str = "internal", **attributes) -> Span:
+    """Start a child of the current span without making it current."""
+    return Span(name, kind, parent=current_span(), attributes=attributes)
+
+
+@contextmanager
+def span(name: str, kind: str = "internal", **attributes) -> Iterator[Span]:
+    """Run the block in a new child of the current span."""
+    with use_span(start_span(name, kind, **attributes)) as s:
+        yield s
+
+
+@contextmanager
+def use_span(s: Span) -> Iterator[Span]:
+    """Make `s` the current span for the block, then end it."""
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as err:
+        s.record_error(err)
+        raise
+    finally:
+        _current_span.reset(token)
+        s.end()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[tuple[str, str]]:
+    """Return the trace id and parent span id of a traceparent header."""
+    match = TRACEPARENT_PATTERN.match(value or "")
+    return (match.group(1), match.group(2)) if match else None
+
+
+def parse_server_timing(value: Optional[str]) -> list[tuple[str, float]]:
+    """Return the name and milliseconds of each metric of a Server-Timing header."""
+    metrics = []
+    for metric in (value or "").split(","):
+        name, _, params = metric.strip().partition(";")
+        match = SERVER_TIMING_DURATION_PATTERN.search(params)
+        if name and match:
+            metrics.append((name, float(match.group(1))))
+    return metrics
+
+
+def span_timings(root: Span) -> list[dict[str, Any]]:
+    """
+    Spans finished under `root`, in start order, with their depth in the tree.
+    Stages a server reported in the Server-Timing header of an HTTP client
+    span are listed under it.
+    """
+    depths = {root.span_id: 0}
+    timings = []
+    for s in sorted(root.finished, key=lambda s: s._start):
+        depth = depths.get(s.parent_id or "", 0) + 1
+        depths[s.span_id] = depth
+        timings.append(
+            {
+                "name": s.name,
+                "depth": depth,
+                "duration_ms": round(s.duration * 1000, 2),
+                "status": s.status,
+            }
+        )
+        server_timing = s.attributes.get("http.server_timing")
+        for name, duration_ms in parse_server_timing(server_timing):
+            timings.append(
+                {
+                    "name": name,
+                    "depth": depth + 1,
+                    "duration_ms": duration_ms,
+                    "status": "ok",
+                }
+            )
+    return timings
+
+
+class TracingMiddleware:
+    """
+    Runs every HTTP request in a server span, continuing the trace of an
+    incoming traceparent header. The span is named after the route template.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        remote_parent = parse_traceparent(
+            headers.get(b"traceparent", b"").decode("latin-1")
+        )
+        s = Span(
+            f"{scope['method']} {scope['path']}",
+            kind="server",
+            remote_parent=remote_parent,
+            attributes={"http.method": scope["method"], "http.target": scope["path"]},
+        )
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                route = getattr(scope.get("route"), "path", None)
+                if route:
+                    s.name = f"{scope['method']} {route}"
+                s.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    s.status = "error"
+            await send(message)
+
+        with use_span(s):
+            await self.app(scope, receive, send_wrapper)
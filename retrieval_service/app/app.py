@@ -12,17 +12,20 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import os
 from contextlib import asynccontextmanager
 from ipaddress import IPv4Address, IPv6Address
 from typing import Optional
 
 import yaml
 from fastapi import FastAPI
-from langchain_google_vertexai import VertexAIEmbeddings
 from pydantic import BaseModel
 
 import datastore
+from metrics import InstrumentedClient, MetricsMiddleware, tracing
 
+from .embeddings import create_embeddings
+from .id_token_verifier import IdTokenVerifier
 from .routes import routes
 
 EMBEDDING_MODEL_NAME = "text-embedding-005"
@@ -33,6 +36,10 @@ class AppConfig(BaseModel):
     port: int = 8080
     datastore: datastore.Config
     clientId: Optional[str] = None
+    # Send per-stage timings in a Server-Timing response header
+    serverTiming: bool = False
+    # Embedding service: "vertexai", or "hashing" to run without network access
+    embeddings: str = os.getenv("EMBEDDINGS", default="vertexai")
 
 
 def parse_config(path: str) -> AppConfig:
@@ -44,10 +51,13 @@ def parse_config(path: str) -> AppConfig:
 # gen_init is a wrapper to initialize the datastore during app startup
 def gen_init(cfg: AppConfig):
     async def initialize_datastore(app: FastAPI):
-        app.state.datastore = await datastore.create(cfg.datastore)
-        app.state.embed_service = VertexAIEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+        app.state.datastore = InstrumentedClient(await datastore.create(cfg.datastore))
+        app.state.embed_service = create_embeddings(
+            cfg.embeddings, EMBEDDING_MODEL_NAME
+        )
         yield
         await app.state.datastore.close()
+        tracing.shutdown()
 
     return asynccontextmanager(initialize_datastore)
 
@@ -55,5 +65,9 @@ def gen_init(cfg: AppConfig):
 def init_app(cfg: AppConfig) -> FastAPI:
     app = FastAPI(lifespan=gen_init(cfg))
     app.state.client_id = cfg.clientId
+    app.state.id_token_verifier = IdTokenVerifier(cfg.clientId)
     app.include_router(routes)
+    app.add_middleware(MetricsMiddleware, server_timing=cfg.serverTiming)
+    # Continues the trace of the llm_demo request that called this service
+    app.add_middleware(tracing.TracingMiddleware)
     return app
@@ -0,0 +1,69 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import hashlib
+import math
+import re
+
+from langchain_core.embeddings import Embeddings
+
+# Dimensions of the embeddings stored by every datastore
+EMBEDDING_DIMENSIONS = 768
+
+WORD_PATTERN = re.compile(r"\w+")
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Deterministic stand-in for VertexAIEmbeddings, to load test the service
+    without network access. Every word and pair of adjacent words is hashed
+    to a dimension and a sign, so texts that share words get similar
+    vectors. A text always gets the same unit vector, in every process.
+    """
+
+    def __init__(self, dimensions: int = EMBEDDING_DIMENSIONS):
+        self.dimensions = dimensions
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        words = WORD_PATTERN.findall(text.lower())
+        features = words + [f"{a} {b}" for a, b in zip(words, words[1:])] or [text]
+        vector = [0.0] * self.dimensions
+        for feature in features:
+            digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+            value = int.from_bytes(digest, "little")
+            vector[value % self.dimensions] += -1.0 if value >> 63 else 1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    async def aembed_documents(self, texts: list[str]) -> list[list[float]]:
+        # Cheap enough to skip the executor of the default implementation
+        return self.embed_documents(texts)
+
+    async def aembed_query(self, text: str) -> list[float]:
+        return self.embed_query(text)
+
+
+def create_embeddings(kind: str, model_name: str) -> Embeddings:
+    """Create the embedding service of a kind, "vertexai" or "hashing"."""
+    if kind == "vertexai":
+        # Imported here, offline runs never load the Vertex AI SDK
+        from langchain_google_vertexai import VertexAIEmbeddings
+
+        return VertexAIEmbeddings(model_name=model_name)
+    if kind == "hashing":
+        return HashingEmbeddings()
+    raise TypeError(f"No embeddings of kind {kind}")
@@ -0,0 +1,89 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import pytest
+from fastapi.testclient import TestClient
+
+from datastore.providers import memory
+
+from .app import AppConfig, init_app
+from .embeddings import HashingEmbeddings, create_embeddings
+
+
+def cosine(a: list[float], b: list[float]) -> float:
+    return sum(x * y for x, y in zip(a, b))
+
+
+def test_hashing_embeddings_are_stable_unit_vectors():
+    text = "Where can I find coffee near gate A5?"
+    vector = HashingEmbeddings().embed_query(text)
+    assert len(vector) == 768
+    assert cosine(vector, vector) == pytest.approx(1.0)
+    assert HashingEmbeddings().embed_query(text) == vector
+    assert len(HashingEmbeddings().embed_query("")) == 768
+
+
+def test_hashing_embeddings_keep_shared_words_close():
+    embeddings = HashingEmbeddings()
+    query, similar, other = embeddings.embed_documents(
+        [
+            "coffee near gate A5",
+            "is there coffee near gate A5",
+            "baggage allowance for economy flights",
+        ]
+    )
+    assert cosine(query, similar) > 0.5
+    assert cosine(query, similar) > cosine(query, other)
+
+
+@pytest.mark.asyncio
+async def test_create_embeddings():
+    embeddings = create_embeddings("hashing", "unused")
+    assert await embeddings.aembed_query("gate") == embeddings.embed_query("gate")
+    with pytest.raises(TypeError):
+        create_embeddings("unknown", "unused")
+
+
+def test_app_serves_routes_offline():
+    cfg = AppConfig(datastore=memory.Config(kind="memory"), embeddings="hashing")
+    app = init_app(cfg)
+    with TestClient(app) as client:
+        ds, embeddings = app.state.datastore, app.state.embed_service
+        services, kursus_list, faqs = client.portal.call(
+            ds.load_dataset,
+            "../data/service_dummy.csv",
+            "../data/kursus_dummy.csv",
+            "../data/faq_dummy.csv",
+        )
+        # The CSV files carry no embeddings, embed the text each route searches
+        for s in services:
+            s.embedding = embeddings.embed_query(s.title)
+        for k in kursus_list:
+            k.embedding = embeddings.embed_query(k.course_name)
+        for f in faqs:
+            f.embedding = embeddings.embed_query(f.title)
+        client.portal.call(ds.initialize_data, services, kursus_list, faqs)
+
+        for path, query in (
+            ("services", services[0].title),
+            ("courses", kursus_list[0].course_name),
+            ("faqs", faqs[0].title),
+        ):
+            response = client.get(f"/{path}", params={"id": 1})
+            assert response.status_code == 200
+            assert response.json()["results"]["id"] == 1
+
+            response = client.get(f"/{path}/search", params={"query": query})
+            assert response.status_code == 200
+            assert response.json()["results"][0]["id"] == 1
@@ -0,0 +1,141 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+# Copied into both llm_demo and retrieval_service, which deploy from their own
+# directories. The lint workflow fails unless the copies are identical.
+
+import asyncio
+import json
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Mapping, Optional
+
+from google.auth import exceptions, jwt  # type:ignore
+from google.auth.transport import requests  # type:ignore
+
+GOOGLE_OAUTH2_CERTS_URL = "https://www.googleapis.com/oauth2/v1/certs"
+GOOGLE_ISSUERS = ("accounts.google.com", "https://accounts.google.com")
+# Seconds signing keys are kept when the response sets no max-age
+CERTS_DEFAULT_MAX_AGE = 3600
+# Seconds between fetches forced by tokens naming an unknown key
+CERTS_MIN_REFRESH_INTERVAL = 60
+# Verified tokens remembered until they expire
+VERIFIED_TOKENS_MAX_ENTRIES = int(
+    os.getenv("VERIFIED_TOKENS_MAX_ENTRIES", default=1000)
+)
+
+MAX_AGE_PATTERN = re.compile(r"max-age=(\d+)")
+
+Claims = Mapping[str, Any]
+
+
+class IdTokenVerifier:
+    """
+    Verifies Google-signed ID tokens like `id_token.verify_oauth2_token`, but
+    without an HTTP round trip per call.
+
+    Google's signing keys are fetched at most once per Cache-Control max-age,
+    or again when a token names a key that is not cached yet. Fetching and
+    signature checks run in a worker thread. Tokens that verified are
+    remembered with their claims until their `exp`. Both `iat` and `exp` are
+    checked against `clock`.
+    """
+
+    def __init__(
+        self,
+        audience: Optional[str],
+        certs_url: str = GOOGLE_OAUTH2_CERTS_URL,
+        max_entries: int = VERIFIED_TOKENS_MAX_ENTRIES,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.audience = audience
+        self.certs_url = certs_url
+        self.max_entries = max_entries
+        self._clock = clock
+        # Reuses one HTTP session for all certificate fetches
+        self._request = requests.Request()
+        self._certs: Mapping[str, str] = {}
+        self._certs_expire_at = 0.0
+        self._certs_fetched_at = float("-inf")
+        self._certs_fetch: Optional[asyncio.Task] = None
+        self._verified: OrderedDict[str, Claims] = OrderedDict()
+
+    async def verify(self, token: str) -> Claims:
+        """Return the claims of a valid token. Raises like verify_oauth2_token."""
+        claims = self._verified.get(token)
+        if claims is not None:
+            if claims["exp"] >= self._clock():
+                self._verified.move_to_end(token)
+                return claims
+            del self._verified[token]
+
+        certs = await self.get_certs()
+        key_id = jwt.decode_header(token).get("kid")
+        if (
+            key_id is not None
+            and key_id not in certs
+            and self._clock() - self._certs_fetched_at > CERTS_MIN_REFRESH_INTERVAL
+        ):
+            # Google may have rotated its keys since they were cached
+            certs = await self.get_certs(refresh=True)
+        claims = await asyncio.to_thread(self._decode, token, certs)
+
+        self._verified[token] = claims
+        while len(self._verified) > self.max_entries:
+            self._verified.popitem(last=False)
+        return claims
+
+    async def get_certs(self, refresh: bool = False) -> Mapping[str, str]:
+        if not refresh and self._clock() < self._certs_expire_at:
+            return self._certs
+        # Concurrent requests share a single fetch
+        if self._certs_fetch is None or self._certs_fetch.done():
+            self._certs_fetch = asyncio.create_task(asyncio.to_thread(self._fetch))
+        self._certs, max_age = await asyncio.shield(self._certs_fetch)
+        self._certs_fetched_at = self._clock()
+        self._certs_expire_at = self._certs_fetched_at + max_age
+        return self._certs
+
+    def _fetch(self) -> tuple[Mapping[str, str], float]:
+        response = self._request(self.certs_url, method="GET")
+        if response.status != 200:
+            raise exceptions.TransportError(
+                f"Could not fetch certificates at {self.certs_url}"
+            )
+        match = MAX_AGE_PATTERN.search(response.headers.get("cache-control", ""))
+        max_age = int(match.group(1)) if match else CERTS_DEFAULT_MAX_AGE
+        return json.loads(response.data.decode("utf-8")), max_age
+
+    def _decode(self, token: str, certs: Mapping[str, str]) -> Claims:
+        now = self._clock()
+        # jwt.decode checks iat and exp against the wall clock, allow for its
+        # difference to our clock and check them against ours below
+        skew = math.ceil(abs(time.time() - now))
+        claims = jwt.decode(
+            token, certs=certs, audience=self.audience, clock_skew_in_seconds=skew
+        )
+        if now < claims["iat"]:
+            raise exceptions.InvalidValue(
+                f"Token used too early, {now} < {claims['iat']}"
+            )
+        if claims["exp"] < now:
+            raise exceptions.InvalidValue(f"Token expired, {claims['exp']} < {now}")
+        if claims["iss"] not in GOOGLE_ISSUERS:
+            raise exceptions.GoogleAuthError(
+                f"Wrong issuer. 'iss' should be one of the following: {GOOGLE_ISSUERS}"
+            )
+        return claims
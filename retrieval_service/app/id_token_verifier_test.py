@@ -0,0 +1,154 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import json
+from unittest.mock import MagicMock
+
+import pytest
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from google.auth import crypt, exceptions, jwt
+
+from .id_token_verifier import IdTokenVerifier
+
+AUDIENCE = "fake client id"
+NOW = 1_700_000_000
+
+
+def generate_key(key_id: str) -> tuple[crypt.RSASigner, str]:
+    private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    pem = private_key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption(),
+    )
+    public_pem = private_key.public_key().public_bytes(
+        serialization.Encoding.PEM,
+        serialization.PublicFormat.SubjectPublicKeyInfo,
+    )
+    return crypt.RSASigner.from_string(pem, key_id), public_pem.decode()
+
+
+def make_token(signer: crypt.RSASigner, **claims) -> str:
+    payload = {
+        "iss": "https://accounts.google.com",
+        "aud": AUDIENCE,
+        "sub": "123",
+        "iat": NOW,
+        "exp": NOW + 3600,
+        **claims,
+    }
+    return jwt.encode(signer, payload).decode()
+
+
+class Clock:
+    def __init__(self):
+        self.now = float(NOW)
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock():
+    # Far from the wall clock, which the verifier must not consult
+    return Clock()
+
+
+@pytest.fixture
+def keys():
+    return dict(generate_key(key_id) for key_id in ("key-1", "key-2"))
+
+
+def make_verifier(clock, certs, max_age="public, max-age=600"):
+    verifier = IdTokenVerifier(AUDIENCE, clock=clock)
+    response = MagicMock(status=200, headers={"cache-control": max_age})
+    response.data = json.dumps(certs).encode()
+    verifier._request = MagicMock(return_value=response)
+    return verifier
+
+
+@pytest.mark.asyncio
+async def test_verify_caches_certs_and_tokens(clock, keys):
+    signer, public_key = next(iter(keys.items()))
+    verifier = make_verifier(clock, {signer.key_id: public_key})
+    token = make_token(signer)
+
+    claims = await verifier.verify(token)
+    assert claims["sub"] == "123"
+    assert await verifier.verify(token) is claims
+    await verifier.verify(make_token(signer, sub="456"))
+    assert verifier._request.call_count == 1
+
+    # Certificates are fetched again once max-age has passed
+    clock.now += 601
+    await verifier.verify(make_token(signer, sub="789"))
+    assert verifier._request.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_verify_forgets_expired_tokens(clock, keys):
+    signer, public_key = next(iter(keys.items()))
+    verifier = make_verifier(clock, {signer.key_id: public_key})
+    token = make_token(signer, exp=NOW + 10)
+    await verifier.verify(token)
+
+    clock.now += 11
+    with pytest.raises(ValueError):
+        await verifier.verify(token)
+    assert token not in verifier._verified
+
+
+@pytest.mark.asyncio
+async def test_verify_rejects_bad_tokens(clock, keys):
+    (signer, public_key), (other_signer, _) = keys.items()
+    verifier = make_verifier(clock, {signer.key_id: public_key})
+
+    with pytest.raises(ValueError):
+        await verifier.verify(make_token(signer, aud="another client"))
+    with pytest.raises(exceptions.GoogleAuthError):
+        await verifier.verify(make_token(signer, iss="https://example.com"))
+    with pytest.raises(ValueError):
+        await verifier.verify(make_token(other_signer))
+    assert not verifier._verified
+
+
+@pytest.mark.asyncio
+async def test_verify_refetches_certs_for_unknown_key(clock, keys):
+    (signer, public_key), (new_signer, new_public_key) = keys.items()
+    verifier = make_verifier(clock, {signer.key_id: public_key})
+    await verifier.verify(make_token(signer))
+
+    # Google rotates its keys, the next fetch returns the new one
+    clock.now += 61
+    verifier._request.return_value.data = json.dumps(
+        {new_signer.key_id: new_public_key}
+    ).encode()
+    claims = await verifier.verify(make_token(new_signer))
+    assert claims["sub"] == "123"
+    assert verifier._request.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_verify_checks_times_against_clock(clock, keys):
+    signer, public_key = next(iter(keys.items()))
+    verifier = make_verifier(clock, {signer.key_id: public_key})
+
+    with pytest.raises(ValueError, match="too early"):
+        await verifier.verify(make_token(signer, iat=NOW + 10))
+    with pytest.raises(ValueError, match="expired"):
+        await verifier.verify(make_token(signer, exp=NOW - 1))
+    token = make_token(signer, exp=NOW)
+    assert (await verifier.verify(token))["exp"] == NOW
+    assert await verifier.verify(token) is verifier._verified[token]
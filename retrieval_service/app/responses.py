@@ -0,0 +1,83 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Callable, Coroutine, Generic, Optional, TypeVar
+
+import msgpack  # type:ignore
+from fastapi import responses
+from fastapi.routing import APIRoute
+from pydantic import BaseModel
+from starlette.requests import Request
+from starlette.responses import Response
+
+import models
+from metrics import stage
+
+MSGPACK_MEDIA_TYPE = "application/msgpack"
+
+T = TypeVar("T")
+
+
+class ServiceResult(models.Service):
+    embedding: Optional[list[float]] = None
+
+
+class KursusResult(models.Kursus):
+    embedding: Optional[list[float]] = None
+
+
+class FaqResult(models.Faq):
+    embedding: Optional[list[float]] = None
+
+
+class Results(BaseModel, Generic[T]):
+    results: T
+    sql: Optional[str] = None
+
+
+class ORJSONResponse(responses.ORJSONResponse):
+    def render(self, content: Any) -> bytes:
+        with stage("serialize"):
+            return super().render(content)
+
+
+class MsgpackResponse(Response):
+    media_type = MSGPACK_MEDIA_TYPE
+
+    def render(self, content: Any) -> bytes:
+        with stage("serialize"):
+            return msgpack.packb(content)
+
+
+class NegotiatedRoute(APIRoute):
+    """
+    Route that serializes its response model with orjson, or with msgpack
+    when the client accepts it. Both skip `jsonable_encoder`: the response
+    model is dumped by pydantic and the result encoded in one call.
+    """
+
+    def get_route_handler(self) -> Callable[[Request], Coroutine[Any, Any, Response]]:
+        json_handler = super().get_route_handler()
+        response_class, self.response_class = self.response_class, MsgpackResponse
+        try:
+            msgpack_handler = super().get_route_handler()
+        finally:
+            self.response_class = response_class
+
+        async def handler(request: Request) -> Response:
+            if MSGPACK_MEDIA_TYPE in request.headers.get("accept", ""):
+                return await msgpack_handler(request)
+            return await json_handler(request)
+
+        return handler
@@ -0,0 +1,112 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+from typing import Any
+
+import msgpack  # type: ignore
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import datastore
+from datastore.models import Faq, Kursus, Service
+from datastore.providers import memory
+
+from .embeddings import HashingEmbeddings
+from .routes import routes
+
+SERVICE: dict[str, Any] = {
+    "id": 1,
+    "category": "Terjemahan",
+    "title": "Terjemah Ijazah",
+    "description": "Penerjemahan ijazah dari/ke Bahasa Indonesia, Arab, atau Inggris.",
+    "price": 75000,
+}
+KURSUS: dict[str, Any] = {
+    "id": 1,
+    "course_name": "Kursus Bahasa Inggris Dasar",
+    "level": "Dasar",
+    "description": "Pengenalan grammar dasar.",
+    "price": 500000,
+    "start_date": "6/1/2025",
+    "end_date": "7/15/2025",
+}
+FAQ: dict[str, Any] = {
+    "id": 1,
+    "category": "Pendaftaran",
+    "title": "Bagaimana cara mendaftar kursus?",
+    "description": "Isi formulir online dan lakukan pembayaran.",
+}
+
+
+async def seeded_datastore(embeddings: HashingEmbeddings) -> datastore.Client:
+    ds = await datastore.create(memory.Config(kind="memory"))
+    # Each row is embedded from a query the tests search for
+    await ds.initialize_data(
+        [Service(**SERVICE, embedding=embeddings.embed_query("Terjemah Ijazah"))],
+        [Kursus(**KURSUS, embedding=embeddings.embed_query("Kursus Inggris"))],
+        [Faq(**FAQ, embedding=embeddings.embed_query("mendaftar kursus"))],
+    )
+    return ds
+
+
+def make_client() -> TestClient:
+    embeddings = HashingEmbeddings()
+    app = FastAPI()
+    app.state.datastore = asyncio.run(seeded_datastore(embeddings))
+    app.state.embed_service = embeddings
+    app.include_router(routes)
+    return TestClient(app)
+
+
+def test_search_returns_json_without_embedding():
+    client = make_client()
+    response = client.get("/services/search", params={"query": "Terjemah Ijazah"})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/json"
+    assert response.json() == {"results": [SERVICE], "sql": None}
+
+    response = client.get(
+        "/services/search",
+        params={"query": "Terjemah Ijazah", "include_embedding": True},
+    )
+    assert len(response.json()["results"][0]["embedding"]) == 768
+
+
+def test_search_returns_msgpack_when_accepted():
+    response = make_client().get(
+        "/courses/search",
+        params={"query": "Kursus Inggris"},
+        headers={"Accept": "application/msgpack"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/msgpack"
+    result = msgpack.unpackb(response.content)["results"][0]
+    assert result == KURSUS
+
+
+def test_lookup_returns_one_result_or_null():
+    client = make_client()
+    response = client.get("/faqs", params={"id": 1})
+    assert response.status_code == 200
+    assert response.json()["results"] == FAQ
+
+    response = client.get(
+        "/faqs", params={"id": 1}, headers={"Accept": "application/msgpack"}
+    )
+    assert msgpack.unpackb(response.content)["results"] == FAQ
+
+    response = client.get("/faqs", params={"id": 2})
+    assert response.status_code == 200
+    assert response.json()["results"] is None
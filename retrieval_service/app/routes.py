@@ -14,14 +14,23 @@
 
 from typing import Any, Mapping, Optional
 
-from fastapi import APIRouter, HTTPException, Request
-from google.auth.transport import requests  # type:ignore
-from google.oauth2 import id_token  # type:ignore
+from fastapi import APIRouter, Request, Response
 from langchain_core.embeddings import Embeddings
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 
 import datastore
+from metrics import set_pool_status, stage
 
-routes = APIRouter()
+from .responses import (
+    FaqResult,
+    KursusResult,
+    NegotiatedRoute,
+    ORJSONResponse,
+    Results,
+    ServiceResult,
+)
+
+routes = APIRouter(route_class=NegotiatedRoute, default_response_class=ORJSONResponse)
 
 
 def _ParseUserIdToken(headers: Mapping[str, Any]) -> Optional[str]:
@@ -42,9 +51,7 @@ async def get_user_info(request):
     headers = request.headers
     token = _ParseUserIdToken(headers)
     try:
-        id_info = id_token.verify_oauth2_token(
-            token, requests.Request(), audience=request.app.state.client_id
-        )
+        id_info = await request.app.state.id_token_verifier.verify(token)
 
         return {
             "user_id": id_info.get("sub"),
@@ -61,103 +68,121 @@ async def root():
     return {"message": "Hello World"}
 
 
+@routes.get("/metrics", include_in_schema=False)
+async def metrics(request: Request):
+    set_pool_status(request.app.state.datastore.pool_status())
+    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 # Endpoint untuk mengambil data layanan berdasarkan id
-@routes.get("/services")
+@routes.get(
+    "/services",
+    response_model=Results[Optional[ServiceResult]],
+    response_model_exclude_unset=True,
+)
 async def get_service(
     request: Request,
-    id: Optional[int] = None,
-    category: Optional[str] = None,
+    id: int,
+    include_embedding: bool = False,
 ):
     ds: datastore.Client = request.app.state.datastore
-    if id:
-        results, sql = await ds.get_service_by_id(id)
-    elif category:
-        results, sql = await ds.get_service_by_category(category)
-    else:
-        raise HTTPException(
-            status_code=422,
-            detail="Request requires query params: service id or category",
-        )
+    results, sql = await ds.get_service_by_id(id, include_embedding=include_embedding)
     return {"results": results, "sql": sql}
 
 
 # Endpoint pencarian layanan berbasis embedding
-@routes.get("/services/search")
+@routes.get(
+    "/services/search",
+    response_model=Results[list[ServiceResult]],
+    response_model_exclude_unset=True,
+)
 async def search_services(
     request: Request,
     query: str,
     top_k: int = 5,
+    include_embedding: bool = False,
 ):
     ds: datastore.Client = request.app.state.datastore
     embed_service: Embeddings = request.app.state.embed_service
-    query_embedding = embed_service.embed_query(query)
-    results, sql = await ds.services_search(query_embedding, 0.5, top_k)
+    with stage("embed"):
+        query_embedding = embed_service.embed_query(query)
+    results, sql = await ds.search_services(
+        query_embedding, 0.5, top_k, include_embedding=include_embedding
+    )
     return {"results": results, "sql": sql}
 
 
 # Endpoint untuk mengambil data kursus berdasarkan id
-@routes.get("/courses")
+@routes.get(
+    "/courses",
+    response_model=Results[Optional[KursusResult]],
+    response_model_exclude_unset=True,
+)
 async def get_course(
     request: Request,
-    id: Optional[int] = None,
-    level: Optional[str] = None,
+    id: int,
+    include_embedding: bool = False,
 ):
     ds: datastore.Client = request.app.state.datastore
-    if id:
-        results, sql = await ds.get_course_by_id(id)
-    elif level:
-        results, sql = await ds.get_course_by_level(level)
-    else:
-        raise HTTPException(
-            status_code=422,
-            detail="Request requires query params: course id or level",
-        )
+    results, sql = await ds.get_kursus_by_id(id, include_embedding=include_embedding)
     return {"results": results, "sql": sql}
 
 
 # Endpoint pencarian kursus berbasis embedding
-@routes.get("/courses/search")
+@routes.get(
+    "/courses/search",
+    response_model=Results[list[KursusResult]],
+    response_model_exclude_unset=True,
+)
 async def search_courses(
     request: Request,
     query: str,
     top_k: int = 5,
+    include_embedding: bool = False,
 ):
     ds: datastore.Client = request.app.state.datastore
     embed_service: Embeddings = request.app.state.embed_service
-    query_embedding = embed_service.embed_query(query)
-    results, sql = await ds.courses_search(query_embedding, 0.5, top_k)
+    with stage("embed"):
+        query_embedding = embed_service.embed_query(query)
+    results, sql = await ds.search_kursus(
+        query_embedding, 0.5, top_k, include_embedding=include_embedding
+    )
     return {"results": results, "sql": sql}
 
 
-# Endpoint untuk mengambil FAQ berdasarkan id/kategori
-@routes.get("/faqs")
+# Endpoint untuk mengambil FAQ berdasarkan id
+@routes.get(
+    "/faqs",
+    response_model=Results[Optional[FaqResult]],
+    response_model_exclude_unset=True,
+)
 async def get_faq(
     request: Request,
-    id: Optional[int] = None,
-    category: Optional[str] = None,
+    id: int,
+    include_embedding: bool = False,
 ):
     ds: datastore.Client = request.app.state.datastore
-    if id:
-        results, sql = await ds.get_faq_by_id(id)
-    elif category:
-        results, sql = await ds.get_faq_by_category(category)
-    else:
-        raise HTTPException(
-            status_code=422,
-            detail="Request requires query params: faq id or category",
-        )
+    results, sql = await ds.get_faq_by_id(id, include_embedding=include_embedding)
     return {"results": results, "sql": sql}
 
 
 # Endpoint pencarian FAQ berbasis embedding
-@routes.get("/faqs/search")
+@routes.get(
+    "/faqs/search",
+    response_model=Results[list[FaqResult]],
+    response_model_exclude_unset=True,
+)
 async def search_faqs(
     request: Request,
     query: str,
     top_k: int = 5,
+    include_embedding: bool = False,
 ):
     ds: datastore.Client = request.app.state.datastore
     embed_service: Embeddings = request.app.state.embed_service
-    query_embedding = embed_service.embed_query(query)
-    results, sql = await ds.faqs_search(query_embedding, 0.5, top_k)
+    with stage("embed"):
+        query_embedding = embed_service.embed_query(query)
+    results, sql = await ds.search_faqs(
+        query_embedding, 0.5, top_k, include_embedding=include_embedding
+    )
     return {"results": results, "sql": sql}
@@ -12,19 +12,28 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Union
+from typing import Annotated, Any
+
+from pydantic import PlainValidator
 
 from . import providers
-from .datastore import Client, create
-
-Config = Union[
-    providers.firestore.Config,
-    providers.postgres.Config,
-    providers.cloudsql_postgres.Config,
-    providers.spanner_gsql.Config,
-    providers.spanner_postgres.Config,
-    providers.alloydb.Config,
-    providers.cloudsql_mysql.Config,
-]
-
-__ALL__ = [Client, Config, create, providers]
+from .datastore import AbstractConfig, Client, VectorIndex, create
+
+
+def parse_config(value: Any) -> AbstractConfig:
+    """Validate a datastore config with the Config model of its provider."""
+    if isinstance(value, AbstractConfig):
+        return value
+    if not isinstance(value, dict) or "kind" not in value:
+        raise ValueError("datastore config needs a 'kind'")
+    try:
+        provider = providers.load(value["kind"])
+    except TypeError as err:
+        raise ValueError(str(err)) from err
+    return provider.Config.model_validate(value)
+
+
+# Any provider's Config. Validation imports only the provider being configured.
+Config = Annotated[AbstractConfig, PlainValidator(parse_config)]
+
+__ALL__ = [Client, Config, VectorIndex, create, providers]
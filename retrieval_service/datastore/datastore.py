@@ -14,12 +14,14 @@
 
 import csv
 from abc import ABC, abstractmethod
-from typing import Any, Generic, List, Optional, TypeVar
+from typing import Any, Generic, List, Literal, Optional, TypeVar
 
-from .models import Faq, Kursus, Service
+from pydantic import BaseModel
 
 import models
 
+from .models import FAQ_COLUMNS, KURSUS_COLUMNS, SERVICE_COLUMNS, Faq, Kursus, Service
+
 
 class AbstractConfig(ABC):
     kind: str
@@ -28,6 +30,22 @@ class AbstractConfig(ABC):
 C = TypeVar("C", bound=AbstractConfig)
 
 
+class VectorIndex(BaseModel):
+    """
+    Approximate nearest neighbour index over the embeddings of each table,
+    with the parameter names of pgvector. `m`, `ef_construction` and `lists`
+    apply when the index is built. `ef_search` and `probes` apply to every
+    search and can be changed between searches.
+    """
+
+    method: Literal["hnsw", "ivfflat"]
+    m: int = 16
+    ef_construction: int = 64
+    ef_search: int = 40
+    lists: int = 100
+    probes: int = 1
+
+
 class classproperty:
     def __init__(self, func):
         self.fget = func
@@ -75,42 +93,16 @@ class Client(ABC, Generic[C]):
         kursus_new_path,
         faqs_new_path,
     ) -> None:
-        with open(services_new_path, "w") as f:
-            col_names = [
-                "id",
-                "name",
-                "description",
-                "category",
-                "hour",
-                "content",
-                "embedding",
-            ]
-            writer = csv.DictWriter(f, col_names, delimiter=",")
-            writer.writeheader()
-            for a in services:
-                writer.writerow(a.model_dump())
-
-        with open(kursus_new_path, "w") as f:
-            col_names = [
-                "id",
-                "name",
-                "description",
-                "duration",
-                "price",
-                "content",
-                "embedding",
-            ]
-            writer = csv.DictWriter(f, col_names, delimiter=",")
-            writer.writeheader()
-            for a in kursus_list:
-                writer.writerow(a.model_dump())
-
-        with open(faqs_new_path, "w") as f:
-            col_names = ["id", "question", "answer", "embedding"]
-            writer = csv.DictWriter(f, col_names, delimiter=",")
-            writer.writeheader()
-            for a in faqs:
-                writer.writerow(a.model_dump())
+        for path, col_names, items in (
+            (services_new_path, SERVICE_COLUMNS, services),
+            (kursus_new_path, KURSUS_COLUMNS, kursus_list),
+            (faqs_new_path, FAQ_COLUMNS, faqs),
+        ):
+            with open(path, "w") as f:
+                writer = csv.DictWriter(f, col_names, delimiter=",")
+                writer.writeheader()
+                for a in items:
+                    writer.writerow(a.model_dump())
 
     @abstractmethod
     async def initialize_data(
@@ -127,51 +119,69 @@ class Client(ABC, Generic[C]):
     ) -> tuple[list[Service], list[Kursus], list[Faq]]:
         pass
 
+    # Lookups and searches return display fields only. Pass include_embedding
+    # to also read each row's embedding, e.g. to export or re-rank results.
+
     @abstractmethod
     async def get_service_by_id(
-        self, id: int
+        self, id: int, include_embedding: bool = False
     ) -> tuple[Optional[Service], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
     async def search_services(
         self,
-        name: Optional[str] = None,
-        category: Optional[str] = None,
-    ) -> tuple[list[Service], Optional[str]]:
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
-    async def get_kursus_by_id(self, id: int) -> tuple[Optional[Kursus], Optional[str]]:
+    async def get_kursus_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Kursus], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
     async def search_kursus(
         self,
-        name: Optional[str] = None,
-        category: Optional[str] = None,
-    ) -> tuple[list[Kursus], Optional[str]]:
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
-    async def get_faq_by_id(self, id: int) -> tuple[Optional[Faq], Optional[str]]:
+    async def get_faq_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Faq], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
     @abstractmethod
     async def search_faqs(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ) -> tuple[list[Any], Optional[str]]:
         raise NotImplementedError("Subclass should implement this!")
 
+    def pool_status(self) -> dict[str, int]:
+        """Connections of the provider's pool by state, for monitoring."""
+        return {}
+
     @abstractmethod
     async def close(self):
         pass
 
 
 async def create(config: AbstractConfig) -> Client:
-    for cls in Client.__subclasses__():
-        if config.kind == cls.kind:
-            client = await cls.create(config)  # type: ignore
+    # Imported here, providers import this module for the Client base class
+    from . import providers
 
-            return client
-    raise TypeError(f"No clients of kind '{config.kind}'")
+    provider = providers.load(config.kind)
+    return await provider.Client.create(config)
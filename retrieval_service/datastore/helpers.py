@@ -12,9 +12,30 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from typing import Union
+from typing import Sequence, Union
 
 import sqlparse
+from pydantic import BaseModel
+
+# Column holding the vector of each row. It is by far the largest column and
+# of no use to display a result, so lookups and searches skip it by default.
+EMBEDDING_COLUMN = "embedding"
+
+
+def project_columns(
+    columns: Sequence[str], include_embedding: bool = False
+) -> list[str]:
+    """Columns returned by a lookup or search, the embedding only on request."""
+    return [c for c in columns if include_embedding or c != EMBEDDING_COLUMN]
+
+
+def project_model(
+    display_model: type[BaseModel],
+    model: type[BaseModel],
+    include_embedding: bool = False,
+) -> type[BaseModel]:
+    """Model of a lookup or search result, the one with the embedding on request."""
+    return model if include_embedding else display_model
 
 
 def format_sql(sql: str, params: dict):
@@ -28,3 +28,9 @@ class Faq(BaseModel):
     title: str
     description: str
     embedding: Optional[List[float]] = None
+
+
+# Columns of each table, in the order they are stored
+SERVICE_COLUMNS = list(Service.model_fields)
+KURSUS_COLUMNS = list(Kursus.model_fields)
+FAQ_COLUMNS = list(Faq.model_fields)
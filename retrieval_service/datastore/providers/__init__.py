@@ -12,22 +12,35 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-from . import (
-    alloydb,
-    cloudsql_mysql,
-    cloudsql_postgres,
-    firestore,
-    postgres,
-    spanner_gsql,
-    spanner_postgres,
-)
-
-__ALL__ = [
-    alloydb,
-    postgres,
-    cloudsql_mysql,
-    cloudsql_postgres,
-    firestore,
-    spanner_gsql,
-    spanner_postgres,
-]
+import importlib
+from types import ModuleType
+
+# Provider modules by datastore kind. A provider is only imported once its
+# kind is configured, so deployments never load the clients of other stores.
+PROVIDERS: dict[str, str] = {
+    "alloydb-postgres": "alloydb",
+    "cloudsql-mysql": "cloudsql_mysql",
+    "cloudsql-postgres": "cloudsql_postgres",
+    "firestore": "firestore",
+    "memory": "memory",
+    "postgres": "postgres",
+    "spanner-gsql": "spanner_gsql",
+    "spanner-postgres": "spanner_postgres",
+}
+
+
+def load(kind: str) -> ModuleType:
+    """Import and return the provider module of a datastore kind."""
+    if kind not in PROVIDERS:
+        raise TypeError(f"No clients of kind '{kind}'")
+    return importlib.import_module(f".{PROVIDERS[kind]}", __name__)
+
+
+def __getattr__(name: str) -> ModuleType:
+    # Keeps `providers.postgres` style access working without eager imports
+    if name in PROVIDERS.values():
+        return importlib.import_module(f".{name}", __name__)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__ALL__ = [PROVIDERS, load]
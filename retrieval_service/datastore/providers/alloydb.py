@@ -23,6 +23,7 @@ from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 import models
 
 from .. import datastore
+from .. import models as datastore_models
 from .postgres import Client as PostgresClient
 
 ALLOYDB_PG_IDENTIFIER = "alloydb-postgres"
@@ -78,74 +79,71 @@ class Client(datastore.Client[Config]):
 
     async def initialize_data(
         self,
-        services: list[models.Service],
-        kursus: list[models.Kursus],
-        faqs: list[models.Faq],
+        services: list[datastore_models.Service],
+        kursus: list[datastore_models.Kursus],
+        faqs: list[datastore_models.Faq],
     ) -> None:
         await self.__pg_client.initialize_data(services, kursus, faqs)
 
     async def export_data(
         self,
     ) -> tuple[
-        list[models.Service],
-        list[models.Kursus],
-        list[models.Faq],
+        list[datastore_models.Service],
+        list[datastore_models.Kursus],
+        list[datastore_models.Faq],
     ]:
         return await self.__pg_client.export_data()
 
-    # --- Service ---
-    async def get_service_by_id(
-        self, id: int
-    ) -> tuple[Optional[models.Service], Optional[str]]:
-        return await self.__pg_client.get_service_by_id(id)
-
-    async def get_service_by_category(
-        self, category: str
-    ) -> tuple[list[models.Service], Optional[str]]:
-        return await self.__pg_client.get_service_by_category(category)
-
-    async def services_search(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
-    ) -> tuple[list[models.Service], Optional[str]]:
-        return await self.__pg_client.services_search(
-            query_embedding, similarity_threshold, top_k
+    async def search_services(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
+        return await self.__pg_client.search_services(
+            query_embedding, similarity_threshold, top_k, include_embedding
         )
 
-    # --- Course ---
-    async def get_course_by_id(
-        self, id: int
-    ) -> tuple[Optional[models.Kursus], Optional[str]]:
-        return await self.__pg_client.get_course_by_id(id)
-
-    async def get_course_by_level(
-        self, level: str
-    ) -> tuple[list[models.Kursus], Optional[str]]:
-        return await self.__pg_client.get_course_by_level(level)
-
-    async def courses_search(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
-    ) -> tuple[list[models.Kursus], Optional[str]]:
-        return await self.__pg_client.courses_search(
-            query_embedding, similarity_threshold, top_k
+    async def search_kursus(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
+        return await self.__pg_client.search_kursus(
+            query_embedding, similarity_threshold, top_k, include_embedding
         )
 
-    # --- FAQ ---
-    async def get_faq_by_id(
-        self, id: int
-    ) -> tuple[Optional[models.Faq], Optional[str]]:
-        return await self.__pg_client.get_faq_by_id(id)
-
-    async def get_faq_by_category(
-        self, category: str
-    ) -> tuple[list[models.Faq], Optional[str]]:
-        return await self.__pg_client.get_faq_by_category(category)
-
-    async def faqs_search(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
-    ) -> tuple[list[models.Faq], Optional[str]]:
-        return await self.__pg_client.faqs_search(
-            query_embedding, similarity_threshold, top_k
+    async def search_faqs(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
+        return await self.__pg_client.search_faqs(
+            query_embedding, similarity_threshold, top_k, include_embedding
         )
 
+    async def get_service_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        return await self.__pg_client.get_service_by_id(id, include_embedding)
+
+    async def get_kursus_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        return await self.__pg_client.get_kursus_by_id(id, include_embedding)
+
+    async def get_faq_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        return await self.__pg_client.get_faq_by_id(id, include_embedding)
+
+    def pool_status(self) -> dict[str, int]:
+        return self.__pg_client.pool_status()
+
     async def close(self):
         await self.__pg_client.close()
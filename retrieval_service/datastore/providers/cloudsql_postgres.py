@@ -24,6 +24,7 @@ from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
 import models
 
 from .. import datastore
+from .. import models as datastore_models
 from .postgres import Client as PostgresClient
 
 CLOUD_SQL_PG_IDENTIFIER = "cloudsql-postgres"
@@ -80,42 +81,72 @@ class Client(datastore.Client[Config]):
 
     async def initialize_data(
         self,
-        services: list[models.Service],
-        kursus_list: list[models.Kursus],
-        faqs: list[models.Faq],
+        services: list[datastore_models.Service],
+        kursus_list: list[datastore_models.Kursus],
+        faqs: list[datastore_models.Faq],
     ) -> None:
         await self.__pg_client.initialize_data(services, kursus_list, faqs)
 
     async def export_data(
         self,
     ) -> tuple[
-        list[models.Service],
-        list[models.Kursus],
-        list[models.Faq],
+        list[datastore_models.Service],
+        list[datastore_models.Kursus],
+        list[datastore_models.Faq],
     ]:
         return await self.__pg_client.export_data()
 
     async def search_services(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ) -> tuple[list[Any], Optional[str]]:
         return await self.__pg_client.search_services(
-            query_embedding, similarity_threshold, top_k
+            query_embedding, similarity_threshold, top_k, include_embedding
         )
 
     async def search_kursus(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ) -> tuple[list[Any], Optional[str]]:
         return await self.__pg_client.search_kursus(
-            query_embedding, similarity_threshold, top_k
+            query_embedding, similarity_threshold, top_k, include_embedding
         )
 
     async def search_faqs(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ) -> tuple[list[Any], Optional[str]]:
         return await self.__pg_client.search_faqs(
-            query_embedding, similarity_threshold, top_k
+            query_embedding, similarity_threshold, top_k, include_embedding
         )
 
+    async def get_service_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        return await self.__pg_client.get_service_by_id(id, include_embedding)
+
+    async def get_kursus_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        return await self.__pg_client.get_kursus_by_id(id, include_embedding)
+
+    async def get_faq_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        return await self.__pg_client.get_faq_by_id(id, include_embedding)
+
+    def pool_status(self) -> dict[str, int]:
+        return self.__pg_client.pool_status()
+
     async def close(self):
         await self.__pg_client.close()
 
@@ -235,43 +266,3 @@ class Client(datastore.Client[Config]):
                     for f in faqs
                 ],
             )
-
-    # Search logic baru
-    async def search_services(self, query_embedding, similarity_threshold, top_k):
-        async with self.pool.acquire() as conn:
-            sql = """
-            SELECT id, category, title, description, price, embedding,
-                1 - (embedding <=> $1::vector) AS similarity
-            FROM services
-            WHERE 1 - (embedding <=> $1::vector) >= $2
-            ORDER BY similarity DESC
-            LIMIT $3
-            """
-            rows = await conn.fetch(sql, query_embedding, similarity_threshold, top_k)
-            return [dict(row) for row in rows], sql
-
-    async def search_kursus(self, query_embedding, similarity_threshold, top_k):
-        async with self.pool.acquire() as conn:
-            sql = """
-            SELECT id, course_name, level, description, price, start_date, end_date, embedding,
-                1 - (embedding <=> $1::vector) AS similarity
-            FROM kursus
-            WHERE 1 - (embedding <=> $1::vector) >= $2
-            ORDER BY similarity DESC
-            LIMIT $3
-            """
-            rows = await conn.fetch(sql, query_embedding, similarity_threshold, top_k)
-            return [dict(row) for row in rows], sql
-
-    async def search_faqs(self, query_embedding, similarity_threshold, top_k):
-        async with self.pool.acquire() as conn:
-            sql = """
-            SELECT id, category, title, description, embedding,
-                1 - (embedding <=> $1::vector) AS similarity
-            FROM faqs
-            WHERE 1 - (embedding <=> $1::vector) >= $2
-            ORDER BY similarity DESC
-            LIMIT $3
-            """
-            rows = await conn.fetch(sql, query_embedding, similarity_threshold, top_k)
-            return [dict(row) for row in rows], sql
@@ -19,6 +19,7 @@ from typing import Any, Literal, Optional
 from google.cloud.firestore import AsyncClient  # type: ignore
 from google.cloud.firestore_v1.async_collection import AsyncCollectionReference
 from google.cloud.firestore_v1.async_query import AsyncQuery
+from google.cloud.firestore_v1.base_document import DocumentSnapshot
 from google.cloud.firestore_v1.base_query import FieldFilter
 from google.cloud.firestore_v1.base_vector_query import DistanceMeasure
 from google.cloud.firestore_v1.vector import Vector
@@ -27,10 +28,26 @@ from pydantic import BaseModel
 import models
 
 from .. import datastore
+from .. import models as datastore_models
+from ..helpers import project_columns, project_model
+from ..models import FAQ_COLUMNS, KURSUS_COLUMNS, SERVICE_COLUMNS
 
 FIRESTORE_IDENTIFIER = "firestore"
 
 
+def document_fields(columns: list[str], include_embedding: bool) -> list[str]:
+    # The id is the document name, it is not stored as a field
+    return [c for c in project_columns(columns, include_embedding) if c != "id"]
+
+
+def to_model(doc: DocumentSnapshot, model: type[BaseModel]) -> Any:
+    d = doc.to_dict() or {}
+    d["id"] = int(doc.id)
+    if "embedding" in d:
+        d["embedding"] = list(d["embedding"])
+    return model.model_validate(d)
+
+
 class Config(BaseModel, datastore.AbstractConfig):
     kind: Literal["firestore"]
     projectId: Optional[str]
@@ -242,80 +259,96 @@ class Client(datastore.Client[Config]):
 
         return services, kursus_list, faqs
 
-    async def get_service_by_id(self, id: int) -> models.Service:
-        doc = await self.__client.collection("services").document(str(id)).get()
-        d = doc.to_dict()
-        d["id"] = int(doc.id)
-        d["embedding"] = list(d.get("embedding", []))
-        return models.Service.model_validate(d)
-
-    async def get_kursus_by_id(self, id: int) -> models.Kursus:
-        doc = await self.__client.collection("kursus").document(str(id)).get()
-        d = doc.to_dict()
-        d["id"] = int(doc.id)
-        d["embedding"] = list(d.get("embedding", []))
-        return models.Kursus.model_validate(d)
-
-    async def get_faq_by_id(self, id: int) -> models.Faq:
-        doc = await self.__client.collection("faqs").document(str(id)).get()
-        d = doc.to_dict()
-        d["id"] = int(doc.id)
-        d["embedding"] = list(d.get("embedding", []))
-        return models.Faq.model_validate(d)
+    async def get_service_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        model = project_model(
+            models.Service, datastore_models.Service, include_embedding
+        )
+        doc = (
+            await self.__client.collection("services")
+            .document(str(id))
+            .get(field_paths=document_fields(SERVICE_COLUMNS, include_embedding))
+        )
+        return (to_model(doc, model) if doc.exists else None), None
+
+    async def get_kursus_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        model = project_model(models.Kursus, datastore_models.Kursus, include_embedding)
+        doc = (
+            await self.__client.collection("kursus")
+            .document(str(id))
+            .get(field_paths=document_fields(KURSUS_COLUMNS, include_embedding))
+        )
+        return (to_model(doc, model) if doc.exists else None), None
+
+    async def get_faq_by_id(
+        self, id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        model = project_model(models.Faq, datastore_models.Faq, include_embedding)
+        doc = (
+            await self.__client.collection("faqs")
+            .document(str(id))
+            .get(field_paths=document_fields(FAQ_COLUMNS, include_embedding))
+        )
+        return (to_model(doc, model) if doc.exists else None), None
 
     async def search_services(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
-    ):
-        query = self.__service_collection.find_nearest(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
+        model = project_model(
+            models.Service, datastore_models.Service, include_embedding
+        )
+        query = self.__service_collection.select(
+            document_fields(SERVICE_COLUMNS, include_embedding)
+        ).find_nearest(
             vector_field="embedding",
             query_vector=Vector(query_embedding),
             distance_measure=DistanceMeasure.DOT_PRODUCT,
             limit=top_k,
         )
-        docs = query.stream()
-        results = []
-        async for doc in docs:
-            d = doc.to_dict()
-            d["id"] = int(doc.id)
-            d["embedding"] = list(d.get("embedding", []))
-            results.append(models.Service.model_validate(d))
-        return results
+        return [to_model(doc, model) async for doc in query.stream()], None
 
     async def search_kursus(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
-    ):
-        query = self.__kursus_collection.find_nearest(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
+        model = project_model(models.Kursus, datastore_models.Kursus, include_embedding)
+        query = self.__kursus_collection.select(
+            document_fields(KURSUS_COLUMNS, include_embedding)
+        ).find_nearest(
             vector_field="embedding",
             query_vector=Vector(query_embedding),
             distance_measure=DistanceMeasure.DOT_PRODUCT,
             limit=top_k,
         )
-        docs = query.stream()
-        results = []
-        async for doc in docs:
-            d = doc.to_dict()
-            d["id"] = int(doc.id)
-            d["embedding"] = list(d.get("embedding", []))
-            results.append(models.Kursus.model_validate(d))
-        return results
+        return [to_model(doc, model) async for doc in query.stream()], None
 
     async def search_faqs(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
-    ):
-        query = self.__faq_collection.find_nearest(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
+        model = project_model(models.Faq, datastore_models.Faq, include_embedding)
+        query = self.__faq_collection.select(
+            document_fields(FAQ_COLUMNS, include_embedding)
+        ).find_nearest(
             vector_field="embedding",
             query_vector=Vector(query_embedding),
             distance_measure=DistanceMeasure.DOT_PRODUCT,
             limit=top_k,
         )
-        docs = query.stream()
-        results = []
-        async for doc in docs:
-            d = doc.to_dict()
-            d["id"] = int(doc.id)
-            d["embedding"] = list(d.get("embedding", []))
-            results.append(models.Faq.model_validate(d))
-        return results
+        return [to_model(doc, model) async for doc in query.stream()], None
 
     async def close(self):
         self.__client.close()
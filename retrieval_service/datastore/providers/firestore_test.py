@@ -132,16 +132,16 @@ async def test_firestore_service_kursus_faq():
     client = await mock_client(mock_firestore_client)
 
     # Test get_service_by_id
-    service = await client.get_service_by_id(1)
+    service, _ = await client.get_service_by_id(1)
     assert service.id == 1
     assert service.title == "Terjemah Ijazah"
 
     # Test get_kursus_by_id
-    kursus = await client.get_kursus_by_id(1)
+    kursus, _ = await client.get_kursus_by_id(1)
     assert kursus.id == 1
     assert kursus.course_name == "Kursus Bahasa Inggris Dasar"
 
     # Test get_faq_by_id
-    faq = await client.get_faq_by_id(1)
+    faq, _ = await client.get_faq_by_id(1)
     assert faq.id == 1
     assert faq.title == "Bagaimana cara mendaftar kursus?"
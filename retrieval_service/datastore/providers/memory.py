@@ -0,0 +1,277 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import Any, Literal, Optional
+
+import numpy as np
+from pydantic import BaseModel
+
+import models
+from metrics import stage
+
+from .. import datastore
+from .. import models as datastore_models
+from ..helpers import EMBEDDING_COLUMN, project_columns, project_model
+from ..models import FAQ_COLUMNS, KURSUS_COLUMNS, SERVICE_COLUMNS
+
+MEMORY_IDENTIFIER = "memory"
+# Refinements of the ivfflat list centroids when an index is built
+IVFFLAT_KMEANS_ITERATIONS = 10
+
+
+class Config(BaseModel, datastore.AbstractConfig):
+    kind: Literal["memory"]
+    # Only ivfflat, an index that partitions rows by their nearest centroid
+    vector_index: Optional[datastore.VectorIndex] = None
+
+
+class Table:
+    """
+    Rows of one table, ordered by id, with their embeddings in a matrix.
+    Searches use cosine distance as pgvector's `<=>` does. Without lists they
+    compare the query to every row, like a table without a vector index.
+
+    With `lists`, rows are partitioned like pgvector's ivfflat index: by their
+    nearest of `lists` centroids, found with k-means. A search then only
+    compares the query to the rows of the `probes` nearest lists.
+    """
+
+    def __init__(self, rows: list[dict[str, Any]], lists: int = 0):
+        embeddings = [row.pop(EMBEDDING_COLUMN) for row in rows]
+        if any(e is None for e in embeddings):
+            raise ValueError("Every row needs an embedding")
+        self.rows = rows
+        self.positions = {row["id"]: i for i, row in enumerate(rows)}
+        self.embeddings = (
+            np.array(embeddings, dtype=np.float64) if rows else np.empty((0, 0))
+        )
+        self.norms = np.linalg.norm(self.embeddings, axis=1)
+        self.centroids: Optional[np.ndarray] = None
+        if lists > 0 and rows:
+            self.build_lists(min(lists, len(rows)))
+
+    def build_lists(self, lists: int):
+        unit = self.embeddings / self.norms[:, np.newaxis]
+        rng = np.random.default_rng(0)
+        centroids = unit[rng.choice(len(unit), size=lists, replace=False)]
+        for _ in range(IVFFLAT_KMEANS_ITERATIONS):
+            assignments = np.argmax(unit @ centroids.T, axis=1)
+            order = np.argsort(assignments, kind="stable")
+            counts = np.bincount(assignments, minlength=lists)
+            used = counts > 0
+            sums = np.add.reduceat(unit[order], (np.cumsum(counts) - counts)[used])
+            centroids[used] = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+        assignments = np.argmax(unit @ centroids.T, axis=1)
+        counts = np.bincount(assignments, minlength=lists)
+        self.centroids = centroids
+        # Row positions grouped by list, and where each list starts and ends
+        self.list_rows = np.argsort(assignments, kind="stable")
+        self.list_bounds = np.stack([np.cumsum(counts) - counts, np.cumsum(counts)], 1)
+
+    def candidates(self, query: np.ndarray, probes: int) -> Optional[np.ndarray]:
+        """Positions of the rows in the lists nearest to the query, if any."""
+        if self.centroids is None:
+            return None
+        probes = max(1, min(probes, len(self.centroids)))
+        nearest = np.argpartition(-(self.centroids @ query), probes - 1)[:probes]
+        return np.concatenate(
+            [self.list_rows[start:end] for start, end in self.list_bounds[nearest]]
+        )
+
+    def get(self, id: int, columns: list[str]) -> Optional[dict[str, Any]]:
+        position = self.positions.get(id)
+        return None if position is None else self.row(position, columns)
+
+    def search(
+        self,
+        columns: list[str],
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        probes: int = 1,
+    ) -> list[dict[str, Any]]:
+        if not self.rows or top_k <= 0:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float64)
+        positions = self.candidates(query, probes)
+        if positions is None:
+            embeddings, norms = self.embeddings, self.norms
+        else:
+            embeddings, norms = self.embeddings[positions], self.norms[positions]
+        distances = 1 - embeddings @ query / (norms * np.linalg.norm(query))
+        matches = np.flatnonzero(distances < similarity_threshold)
+        if len(matches) > top_k:
+            matches = matches[np.argpartition(distances[matches], top_k - 1)[:top_k]]
+        matches = matches[np.argsort(distances[matches], kind="stable")]
+        if positions is not None:
+            matches = positions[matches]
+        return [self.row(int(position), columns) for position in matches]
+
+    def row(self, position: int, columns: list[str]) -> dict[str, Any]:
+        row = self.rows[position]
+        return {
+            c: (self.embeddings[position].tolist() if c == EMBEDDING_COLUMN else row[c])
+            for c in columns
+        }
+
+    def export(self, columns: list[str]) -> list[dict[str, Any]]:
+        return [self.row(position, columns) for position in range(len(self.rows))]
+
+
+class Client(datastore.Client[Config]):
+    """
+    Keeps the dataset in process memory. It needs no database, for local
+    development, tests and benchmarks, and loses its data on close.
+    """
+
+    @datastore.classproperty
+    def kind(cls):
+        return MEMORY_IDENTIFIER
+
+    def __init__(self, vector_index: Optional[datastore.VectorIndex] = None):
+        if vector_index is not None and vector_index.method != "ivfflat":
+            raise ValueError("The memory datastore only supports ivfflat indexes")
+        self.vector_index = vector_index
+        self.__tables = {
+            "services": Table([]),
+            "kursus": Table([]),
+            "faqs": Table([]),
+        }
+
+    @classmethod
+    async def create(cls, config: Config) -> "Client":
+        return cls(config.vector_index)
+
+    async def initialize_data(
+        self,
+        services: list[datastore_models.Service],
+        kursus_list: list[datastore_models.Kursus],
+        faqs: list[datastore_models.Faq],
+    ) -> None:
+        for table, items in (
+            ("services", services),
+            ("kursus", kursus_list),
+            ("faqs", faqs),
+        ):
+            rows = sorted((item.model_dump() for item in items), key=lambda r: r["id"])
+            lists = self.vector_index.lists if self.vector_index else 0
+            self.__tables[table] = Table(rows, lists)
+
+    async def export_data(
+        self,
+    ) -> tuple[
+        list[datastore_models.Service],
+        list[datastore_models.Kursus],
+        list[datastore_models.Faq],
+    ]:
+        services = [
+            datastore_models.Service.model_validate(s)
+            for s in self.__tables["services"].export(SERVICE_COLUMNS)
+        ]
+        kursus_list = [
+            datastore_models.Kursus.model_validate(k)
+            for k in self.__tables["kursus"].export(KURSUS_COLUMNS)
+        ]
+        faqs = [
+            datastore_models.Faq.model_validate(f)
+            for f in self.__tables["faqs"].export(FAQ_COLUMNS)
+        ]
+        return services, kursus_list, faqs
+
+    async def search_services(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
+        columns = project_columns(SERVICE_COLUMNS, include_embedding)
+        return self.__search(
+            "services", columns, query_embedding, similarity_threshold, top_k
+        )
+
+    async def search_kursus(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
+        columns = project_columns(KURSUS_COLUMNS, include_embedding)
+        return self.__search(
+            "kursus", columns, query_embedding, similarity_threshold, top_k
+        )
+
+    async def search_faqs(
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
+    ) -> tuple[list[Any], Optional[str]]:
+        columns = project_columns(FAQ_COLUMNS, include_embedding)
+        return self.__search(
+            "faqs", columns, query_embedding, similarity_threshold, top_k
+        )
+
+    def __search(
+        self,
+        table: str,
+        columns: list[str],
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+    ) -> tuple[list[Any], Optional[str]]:
+        with stage("db.query"):
+            res = self.__tables[table].search(
+                columns,
+                query_embedding,
+                similarity_threshold,
+                top_k,
+                self.vector_index.probes if self.vector_index else 1,
+            )
+        return res, None
+
+    async def get_service_by_id(
+        self, service_id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        model = project_model(
+            models.Service, datastore_models.Service, include_embedding
+        )
+        columns = project_columns(SERVICE_COLUMNS, include_embedding)
+        return self.__get_by_id("services", columns, model, service_id)
+
+    async def get_kursus_by_id(
+        self, kursus_id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        model = project_model(models.Kursus, datastore_models.Kursus, include_embedding)
+        columns = project_columns(KURSUS_COLUMNS, include_embedding)
+        return self.__get_by_id("kursus", columns, model, kursus_id)
+
+    async def get_faq_by_id(
+        self, faq_id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        model = project_model(models.Faq, datastore_models.Faq, include_embedding)
+        columns = project_columns(FAQ_COLUMNS, include_embedding)
+        return self.__get_by_id("faqs", columns, model, faq_id)
+
+    def __get_by_id(
+        self, table: str, columns: list[str], model: type[BaseModel], id: int
+    ) -> tuple[Optional[Any], Optional[str]]:
+        with stage("db.query"):
+            row = self.__tables[table].get(id, columns)
+        return (model.model_validate(row) if row else None), None
+
+    async def close(self):
+        pass
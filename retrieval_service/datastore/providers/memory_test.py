@@ -0,0 +1,140 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from typing import AsyncGenerator
+
+import pytest
+import pytest_asyncio
+from csv_diff import compare, load_csv  # type: ignore
+
+import models
+
+from .. import datastore
+from . import memory, test_data
+from .test_data import faq_embedding_1, kursus_embedding_1, service_embedding_1
+
+pytestmark = pytest.mark.asyncio(scope="module")
+
+service_ds_path = "../data/service_dummy.csv"
+kursus_ds_path = "../data/kursus_dummy.csv"
+faq_ds_path = "../data/faq_dummy.csv"
+
+
+@pytest_asyncio.fixture(scope="module")
+async def ds() -> AsyncGenerator[datastore.Client, None]:
+    cfg = memory.Config(kind="memory")
+    ds = await datastore.create(cfg)
+
+    services, kursus_list, faqs = await ds.load_dataset(
+        service_ds_path,
+        kursus_ds_path,
+        faq_ds_path,
+    )
+    # The CSV files carry no embeddings, test_data has one per row
+    for prefix, items in (
+        ("service", services),
+        ("kursus", kursus_list),
+        ("faq", faqs),
+    ):
+        for item in items:
+            item.embedding = getattr(test_data, f"{prefix}_embedding_{item.id}")
+    await ds.initialize_data(services, kursus_list, faqs)
+    yield ds
+    await ds.close()
+
+
+def check_file_diff(file_diff):
+    assert file_diff["added"] == []
+    assert file_diff["removed"] == []
+    assert file_diff["changed"] == []
+    assert file_diff["columns_added"] == []
+    assert file_diff["columns_removed"] == []
+
+
+async def test_export_dataset(ds: memory.Client, tmp_path):
+    services, kursus_list, faqs = await ds.export_data()
+    assert services[0].embedding == service_embedding_1
+
+    paths = [tmp_path / name for name in ("services.csv", "kursus.csv", "faqs.csv")]
+    await ds.export_dataset(services, kursus_list, faqs, *paths)
+
+    for ds_path, new_path in zip((service_ds_path, kursus_ds_path, faq_ds_path), paths):
+        diff = compare(
+            load_csv(open(ds_path, encoding="utf-8-sig"), "id"),
+            load_csv(open(new_path), "id"),
+        )
+        diff["columns_added"].remove("embedding")
+        check_file_diff(diff)
+
+
+async def test_get_service_by_id(ds: memory.Client):
+    res, sql = await ds.get_service_by_id(1)
+    assert isinstance(res, models.Service)
+    assert res.id == 1
+    assert sql is None
+    res, _ = await ds.get_service_by_id(10_000)
+    assert res is None
+
+    res, _ = await ds.get_service_by_id(1, include_embedding=True)
+    assert res is not None and res.embedding == service_embedding_1
+
+
+async def test_search_services(ds: memory.Client):
+    res, sql = await ds.search_services(service_embedding_1, 0.5, 3)
+    assert [r["id"] for r in res][0] == 1
+    assert len(res) <= 3
+    assert all("embedding" not in r for r in res)
+    assert sql is None
+
+
+async def test_search_kursus(ds: memory.Client):
+    res, _ = await ds.search_kursus(kursus_embedding_1, 0.5, 3)
+    assert res[0]["id"] == 1
+
+
+async def test_search_faqs_threshold(ds: memory.Client):
+    res, _ = await ds.search_faqs(faq_embedding_1, 1e-9, 3, include_embedding=True)
+    assert [r["id"] for r in res] == [1]
+    assert res[0]["embedding"] == faq_embedding_1
+
+
+async def test_search_orders_by_distance(ds: memory.Client):
+    res, _ = await ds.search_services(service_embedding_1, 2.0, 15, True)
+    assert len(res) == 15
+    distances = [memory_distance(service_embedding_1, r["embedding"]) for r in res]
+    assert distances == sorted(distances)
+
+
+def memory_distance(a: list[float], b: list[float]) -> float:
+    dot = sum(x * y for x, y in zip(a, b))
+    norm = sum(x * x for x in a) ** 0.5 * sum(y * y for y in b) ** 0.5
+    return 1 - dot / norm
+
+
+async def test_ivfflat_index(ds: memory.Client):
+    services, kursus_list, faqs = await ds.export_data()
+    index = datastore.VectorIndex(method="ivfflat", lists=4, probes=4)
+    indexed = await datastore.create(memory.Config(kind="memory", vector_index=index))
+    await indexed.initialize_data(services, kursus_list, faqs)
+
+    # Probing every list finds the same rows as a search without index
+    exact, _ = await ds.search_services(service_embedding_1, 2.0, 5)
+    res, _ = await indexed.search_services(service_embedding_1, 2.0, 5)
+    assert res == exact
+
+    # The client searches with the index it was configured with
+    index.probes = 1
+    res, _ = await indexed.search_services(service_embedding_1, 2.0, 15)
+    assert 0 < len(res) < 15
+    assert res[0]["id"] == 1
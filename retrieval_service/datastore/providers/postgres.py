@@ -13,22 +13,34 @@
 # limitations under the License.
 
 import asyncio
+from contextlib import asynccontextmanager
 from datetime import datetime
 from ipaddress import IPv4Address, IPv6Address
-from typing import Any, Literal, Optional
+from typing import Any, AsyncIterator, Literal, Optional
 
 import asyncpg
 from pgvector.asyncpg import register_vector
 from pydantic import BaseModel
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
+from sqlalchemy import QueuePool, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine, create_async_engine
 
 import models
+from metrics import stage
 
 from .. import datastore
-from ..helpers import format_sql
+from .. import models as datastore_models
+from ..helpers import format_sql, project_columns, project_model
+from ..models import FAQ_COLUMNS, KURSUS_COLUMNS, SERVICE_COLUMNS
 
 POSTGRES_IDENTIFIER = "postgres"
+# Tables exported by export_data, in the order they are returned
+EXPORT_TABLES = ("services", "kursus", "faqs")
+# Tables larger than this are exported as several id-range partitions
+EXPORT_PARTITION_ROWS = 50_000
+# Upper bound of partitions per table, keeps export within the engine pool
+EXPORT_MAX_PARTITIONS = 4
+# Setting that bounds the work of each index method per search
+VECTOR_INDEX_SEARCH_SETTINGS = {"hnsw": "hnsw.ef_search", "ivfflat": "ivfflat.probes"}
 
 
 class Config(BaseModel, datastore.AbstractConfig):
@@ -38,6 +50,7 @@ class Config(BaseModel, datastore.AbstractConfig):
     user: str
     password: str
     database: str
+    vector_index: Optional[datastore.VectorIndex] = None
 
 
 class Client(datastore.Client[Config]):
@@ -47,8 +60,13 @@ class Client(datastore.Client[Config]):
     def kind(cls):
         return POSTGRES_IDENTIFIER
 
-    def __init__(self, async_engine: AsyncEngine):
+    def __init__(
+        self,
+        async_engine: AsyncEngine,
+        vector_index: Optional[datastore.VectorIndex] = None,
+    ):
         self.__async_engine = async_engine
+        self.vector_index = vector_index
 
     @classmethod
     async def create(cls, config: Config) -> "Client":
@@ -69,13 +87,13 @@ class Client(datastore.Client[Config]):
         )
         if async_engine is None:
             raise TypeError("async_engine not instantiated")
-        return cls(async_engine)
+        return cls(async_engine, config.vector_index)
 
     async def initialize_data(
         self,
-        services: list[models.Service],
-        kursus_list: list[models.Kursus],
-        faqs: list[models.Faq],  # perbaikan: gunakan Faq, bukan FAQ
+        services: list[datastore_models.Service],
+        kursus_list: list[datastore_models.Kursus],
+        faqs: list[datastore_models.Faq],  # perbaikan: gunakan Faq, bukan FAQ
     ) -> None:
         async with self.__async_engine.connect() as conn:
             await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
@@ -186,85 +204,146 @@ class Client(datastore.Client[Config]):
                     for f in faqs
                 ],
             )
+
+            if self.vector_index is not None:
+                for table in EXPORT_TABLES:
+                    await self.__create_vector_index(conn, table)
             await conn.commit()
 
+    async def __create_vector_index(self, conn: AsyncConnection, table: str):
+        index = self.vector_index
+        if index is None:
+            return
+        if index.method == "hnsw":
+            options = f"m = {index.m}, ef_construction = {index.ef_construction}"
+        else:
+            options = f"lists = {index.lists}"
+        # vector_cosine_ops serves the <=> cosine distance that searches order by
+        sql = f"""
+            CREATE INDEX ON {table}
+            USING {index.method} (embedding vector_cosine_ops)
+            WITH ({options})
+            """
+        await conn.execute(text(sql))
+
     async def export_data(
         self,
     ) -> tuple[
-        list[models.Service],
-        list[models.Kursus],
-        list[models.Faq],  # perbaikan: gunakan Faq, bukan FAQ
+        list[datastore_models.Service],
+        list[datastore_models.Kursus],
+        list[datastore_models.Faq],
     ]:
+        # The coordinating transaction exports its snapshot so every partition
+        # reads the same consistent view from its own pooled connection.
         async with self.__async_engine.connect() as conn:
-            service_task = asyncio.create_task(
-                conn.execute(text("""SELECT * FROM services ORDER BY id ASC"""))
-            )
-            kursus_task = asyncio.create_task(
-                conn.execute(text("""SELECT * FROM kursus ORDER BY id ASC"""))
-            )
-            faq_task = asyncio.create_task(
-                conn.execute(text("""SELECT * FROM faqs ORDER BY id ASC"""))
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+            snapshot_id = (
+                await conn.execute(text("SELECT pg_export_snapshot()"))
+            ).scalar_one()
+
+            partitions: list[tuple[str, Optional[tuple[int, int]]]] = []
+            for table in EXPORT_TABLES:
+                bounds = await self.__export_partition_bounds(conn, table)
+                partitions.extend((table, b) for b in bounds)
+
+            # The snapshot stays importable only while this transaction is open
+            rows = await asyncio.gather(
+                *(
+                    self.__export_partition(snapshot_id, table, b)
+                    for table, b in partitions
+                )
             )
 
-            service_results = (await service_task).mappings().fetchall()
-            kursus_results = (await kursus_task).mappings().fetchall()
-            faq_results = (await faq_task).mappings().fetchall()
+        results: dict[str, list[Any]] = {table: [] for table in EXPORT_TABLES}
+        for (table, _), partition_rows in zip(partitions, rows):
+            results[table].extend(partition_rows)
+
+        services = [
+            datastore_models.Service.model_validate(s) for s in results["services"]
+        ]
+        kursus_list = [
+            datastore_models.Kursus.model_validate(k) for k in results["kursus"]
+        ]
+        faqs = [datastore_models.Faq.model_validate(f) for f in results["faqs"]]
+        return services, kursus_list, faqs
 
-            services = [models.Service.model_validate(s) for s in service_results]
-            kursus_list = [models.Kursus.model_validate(k) for k in kursus_results]
-            faqs = [models.Faq.model_validate(f) for f in faq_results]  # perbaikan: gunakan Faq, bukan FAQ
+    async def __export_partition_bounds(
+        self, conn: AsyncConnection, table: str
+    ) -> list[Optional[tuple[int, int]]]:
+        """Split a table into contiguous id ranges of roughly equal size."""
+        sql = f"SELECT MIN(id) AS lo, MAX(id) AS hi, COUNT(*) AS n FROM {table}"
+        stats = (await conn.execute(text(sql))).mappings().one()
+        if stats["n"] <= EXPORT_PARTITION_ROWS:
+            return [None]
+        count = min(EXPORT_MAX_PARTITIONS, -(-stats["n"] // EXPORT_PARTITION_ROWS))
+        step = -(-(stats["hi"] - stats["lo"] + 1) // count)
+        return [
+            (lo, min(lo + step, stats["hi"] + 1))
+            for lo in range(stats["lo"], stats["hi"] + 1, step)
+        ]
 
-            return services, kursus_list, faqs
+    async def __export_partition(
+        self, snapshot_id: str, table: str, bounds: Optional[tuple[int, int]]
+    ) -> list[Any]:
+        async with self.__async_engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="REPEATABLE READ")
+            await conn.execute(text(f"SET TRANSACTION SNAPSHOT '{snapshot_id}'"))
+            if bounds is None:
+                sql = f"SELECT * FROM {table} ORDER BY id ASC"
+                params: dict[str, Any] = {}
+            else:
+                sql = f"SELECT * FROM {table} WHERE id >= :lo AND id < :hi ORDER BY id ASC"
+                params = {"lo": bounds[0], "hi": bounds[1]}
+            return list((await conn.execute(text(sql), params)).mappings().fetchall())
 
     async def search_services(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ) -> tuple[list[Any], Optional[str]]:
-        async with self.__async_engine.connect() as conn:
-            sql = """
-                SELECT id, category, title, description, price
-                FROM services
-                WHERE (embedding <=> :query_embedding) < :similarity_threshold
-                ORDER BY (embedding <=> :query_embedding)
-                LIMIT :top_k
-                """
-            s = text(sql)
-            params = {
-                "query_embedding": query_embedding,
-                "similarity_threshold": similarity_threshold,
-                "top_k": top_k,
-            }
-            results = (await conn.execute(s, params)).mappings().fetchall()
-        res = [r for r in results]
-        return res, format_sql(sql, params)
+        columns = project_columns(SERVICE_COLUMNS, include_embedding)
+        return await self.__search(
+            "services", columns, query_embedding, similarity_threshold, top_k
+        )
 
     async def search_kursus(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ) -> tuple[list[Any], Optional[str]]:
-        async with self.__async_engine.connect() as conn:
-            sql = """
-                SELECT id, course_name, level, description, price, start_date, end_date
-                FROM kursus
-                WHERE (embedding <=> :query_embedding) < :similarity_threshold
-                ORDER BY (embedding <=> :query_embedding)
-                LIMIT :top_k
-                """
-            s = text(sql)
-            params = {
-                "query_embedding": query_embedding,
-                "similarity_threshold": similarity_threshold,
-                "top_k": top_k,
-            }
-            results = (await conn.execute(s, params)).mappings().fetchall()
-        res = [r for r in results]
-        return res, format_sql(sql, params)
+        columns = project_columns(KURSUS_COLUMNS, include_embedding)
+        return await self.__search(
+            "kursus", columns, query_embedding, similarity_threshold, top_k
+        )
 
     async def search_faqs(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ) -> tuple[list[Any], Optional[str]]:
-        async with self.__async_engine.connect() as conn:
-            sql = """
-                SELECT id, category, title, description
-                FROM faqs
+        columns = project_columns(FAQ_COLUMNS, include_embedding)
+        return await self.__search(
+            "faqs", columns, query_embedding, similarity_threshold, top_k
+        )
+
+    async def __search(
+        self,
+        table: str,
+        columns: list[str],
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+    ) -> tuple[list[Any], Optional[str]]:
+        async with self.__connect() as conn:
+            sql = f"""
+                SELECT {", ".join(columns)}
+                FROM {table}
                 WHERE (embedding <=> :query_embedding) < :similarity_threshold
                 ORDER BY (embedding <=> :query_embedding)
                 LIMIT :top_k
@@ -275,30 +354,80 @@ class Client(datastore.Client[Config]):
                 "similarity_threshold": similarity_threshold,
                 "top_k": top_k,
             }
-            results = (await conn.execute(s, params)).mappings().fetchall()
-        res = [r for r in results]
-        return res, format_sql(sql, params)
+            with stage("db.query"):
+                await self.__set_vector_index_search(conn)
+                result = await conn.execute(s, params)
+            with stage("db.rows"):
+                res = list(result.mappings().fetchall())
+        with stage("db.format_sql"):
+            return res, format_sql(sql, params)
 
-    async def get_service_by_id(self, service_id: int):
-        async with self.__async_engine.connect() as conn:
-            sql = "SELECT * FROM services WHERE id = :id"
-            result = await conn.execute(text(sql), {"id": service_id})
-            row = result.mappings().first()
-            return models.Service.model_validate(row) if row else None
+    async def __set_vector_index_search(self, conn: AsyncConnection):
+        """Apply the index's search parameter to this search's transaction."""
+        index = self.vector_index
+        if index is None:
+            return
+        value = index.ef_search if index.method == "hnsw" else index.probes
+        await conn.execute(
+            text("SELECT set_config(:name, :value, true)"),
+            {"name": VECTOR_INDEX_SEARCH_SETTINGS[index.method], "value": str(value)},
+        )
 
-    async def get_kursus_by_id(self, kursus_id: int):
-        async with self.__async_engine.connect() as conn:
-            sql = "SELECT * FROM kursus WHERE id = :id"
-            result = await conn.execute(text(sql), {"id": kursus_id})
-            row = result.mappings().first()
-            return models.Kursus.model_validate(row) if row else None
+    async def get_service_by_id(
+        self, service_id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        model = project_model(
+            models.Service, datastore_models.Service, include_embedding
+        )
+        columns = project_columns(SERVICE_COLUMNS, include_embedding)
+        return await self.__get_by_id("services", columns, model, service_id)
 
-    async def get_faq_by_id(self, faq_id: int):
-        async with self.__async_engine.connect() as conn:
-            sql = "SELECT * FROM faqs WHERE id = :id"
-            result = await conn.execute(text(sql), {"id": faq_id})
-            row = result.mappings().first()
-            return models.Faq.model_validate(row) if row else None
+    async def get_kursus_by_id(
+        self, kursus_id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        model = project_model(models.Kursus, datastore_models.Kursus, include_embedding)
+        columns = project_columns(KURSUS_COLUMNS, include_embedding)
+        return await self.__get_by_id("kursus", columns, model, kursus_id)
+
+    async def get_faq_by_id(
+        self, faq_id: int, include_embedding: bool = False
+    ) -> tuple[Optional[Any], Optional[str]]:
+        model = project_model(models.Faq, datastore_models.Faq, include_embedding)
+        columns = project_columns(FAQ_COLUMNS, include_embedding)
+        return await self.__get_by_id("faqs", columns, model, faq_id)
+
+    async def __get_by_id(
+        self, table: str, columns: list[str], model: type[BaseModel], id: int
+    ) -> tuple[Optional[Any], Optional[str]]:
+        async with self.__connect() as conn:
+            sql = f"SELECT {', '.join(columns)} FROM {table} WHERE id = :id"
+            with stage("db.query"):
+                result = await conn.execute(text(sql), {"id": id})
+            with stage("db.rows"):
+                row = result.mappings().first()
+        res = model.model_validate(row) if row else None
+        return res, format_sql(sql, {"id": id})
+
+    @asynccontextmanager
+    async def __connect(self) -> AsyncIterator[AsyncConnection]:
+        """Connect like AsyncEngine.connect, timing the pool checkout."""
+        conn = self.__async_engine.connect()
+        with stage("db.acquire"):
+            await conn.start()
+        try:
+            yield conn
+        finally:
+            await conn.close()
+
+    def pool_status(self) -> dict[str, int]:
+        pool = self.__async_engine.pool
+        if not isinstance(pool, QueuePool):
+            return {}
+        return {
+            "size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "overflow": pool.overflow(),
+        }
 
     async def close(self):
         await self.__async_engine.dispose()
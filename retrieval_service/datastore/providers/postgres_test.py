@@ -134,6 +134,22 @@ async def test_export_dataset(ds: postgres.Client):
     check_file_diff(diff_faq)
 
 
+async def test_export_data_merges_partitions(
+    ds: postgres.Client, monkeypatch: pytest.MonkeyPatch
+):
+    whole = await ds.export_data()
+    # Split every table into several id ranges read on their own connections
+    monkeypatch.setattr(postgres, "EXPORT_PARTITION_ROWS", 2)
+    partitioned = await ds.export_data()
+
+    assert partitioned == whole
+    for items in partitioned:
+        ids = [item.id for item in items]
+        assert len(ids) > 2
+        assert ids == sorted(set(ids))
+        assert all(item.embedding for item in items)
+
+
 async def test_search_services(ds: postgres.Client):
     query_embedding = service_embedding_1
     similarity_threshold = 0.5
@@ -159,3 +175,43 @@ async def test_search_faqs(ds: postgres.Client):
     res, sql = await ds.search_faqs(query_embedding, similarity_threshold, top_k)
     assert isinstance(res, list)
     assert sql is not None
+
+
+async def test_search_services_include_embedding(ds: postgres.Client):
+    query_embedding = service_embedding_1
+    res, sql = await ds.search_services(query_embedding, 0.5, 3)
+    assert all("embedding" not in r for r in res)
+    assert sql is not None and "embedding," not in sql
+
+    res, sql = await ds.search_services(query_embedding, 0.5, 3, include_embedding=True)
+    assert all(len(r["embedding"]) == 768 for r in res)
+
+
+async def test_get_service_by_id(ds: postgres.Client):
+    res, sql = await ds.get_service_by_id(1)
+    assert isinstance(res, models.Service)
+    assert res.id == 1
+    assert sql is not None
+
+    res, _ = await ds.get_service_by_id(1, include_embedding=True)
+    assert res is not None and len(res.embedding) == 768
+
+    res, _ = await ds.get_service_by_id(10_000)
+    assert res is None
+
+
+async def test_search_services_vector_index(ds: postgres.Client):
+    services, kursus_list, faqs = await ds.load_dataset(
+        "../data/service_dummy.csv",
+        "../data/kursus_dummy.csv",
+        "../data/faq_dummy.csv",
+    )
+    exact, _ = await ds.search_services(service_embedding_1, 2.0, 5)
+
+    ds.vector_index = datastore.VectorIndex(method="hnsw", ef_search=100)
+    try:
+        await ds.initialize_data(services, kursus_list, faqs)
+        res, _ = await ds.search_services(service_embedding_1, 2.0, 5)
+    finally:
+        ds.vector_index = None
+    assert [r["id"] for r in res] == [r["id"] for r in exact]
@@ -25,6 +25,8 @@ from pydantic import BaseModel
 import models
 
 from .. import datastore
+from .. import models as datastore_models
+from ..helpers import project_columns, project_model
 
 # Identifier for Spanner
 SPANNER_IDENTIFIER = "spanner-gsql"
@@ -338,7 +340,11 @@ class Client(datastore.Client[Config]):
         return services, kursus_list, faqs
 
     async def search_services(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ):
         """
         Search for services based on similarity to a query embedding.
@@ -347,15 +353,20 @@ class Client(datastore.Client[Config]):
             query_embedding (list[float]): The embedding representing the query.
             similarity_threshold (float): The minimum similarity threshold for results.
             top_k (int): The maximum number of results to return.
+            include_embedding (bool): Whether to also return the embedding.
 
         Returns:
             list[models.Service]: A list of Service model instances matching the search criteria.
         """
+        columns = project_columns(self.SERVICE_COLUMNS, include_embedding)
+        model = project_model(
+            models.Service, datastore_models.Service, include_embedding
+        )
         with self.__database.snapshot() as snapshot:
-            query = """
-                SELECT id, category, title, description, price, embedding
+            query = f"""
+                SELECT {", ".join(columns)}
                 FROM (
-                    SELECT id, category, title, description, price, embedding,
+                    SELECT {", ".join(columns)},
                        COSINE_DISTANCE(embedding, @query_embedding) AS similarity
                     FROM services
                 ) AS sorted_services
@@ -377,14 +388,16 @@ class Client(datastore.Client[Config]):
                 },
             )
         return [
-            models.Service.model_validate(
-                {key: value for key, value in zip(self.SERVICE_COLUMNS, a)}
-            )
+            model.model_validate({key: value for key, value in zip(columns, a)})
             for a in results
         ], query
 
     async def search_kursus(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ):
         """
         Search for kursus based on similarity to a query embedding.
@@ -393,15 +406,18 @@ class Client(datastore.Client[Config]):
             query_embedding (list[float]): The embedding representing the query.
             similarity_threshold (float): The minimum similarity threshold for results.
             top_k (int): The maximum number of results to return.
+            include_embedding (bool): Whether to also return the embedding.
 
         Returns:
             list[models.Kursus]: A list of Kursus model instances matching the search criteria.
         """
+        columns = project_columns(self.KURSUS_COLUMNS, include_embedding)
+        model = project_model(models.Kursus, datastore_models.Kursus, include_embedding)
         with self.__database.snapshot() as snapshot:
-            query = """
-                SELECT id, course_name, level, description, price, start_date, end_date, embedding
+            query = f"""
+                SELECT {", ".join(columns)}
                 FROM (
-                    SELECT id, course_name, level, description, price, start_date, end_date, embedding,
+                    SELECT {", ".join(columns)},
                        COSINE_DISTANCE(embedding, @query_embedding) AS similarity
                     FROM kursus
                 ) AS sorted_kursus
@@ -423,14 +439,16 @@ class Client(datastore.Client[Config]):
                 },
             )
         return [
-            models.Kursus.model_validate(
-                {key: value for key, value in zip(self.KURSUS_COLUMNS, a)}
-            )
+            model.model_validate({key: value for key, value in zip(columns, a)})
             for a in results
         ], query
 
     async def search_faqs(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ):
         """
         Search for faqs based on similarity to a query embedding.
@@ -439,15 +457,18 @@ class Client(datastore.Client[Config]):
             query_embedding (list[float]): The embedding representing the query.
             similarity_threshold (float): The minimum similarity threshold for results.
             top_k (int): The maximum number of results to return.
+            include_embedding (bool): Whether to also return the embedding.
 
         Returns:
             list[models.Faq]: A list of Faq model instances matching the search criteria.
         """
+        columns = project_columns(self.FAQ_COLUMNS, include_embedding)
+        model = project_model(models.Faq, datastore_models.Faq, include_embedding)
         with self.__database.snapshot() as snapshot:
-            query = """
-                SELECT id, category, title, description, embedding
+            query = f"""
+                SELECT {", ".join(columns)}
                 FROM (
-                    SELECT id, category, title, description, embedding,
+                    SELECT {", ".join(columns)},
                        COSINE_DISTANCE(embedding, @query_embedding) AS similarity
                     FROM faqs
                 ) AS sorted_faqs
@@ -469,9 +490,7 @@ class Client(datastore.Client[Config]):
                 },
             )
         return [
-            models.Faq.model_validate(
-                {key: value for key, value in zip(self.FAQ_COLUMNS, a)}
-            )
+            model.model_validate({key: value for key, value in zip(columns, a)})
             for a in results
         ], query
 
@@ -25,6 +25,8 @@ from pydantic import BaseModel
 import models
 
 from .. import datastore
+from .. import models as datastore_models
+from ..helpers import project_columns, project_model
 
 # Identifier for Spanner
 SPANNER_IDENTIFIER = "spanner-postgres"
@@ -338,13 +340,21 @@ class Client(datastore.Client[Config]):
         return services, kursus_list, faqs
 
     async def search_services(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ):
+        columns = project_columns(self.SERVICE_COLUMNS, include_embedding)
+        model = project_model(
+            models.Service, datastore_models.Service, include_embedding
+        )
         with self.__database.snapshot() as snapshot:
-            query = """
-                SELECT id, category, title, description, price, embedding
+            query = f"""
+                SELECT {", ".join(columns)}
                 FROM (
-                    SELECT id, category, title, description, price, embedding,
+                    SELECT {", ".join(columns)},
                        spanner.cosine_distance(embedding, $1) AS similarity
                     FROM services
                 ) AS sorted_services
@@ -366,20 +376,24 @@ class Client(datastore.Client[Config]):
                 },
             )
         return [
-            models.Service.model_validate(
-                {key: value for key, value in zip(self.SERVICE_COLUMNS, a)}
-            )
+            model.model_validate({key: value for key, value in zip(columns, a)})
             for a in results
         ], query
 
     async def search_kursus(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ):
+        columns = project_columns(self.KURSUS_COLUMNS, include_embedding)
+        model = project_model(models.Kursus, datastore_models.Kursus, include_embedding)
         with self.__database.snapshot() as snapshot:
-            query = """
-                SELECT id, course_name, level, description, price, start_date, end_date, embedding
+            query = f"""
+                SELECT {", ".join(columns)}
                 FROM (
-                    SELECT id, course_name, level, description, price, start_date, end_date, embedding,
+                    SELECT {", ".join(columns)},
                        spanner.cosine_distance(embedding, $1) AS similarity
                     FROM kursus
                 ) AS sorted_kursus
@@ -401,20 +415,24 @@ class Client(datastore.Client[Config]):
                 },
             )
         return [
-            models.Kursus.model_validate(
-                {key: value for key, value in zip(self.KURSUS_COLUMNS, a)}
-            )
+            model.model_validate({key: value for key, value in zip(columns, a)})
             for a in results
         ], query
 
     async def search_faqs(
-        self, query_embedding: list[float], similarity_threshold: float, top_k: int
+        self,
+        query_embedding: list[float],
+        similarity_threshold: float,
+        top_k: int,
+        include_embedding: bool = False,
     ):
+        columns = project_columns(self.FAQ_COLUMNS, include_embedding)
+        model = project_model(models.Faq, datastore_models.Faq, include_embedding)
         with self.__database.snapshot() as snapshot:
-            query = """
-                SELECT id, category, title, description, embedding
+            query = f"""
+                SELECT {", ".join(columns)}
                 FROM (
-                    SELECT id, category, title, description, embedding,
+                    SELECT {", ".join(columns)},
                        spanner.cosine_distance(embedding, $1) AS similarity
                     FROM faqs
                 ) AS sorted_faqs
@@ -436,9 +454,7 @@ class Client(datastore.Client[Config]):
                 },
             )
         return [
-            models.Faq.model_validate(
-                {key: value for key, value in zip(self.FAQ_COLUMNS, a)}
-            )
+            model.model_validate({key: value for key, value in zip(columns, a)})
             for a in results
         ], query
 
@@ -0,0 +1,147 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import inspect
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+from typing import Any, Iterator, Mapping, Optional
+
+from prometheus_client import Gauge, Histogram
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+from . import tracing
+
+REQUEST_SECONDS = Histogram(
+    "retrieval_request_seconds",
+    "Time to answer a request, until the response starts",
+    ["route", "method", "status"],
+)
+STAGE_SECONDS = Histogram(
+    "retrieval_stage_seconds",
+    "Time spent in each stage of a request",
+    ["route", "stage"],
+)
+DATASTORE_POOL_CONNECTIONS = Gauge(
+    "retrieval_datastore_pool_connections",
+    "Connections of the datastore pool, by state",
+    ["state"],
+)
+
+# Stages measured while handling the current request, in order
+_stages: ContextVar[Optional[list[tuple[str, float]]]] = ContextVar(
+    "stages", default=None
+)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """
+    Time a stage of the current request, such as "embed" or "db.query". The
+    time is reported per route by MetricsMiddleware, or right away when no
+    request is being handled. The stage is traced as a span as well.
+    """
+    start = time.perf_counter()
+    try:
+        with tracing.span(name):
+            yield
+    finally:
+        seconds = time.perf_counter() - start
+        stages = _stages.get()
+        if stages is None:
+            STAGE_SECONDS.labels("", name).observe(seconds)
+        else:
+            stages.append((name, seconds))
+
+
+class InstrumentedClient:
+    """
+    Wraps a datastore.Client so every coroutine method is timed as a
+    "datastore.<method>" stage, whatever the provider.
+    """
+
+    def __init__(self, client: Any):
+        self.client = client
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self.client, name)
+        if not inspect.iscoroutinefunction(attr):
+            return attr
+
+        @wraps(attr)
+        async def timed(*args, **kwargs):
+            with stage(f"datastore.{name}"):
+                return await attr(*args, **kwargs)
+
+        # Cached on the instance, __getattr__ only runs on the first call
+        setattr(self, name, timed)
+        return timed
+
+
+def set_pool_status(status: Mapping[str, int]):
+    for state, count in status.items():
+        DATASTORE_POOL_CONNECTIONS.labels(state).set(count)
+
+
+def server_timing(stages: list[tuple[str, float]], total: float) -> str:
+    durations: dict[str, float] = {}
+    for name, seconds in stages:
+        durations[name] = durations.get(name, 0.0) + seconds
+    durations["total"] = total
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.2f}" for name, seconds in durations.items()
+    )
+
+
+class MetricsMiddleware:
+    """
+    Records the request and stage histograms of every HTTP request, labelled
+    with the route template. With `server_timing`, the stages measured before
+    the response starts are also sent in a Server-Timing header.
+    """
+
+    def __init__(self, app: ASGIApp, server_timing: bool = False):
+        self.app = app
+        self.server_timing = server_timing
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        stages: list[tuple[str, float]] = []
+        token = _stages.set(stages)
+
+        async def send_wrapper(message: Message):
+            if message["type"] == "http.response.start":
+                total = time.perf_counter() - start
+                route = getattr(scope.get("route"), "path", "unmatched")
+                REQUEST_SECONDS.labels(
+                    route, scope["method"], message["status"]
+                ).observe(total)
+                for name, seconds in stages:
+                    STAGE_SECONDS.labels(route, name).observe(seconds)
+                if self.server_timing:
+                    MutableHeaders(scope=message).append(
+                        "Server-Timing", server_timing(stages, total)
+                    )
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _stages.reset(token)
@@ -0,0 +1,81 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import asyncio
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from .metrics import InstrumentedClient, MetricsMiddleware, stage
+
+
+class FakeDatastore:
+    async def search(self):
+        with stage("db.query"):
+            await asyncio.sleep(0.01)
+        return ["result"]
+
+    def pool_status(self):
+        return {"size": 5}
+
+
+def make_client(server_timing: bool) -> TestClient:
+    app = FastAPI()
+    app.add_middleware(MetricsMiddleware, server_timing=server_timing)
+    app.state.datastore = InstrumentedClient(FakeDatastore())
+
+    @app.get("/items/{id}")
+    async def get_item(id: int):
+        with stage("embed"):
+            pass
+        return await app.state.datastore.search()
+
+    return TestClient(app)
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def test_stages_are_recorded_per_route():
+    before = sample(
+        "retrieval_stage_seconds_count", route="/items/{id}", stage="db.query"
+    )
+    response = make_client(server_timing=False).get("/items/1")
+    assert response.json() == ["result"]
+    assert "server-timing" not in response.headers
+
+    labels = {"route": "/items/{id}"}
+    assert (
+        sample("retrieval_stage_seconds_count", stage="db.query", **labels)
+        == before + 1
+    )
+    assert sample("retrieval_stage_seconds_sum", stage="datastore.search", **labels)
+    assert sample(
+        "retrieval_request_seconds_count", method="GET", status="200", **labels
+    )
+
+
+def test_server_timing_header():
+    response = make_client(server_timing=True).get("/items/1")
+    names = [
+        metric.split(";")[0] for metric in response.headers["server-timing"].split(", ")
+    ]
+    assert names == ["embed", "db.query", "datastore.search", "total"]
+
+
+def test_instrumented_client_passes_other_attributes():
+    client = InstrumentedClient(FakeDatastore())
+    assert client.pool_status() == {"size": 5}
@@ -0,0 +1,85 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from . import tracing
+from .metrics import stage
+
+TRACE_ID = "0af7651916cd43dd8448eb211c80319c"
+PARENT_ID = "b7ad6b7169203331"
+
+
+class ListExporter:
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span: tracing.Span):
+        self.spans.append(span.to_dict())
+
+
+def test_server_span_continues_incoming_trace():
+    exporter = ListExporter()
+    tracing.set_exporter(exporter)  # type: ignore[arg-type]
+    app = FastAPI()
+    app.add_middleware(tracing.TracingMiddleware)
+
+    @app.get("/items/{id}")
+    async def get_item(id: int):
+        with stage("db.query"):
+            pass
+        span = tracing.current_span()
+        assert span is not None
+        return span.traceparent
+
+    try:
+        response = TestClient(app).get(
+            "/items/1", headers={"traceparent": f"00-{TRACE_ID}-{PARENT_ID}-01"}
+        )
+    finally:
+        tracing.set_exporter(None)
+
+    query, server = exporter.spans
+    assert server["name"] == "GET /items/{id}"
+    assert (server["traceId"], server["parentSpanId"]) == (TRACE_ID, PARENT_ID)
+    assert server["attributes"]["http.status_code"] == 200
+    assert response.json() == f"00-{TRACE_ID}-{server['spanId']}-01"
+    assert query["name"] == "db.query"
+    assert query["parentSpanId"] == server["spanId"]
+
+
+def test_span_timings_nest_server_timing():
+    with tracing.span("GET /chat") as root:
+        with tracing.span("tool search") as tool:
+            tool.set_attribute("http.server_timing", "embed;dur=3.5, db.query;dur=1.25")
+        with tracing.span("llm") as llm:
+            llm.record_error(ValueError("quota"))
+
+    timings = [(t["name"], t["depth"], t["status"]) for t in tracing.span_timings(root)]
+    assert timings == [
+        ("tool search", 1, "ok"),
+        ("embed", 2, "ok"),
+        ("db.query", 2, "ok"),
+        ("llm", 1, "error"),
+    ]
+
+
+def test_parse_traceparent_rejects_malformed_values():
+    assert tracing.parse_traceparent(None) is None
+    assert tracing.parse_traceparent("00-abc-def-01") is None
+    assert tracing.parse_traceparent(f"00-{TRACE_ID}-{PARENT_ID}-01") == (
+        TRACE_ID,
+        PARENT_ID,
+    )
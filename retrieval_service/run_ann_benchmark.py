@@ -0,0 +1,237 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures the recall and latency of vector indexes, to pick their parameters.
+Services get synthetic embeddings, as in run_datastore_benchmark.py, and the
+exact nearest neighbours of each query are computed with NumPy. Every index
+is then built, and for each search parameter the harness reports recall@k
+against those neighbours, throughput and latency, as a table and JSON.
+
+Without --config the in-process "memory" provider is used, which only has
+ivfflat. A config file points it at another datastore, such as a local
+Postgres, whose data is replaced: only use a scratch database.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Optional
+
+import numpy as np
+
+import datastore
+from run_datastore_benchmark import (
+    git_commit,
+    load_config,
+    measure_calls,
+    synthetic_embeddings,
+    synthetic_faqs,
+    synthetic_kursus,
+    synthetic_services,
+)
+
+# Cosine distances are at most 2, so searches filter out no row
+SEARCH_THRESHOLD = 2.0
+# Queries compared to the whole dataset at once for the ground truth
+GROUND_TRUTH_BATCH = 256
+
+IndexSweep = tuple[Optional[datastore.VectorIndex], list[dict[str, int]]]
+
+
+def exact_neighbours(embeddings: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    """Ids of the `k` rows nearest to each query by cosine distance."""
+    rows = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    queries = queries / np.linalg.norm(queries, axis=1, keepdims=True)
+    k = min(k, len(rows))
+    neighbours = []
+    for start in range(0, len(queries), GROUND_TRUTH_BATCH):
+        similarities = queries[start : start + GROUND_TRUTH_BATCH] @ rows.T
+        neighbours.append(np.argpartition(-similarities, k - 1, axis=1)[:, :k])
+    # Ids start at 1 in row order
+    return np.concatenate(neighbours) + 1
+
+
+def recall(found: list[list[int]], neighbours: np.ndarray) -> float:
+    """Share of the exact neighbours that the searches returned."""
+    hits = sum(len(set(f) & set(n)) for f, n in zip(found, neighbours.tolist()))
+    return hits / neighbours.size
+
+
+def parse_ints(value: str) -> list[int]:
+    return [int(v) for v in value.split(",")]
+
+
+def index_sweeps(args: argparse.Namespace) -> list[IndexSweep]:
+    """Indexes to build, each with the search parameters to try on it."""
+    sweeps: list[IndexSweep] = []
+    for method in args.methods.split(","):
+        if method == "exact":
+            sweeps.append((None, [{}]))
+        elif method == "hnsw":
+            for m in parse_ints(args.m):
+                for ef_construction in parse_ints(args.ef_construction):
+                    index = datastore.VectorIndex(
+                        method="hnsw", m=m, ef_construction=ef_construction
+                    )
+                    searches = [{"ef_search": e} for e in parse_ints(args.ef_search)]
+                    sweeps.append((index, searches))
+        elif method == "ivfflat":
+            for lists in parse_ints(args.lists):
+                index = datastore.VectorIndex(method="ivfflat", lists=lists)
+                searches = [{"probes": p} for p in parse_ints(args.probes)]
+                sweeps.append((index, searches))
+        else:
+            raise TypeError(f"No vector index of kind {method}")
+    return sweeps
+
+
+async def sweep(
+    config: datastore.AbstractConfig,
+    index: Optional[datastore.VectorIndex],
+    searches: list[dict[str, int]],
+    data: tuple[list, list, list],
+    queries: list[list[float]],
+    neighbours: np.ndarray,
+    args: argparse.Namespace,
+) -> list[dict[str, Any]]:
+    ds = await datastore.create(
+        config.model_copy(update={"vector_index": index})  # type: ignore[attr-defined]
+    )
+    try:
+        start = time.perf_counter()
+        await ds.initialize_data(*data)
+        build_seconds = time.perf_counter() - start
+
+        results = []
+        for params in searches:
+            for name, value in params.items():
+                setattr(ds.vector_index, name, value)  # type: ignore[attr-defined]
+            found: list[list[int]] = [[] for _ in queries]
+
+            async def search(i: int):
+                res, _ = await ds.search_services(
+                    queries[i], SEARCH_THRESHOLD, args.top_k
+                )
+                found[i] = [r["id"] for r in res]
+
+            stats = await measure_calls(search, list(range(len(queries))), 1)
+            build = index.model_dump(include=build_params(index)) if index else {}
+            results.append(
+                {
+                    "method": index.method if index else "exact",
+                    **build,
+                    **params,
+                    "build_seconds": round(build_seconds, 3),
+                    f"recall_at_{args.top_k}": round(recall(found, neighbours), 4),
+                    **stats,
+                }
+            )
+        return results
+    finally:
+        await ds.close()
+
+
+def build_params(index: datastore.VectorIndex) -> set[str]:
+    return {"m", "ef_construction"} if index.method == "hnsw" else {"lists"}
+
+
+def print_results(results: list[dict[str, Any]], top_k: int):
+    print(
+        f"{'index':<36} {'build s':>9} {f'recall@{top_k}':>10} {'qps':>9}"
+        f" {'p50 ms':>9} {'p99 ms':>9}",
+        file=sys.stderr,
+    )
+    for r in results:
+        params = ", ".join(
+            f"{k}={r[k]}"
+            for k in ("m", "ef_construction", "ef_search", "lists", "probes")
+            if k in r
+        )
+        name = f"{r['method']} {params}".strip()
+        print(
+            f"{name:<36} {r['build_seconds']:>9.3f} {r[f'recall_at_{top_k}']:>10.4f}"
+            f" {r['ops_per_second']:>9.1f} {r['p50_ms']:>9.3f} {r['p99_ms']:>9.3f}",
+            file=sys.stderr,
+        )
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark vector index recall")
+    parser.add_argument(
+        "--config", help="YAML file with a datastore section, memory if omitted"
+    )
+    parser.add_argument("--rows", type=int, default=10000, help="Rows to index")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument(
+        "--methods",
+        default="exact,ivfflat",
+        help="Comma separated, from exact, hnsw (Postgres only) and ivfflat",
+    )
+    parser.add_argument("--m", default="16", help="hnsw m values")
+    parser.add_argument("--ef-construction", default="64")
+    parser.add_argument("--ef-search", default="10,20,40,80,160")
+    parser.add_argument("--lists", default="100", help="ivfflat lists values")
+    parser.add_argument("--probes", default="1,2,4,8,16")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results file, stdout if omitted")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    rng = np.random.default_rng(args.seed)
+    services = synthetic_services(args.rows, rng)
+    # The other tables are not searched, one row each keeps them valid
+    data = (services, synthetic_kursus(1, rng), synthetic_faqs(1, rng))
+    queries = synthetic_embeddings("service", args.queries, rng)
+    neighbours = exact_neighbours(
+        np.array([s.embedding for s in services]), queries, args.top_k
+    )
+
+    results = []
+    for index, searches in index_sweeps(args):
+        results.extend(
+            await sweep(
+                config, index, searches, data, queries.tolist(), neighbours, args
+            )
+        )
+    print_results(results, args.top_k)
+
+    report = {
+        "provider": config.kind,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {
+            "rows": args.rows,
+            "queries": args.queries,
+            "top_k": args.top_k,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
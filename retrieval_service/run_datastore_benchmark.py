@@ -0,0 +1,280 @@
+# Copyright 2023 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks a datastore provider on synthetic data. Rows get embeddings near
+the real ones in datastore/providers/test_data.py, so searches see a
+realistic spread of distances. For each scale it times initialize_data,
+export_data, and the latency of every search_* and get_*_by_id, then writes
+the results as JSON to compare before and after a change.
+
+Without --config the in-process "memory" provider is used. A config file
+points it at another datastore, e.g. a local Postgres, whose data is
+replaced: only use a scratch database.
+"""
+
+import argparse
+import asyncio
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Optional
+
+import numpy as np
+import yaml
+
+import datastore
+from datastore import models
+from datastore.providers import test_data
+
+# Embeddings in test_data per table, one for each row of the dummy dataset
+TEST_EMBEDDINGS = 15
+# Standard deviation of the noise added to each embedding component
+EMBEDDING_NOISE = 0.01
+
+Operation = Callable[[Any], Awaitable[Any]]
+
+
+def synthetic_embeddings(
+    prefix: str, count: int, rng: np.random.Generator
+) -> np.ndarray:
+    """Unit vectors between two random test_data embeddings, plus noise."""
+    base = np.array(
+        [
+            getattr(test_data, f"{prefix}_embedding_{i}")
+            for i in range(1, TEST_EMBEDDINGS + 1)
+        ]
+    )
+    weights = rng.random((count, 1))
+    vectors = (
+        weights * base[rng.integers(len(base), size=count)]
+        + (1 - weights) * base[rng.integers(len(base), size=count)]
+        + rng.normal(scale=EMBEDDING_NOISE, size=(count, base.shape[1]))
+    )
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def synthetic_services(rows: int, rng: np.random.Generator) -> list[models.Service]:
+    return [
+        models.Service(
+            id=i + 1,
+            category=f"Category {i % 10}",
+            title=f"Service {i + 1}",
+            description=f"Description of service {i + 1}",
+            price=1000 * (i % 100),
+            embedding=embedding,
+        )
+        for i, embedding in enumerate(synthetic_embeddings("service", rows, rng))
+    ]
+
+
+def synthetic_kursus(rows: int, rng: np.random.Generator) -> list[models.Kursus]:
+    return [
+        models.Kursus(
+            id=i + 1,
+            course_name=f"Course {i + 1}",
+            level=("Beginner", "Intermediate", "Advanced")[i % 3],
+            description=f"Description of course {i + 1}",
+            price=1000 * (i % 100),
+            start_date="01/06/2025",
+            end_date="30/06/2025",
+            embedding=embedding,
+        )
+        for i, embedding in enumerate(synthetic_embeddings("kursus", rows, rng))
+    ]
+
+
+def synthetic_faqs(rows: int, rng: np.random.Generator) -> list[models.Faq]:
+    return [
+        models.Faq(
+            id=i + 1,
+            category=f"Category {i % 10}",
+            title=f"Question {i + 1}",
+            description=f"Answer to question {i + 1}",
+            embedding=embedding,
+        )
+        for i, embedding in enumerate(synthetic_embeddings("faq", rows, rng))
+    ]
+
+
+def synthetic_dataset(
+    rows: int, rng: np.random.Generator
+) -> tuple[list[models.Service], list[models.Kursus], list[models.Faq]]:
+    return (
+        synthetic_services(rows, rng),
+        synthetic_kursus(rows, rng),
+        synthetic_faqs(rows, rng),
+    )
+
+
+def summarize(latencies: list[float], seconds: float) -> dict[str, float]:
+    """Throughput and latency percentiles, in milliseconds, of timed calls."""
+    if len(latencies) > 1:
+        percentiles = statistics.quantiles(latencies, n=100, method="inclusive")
+    else:
+        percentiles = latencies * 99
+    return {
+        "count": len(latencies),
+        "ops_per_second": round(len(latencies) / seconds, 1),
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentiles[49] * 1000, 3),
+        "p95_ms": round(percentiles[94] * 1000, 3),
+        "p99_ms": round(percentiles[98] * 1000, 3),
+    }
+
+
+async def measure_calls(
+    operation: Operation, args: list[Any], concurrency: int
+) -> dict[str, float]:
+    """Call `operation` once per argument from `concurrency` workers."""
+    pending = iter(args)
+    latencies: list[float] = []
+
+    async def worker():
+        for arg in pending:
+            start = time.perf_counter()
+            await operation(arg)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - start)
+
+
+async def measure_once(rows: int, operation: Callable[..., Awaitable[Any]], *args):
+    """Time a single call that handles `rows` rows."""
+    start = time.perf_counter()
+    await operation(*args)
+    seconds = time.perf_counter() - start
+    return {"seconds": round(seconds, 3), "rows_per_second": round(rows / seconds)}
+
+
+async def benchmark(
+    ds: datastore.Client, rows: int, args: argparse.Namespace
+) -> list[dict[str, Any]]:
+    rng = np.random.default_rng(args.seed)
+    services, kursus_list, faqs = synthetic_dataset(rows, rng)
+    total_rows = len(services) + len(kursus_list) + len(faqs)
+    stats = await measure_once(
+        total_rows, ds.initialize_data, services, kursus_list, faqs
+    )
+    results = [{"operation": "initialize_data", **stats}]
+    del services, kursus_list, faqs
+
+    for prefix, search, get_by_id in (
+        ("service", ds.search_services, ds.get_service_by_id),
+        ("kursus", ds.search_kursus, ds.get_kursus_by_id),
+        ("faq", ds.search_faqs, ds.get_faq_by_id),
+    ):
+        queries = synthetic_embeddings(prefix, args.queries, rng).tolist()
+        stats = await measure_calls(
+            lambda q: search(q, args.threshold, args.top_k), queries, args.concurrency
+        )
+        results.append({"operation": search.__name__, **stats})
+
+        ids = rng.integers(1, rows + 1, size=args.queries).tolist()
+        stats = await measure_calls(get_by_id, ids, args.concurrency)
+        results.append({"operation": get_by_id.__name__, **stats})
+
+    results.append(
+        {"operation": "export_data", **await measure_once(total_rows, ds.export_data)}
+    )
+    return [{"rows": rows, **result} for result in results]
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def load_config(path: Optional[str]) -> datastore.AbstractConfig:
+    if path is None:
+        return datastore.parse_config({"kind": "memory"})
+    with open(path, "r") as file:
+        return datastore.parse_config(yaml.safe_load(file)["datastore"])
+
+
+def print_results(results: list[dict[str, Any]]):
+    for r in results:
+        if "seconds" in r:
+            timing = f"{r['seconds']:10.3f} s   {r['rows_per_second']:>10} rows/s"
+        else:
+            timing = (
+                f"{r['ops_per_second']:10.1f} /s  p50 {r['p50_ms']:8.3f} ms"
+                f"  p95 {r['p95_ms']:8.3f} ms  p99 {r['p99_ms']:8.3f} ms"
+            )
+        print(f"{r['rows']:>8} {r['operation']:<20} {timing}", file=sys.stderr)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark a datastore provider")
+    parser.add_argument(
+        "--config", help="YAML file with a datastore section, memory if omitted"
+    )
+    parser.add_argument(
+        "--rows",
+        default="1000,10000",
+        help="Comma separated rows per table, e.g. 1000,10000,100000,1000000",
+    )
+    parser.add_argument("--queries", type=int, default=200, help="Calls per lookup")
+    parser.add_argument("--concurrency", type=int, default=1, help="Calls in flight")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="JSON results file, stdout if omitted")
+    args = parser.parse_args()
+
+    config = load_config(args.config)
+    ds = await datastore.create(config)
+    results = []
+    try:
+        for rows in (int(r) for r in args.rows.split(",")):
+            scale_results = await benchmark(ds, rows, args)
+            print_results(scale_results)
+            results.extend(scale_results)
+    finally:
+        await ds.close()
+
+    report = {
+        "provider": config.kind,
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "settings": {
+            "queries": args.queries,
+            "concurrency": args.concurrency,
+            "top_k": args.top_k,
+            "threshold": args.threshold,
+            "seed": args.seed,
+        },
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
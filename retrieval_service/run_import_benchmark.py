@@ -0,0 +1,68 @@
+# Copyright 2024 Google LLC
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     https://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Measures cold import time of the datastore layer, each sample in a fresh
+interpreter. For every provider it compares importing only that provider, as
+the service does at startup, with importing all of them.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+from datastore.providers import PROVIDERS
+
+MEASURE = """
+import time
+start = time.perf_counter()
+{code}
+print(time.perf_counter() - start)
+"""
+
+
+def measure(code: str, repeat: int) -> float:
+    """Return the median seconds taken by `code` in a new interpreter."""
+    samples = []
+    for _ in range(repeat):
+        output = subprocess.run(
+            [sys.executable, "-c", MEASURE.format(code=code)],
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout
+        samples.append(float(output.strip().splitlines()[-1]))
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark datastore imports")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per case")
+    args = parser.parse_args()
+
+    all_providers = "; ".join(
+        f"datastore.providers.load({kind!r})" for kind in PROVIDERS
+    )
+    eager = measure(f"import datastore; {all_providers}", args.repeat)
+    print(f"{'all providers':<20} {eager * 1000:8.1f} ms")
+    for kind in PROVIDERS:
+        lazy = measure(
+            f"import datastore; datastore.providers.load({kind!r})", args.repeat
+        )
+        print(f"{kind:<20} {lazy * 1000:8.1f} ms  ({eager / lazy:.1f}x faster)")
+
+
+if __name__ == "__main__":
+    main()